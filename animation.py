@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Keyframed animation of transformations.
+
+A Track interpolates the parameters of a single rotate, translate or scale
+operation between keyframes. An Animation composes tracks in order, like a
+sequence of calls to the functions in transforms.py. A Timeline holds many
+animations and samples them all at once, from matrices that are baked
+(lazily) into one contiguous array. Sampling is time based, so the speed
+of an animation does not depend on how often it is sampled.
+"""
+
+import numpy as np
+
+
+def _rotation_matrices(angles, x, y, z):
+    """ Batched version of transforms.rotate: returns an array of shape
+    (len(angles), 4, 4) with the rotation matrices.
+    """
+    angles = np.pi * np.asarray(angles, dtype=np.float64) / 180
+    c, s = np.cos(angles), np.sin(angles)
+    n = np.sqrt(x*x+y*y+z*z)
+    x, y, z = x/n, y/n, z/n
+    cx, cy, cz = (1-c)*x, (1-c)*y, (1-c)*z
+    R = np.zeros((len(angles), 4, 4), dtype=np.float64)
+    # Same layout as in transforms.rotate, which transposes at the end
+    R[:,0,0], R[:,1,0], R[:,2,0] = cx*x + c  , cy*x - z*s, cz*x + y*s
+    R[:,0,1], R[:,1,1], R[:,2,1] = cx*y + z*s, cy*y + c  , cz*y - x*s
+    R[:,0,2], R[:,1,2], R[:,2,2] = cx*z - y*s, cy*z + x*s, cz*z + c
+    R[:,3,3] = 1
+    return R
+
+
+def _translation_matrices(xyz):
+    """ Batched version of transforms.translate.
+    """
+    T = np.zeros((len(xyz), 4, 4), dtype=np.float64)
+    T[:] = np.eye(4)
+    T[:,3,:3] = xyz
+    return T
+
+
+def _scale_matrices(xyz):
+    """ Batched version of transforms.scale.
+    """
+    S = np.zeros((len(xyz), 4, 4), dtype=np.float64)
+    S[:,0,0], S[:,1,1], S[:,2,2] = xyz[:,0], xyz[:,1], xyz[:,2]
+    S[:,3,3] = 1
+    return S
+
+
+class Track(object):
+    """ Track(kind, times, values, axis=None)
+
+    A keyframed transformation, linearly interpolated between keyframes
+    and held constant before the first and after the last one.
+
+    Parameters
+    ----------
+    kind : {'rotate', 'translate', 'scale'}
+        The kind of transformation.
+    times : sequence of floats
+        The (increasing) times of the keyframes, in seconds.
+    values : sequence
+        The angles in degrees for 'rotate', (x, y, z) tuples for
+        'translate' and 'scale'. A scale can also be a single factor.
+    axis : (x, y, z)
+        The axis to rotate around. Only used for 'rotate'.
+
+    """
+
+    def __init__(self, kind, times, values, axis=None):
+        if kind not in ('rotate', 'translate', 'scale'):
+            raise ValueError('Track does not understand kind %s.' % kind)
+        self.kind = kind
+        self.times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if kind == 'rotate':
+            if axis is None:
+                raise ValueError('A rotate track needs an axis.')
+            values = values.reshape(-1, 1)
+        elif values.ndim == 1:
+            values = np.repeat(values[:, np.newaxis], 3, 1)
+        if len(values) != len(self.times):
+            raise ValueError('Track needs as many values as times.')
+        if np.any(np.diff(self.times) < 0):
+            raise ValueError('Track times must be increasing.')
+        self.values = values
+        self.axis = axis
+
+
+    @property
+    def duration(self):
+        return float(self.times[-1])
+
+
+    def values_at(self, t):
+        """ Get the interpolated parameters at the array of times t, as an
+        array of shape (len(t), 1) for rotations and (len(t), 3) otherwise.
+        """
+        t = np.asarray(t, dtype=np.float64)
+        out = np.empty((len(t), self.values.shape[1]), dtype=np.float64)
+        for i in range(out.shape[1]):
+            out[:,i] = np.interp(t, self.times, self.values[:,i])
+        return out
+
+
+    def matrices(self, t):
+        """ Get the transformation matrices at the array of times t, as an
+        array of shape (len(t), 4, 4).
+        """
+        values = self.values_at(t)
+        if self.kind == 'rotate':
+            return _rotation_matrices(values[:,0], *self.axis)
+        elif self.kind == 'translate':
+            return _translation_matrices(values)
+        else:
+            return _scale_matrices(values)
+
+
+
+class Animation(object):
+    """ Animation(tracks)
+
+    A sequence of tracks that are applied in order, so that an animation
+    with a rotate track followed by a translate track corresponds to
+    calling rotate(M, ...) and then translate(M, ...) on an identity M.
+    """
+
+    def __init__(self, tracks):
+        self.tracks = list(tracks)
+
+
+    @property
+    def duration(self):
+        return max([track.duration for track in self.tracks] + [0.0])
+
+
+    def matrices(self, t):
+        """ Get the composed matrices at the array of times t, as an array
+        of shape (len(t), 4, 4).
+        """
+        M = np.zeros((len(t), 4, 4), dtype=np.float64)
+        M[:] = np.eye(4)
+        for track in self.tracks:
+            M = np.matmul(M, track.matrices(t))
+        return M
+
+
+
+class Timeline(object):
+    """ Timeline(duration=None, rate=120.0, loop=False)
+
+    A collection of animations that are sampled together. On first use,
+    the matrices of all animations are baked at the given rate into a
+    contiguous float32 array of shape (nframes, nanimations, 4, 4).
+    Sampling then costs one interpolation between two baked frames for
+    all animations at once.
+
+    Parameters
+    ----------
+    duration : float
+        The length of the timeline in seconds. Default is the duration
+        of the longest animation.
+    rate : float
+        The number of baked frames per second.
+    loop : bool
+        Whether time wraps around at the end of the timeline.
+
+    """
+
+    def __init__(self, duration=None, rate=120.0, loop=False):
+        self._duration = duration
+        self.rate = float(rate)
+        self.loop = loop
+        self._animations = []
+        self._frames = None
+
+
+    def add(self, animation):
+        """ Add an Animation (or a list of tracks), returns its index
+        in the sampled arrays.
+        """
+        if not isinstance(animation, Animation):
+            animation = Animation(animation)
+        self._animations.append(animation)
+        self._frames = None  # Rebake on next use
+        return len(self._animations) - 1
+
+
+    def __len__(self):
+        return len(self._animations)
+
+
+    @property
+    def duration(self):
+        if self._duration is not None:
+            return float(self._duration)
+        return max([a.duration for a in self._animations] + [0.0])
+
+
+    @property
+    def frames(self):
+        """ The baked matrices, of shape (nframes, nanimations, 4, 4).
+        """
+        if self._frames is None:
+            self.bake()
+        return self._frames
+
+
+    def bake(self):
+        """ Evaluate all animations at all frame times. Each track is
+        evaluated for all frames in one go.
+        """
+        nframes = max(int(np.ceil(self.duration * self.rate)), 0) + 1
+        t = np.arange(nframes, dtype=np.float64) / self.rate
+        frames = np.empty((nframes, len(self._animations), 4, 4), 'float32')
+        for i, animation in enumerate(self._animations):
+            frames[:,i] = animation.matrices(t)
+        self._frames = frames
+
+
+    def _frame_position(self, t):
+        duration = self.duration
+        if self.loop and duration > 0:
+            t = t % duration
+        pos = t * self.rate
+        nframes = self.frames.shape[0]
+        return np.clip(pos, 0, nframes - 1)
+
+
+    def _frame_indices(self, t):
+        pos = self._frame_position(float(t))
+        i0 = int(pos)
+        i1 = min(i0 + 1, self.frames.shape[0] - 1)
+        return i0, i1, np.float32(pos - i0)
+
+
+    def sample(self, t, out=None):
+        """ Get the matrices of all animations at time t (in seconds), as
+        an array of shape (nanimations, 4, 4).
+        """
+        frames = self.frames
+        i0, i1, f = self._frame_indices(t)
+        if out is None:
+            out = np.empty(frames.shape[1:], dtype=np.float32)
+        np.subtract(frames[i1], frames[i0], out=out)
+        out *= f
+        out += frames[i0]
+        return out
+
+
+    def sample_many(self, times):
+        """ Get the matrices of all animations at each of the given times,
+        as an array of shape (len(times), nanimations, 4, 4).
+        """
+        frames = self.frames
+        pos = self._frame_position(np.asarray(times, dtype=np.float64))
+        i0 = pos.astype(np.intp)
+        i1 = np.minimum(i0 + 1, frames.shape[0] - 1)
+        f = (pos - i0).astype(np.float32)[:, np.newaxis, np.newaxis, np.newaxis]
+        return frames[i0] + f * (frames[i1] - frames[i0])
+
+
+    def matrix(self, index, t):
+        """ Get the matrix of a single animation at time t.
+        """
+        frames = self.frames
+        i0, i1, f = self._frame_indices(t)
+        return frames[i0, index] + f * (frames[i1, index] - frames[i0, index])
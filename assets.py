@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lazily loaded assets for the demos.
+
+The demos used to read their mesh, generate colors and create buffers at
+import time, so that importing them (e.g. for tests or tooling) did real
+work. An Asset is a handle to such data that is only loaded when get() is
+first called, normally in on_initialize, and then kept::
+
+    mesh = Asset(io.read_mesh, 'cube.obj')
+    ...
+    def on_initialize(self):
+        positions, faces, normals, texcoords = mesh.get()
+
+Assets can depend on each other by calling get() in their load function.
+Loading is done once, also when get() is called from several threads.
+"""
+
+import threading
+import functools
+
+import numpy as np
+
+
+class Asset(object):
+    """ Asset(load, *args, **kwargs)
+
+    A handle to the result of load(*args, **kwargs), which is called on
+    the first call of get().
+    """
+
+    _MISSING = object()
+
+    def __init__(self, load, *args, **kwargs):
+        self._load = functools.partial(load, *args, **kwargs)
+        self._lock = threading.Lock()
+        self._value = self._MISSING
+
+
+    @property
+    def loaded(self):
+        """ Whether the asset has been loaded.
+        """
+        return self._value is not self._MISSING
+
+
+    def get(self):
+        """ Get the asset, loading it if this is the first call.
+        """
+        value = self._value
+        if value is self._MISSING:
+            with self._lock:
+                if self._value is self._MISSING:
+                    self._value = self._load()
+                value = self._value
+        return value
+
+
+    def reset(self):
+        """ Forget the loaded asset, so that it is loaded again on the
+        next call of get().
+        """
+        with self._lock:
+            self._value = self._MISSING
+
+
+def random_colors(mesh):
+    """ Get a random RGB color per vertex of the mesh asset (as read
+    with read_mesh), as float32.
+    """
+    positions = mesh.get()[0]
+    return np.random.uniform(0,1,positions.shape).astype('float32')
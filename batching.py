@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Batching of static meshes into a single vertex and index buffer.
+
+A StaticBatch merges meshes (as returned by read_mesh) with their model
+matrix already applied, into one interleaved vertex array and one uint32
+index array, so that a scene of many small static meshes can be drawn
+with a single glDrawElements call. A table keeps, per object, its range
+of vertices and indices, so objects can also be drawn selectively or be
+removed.
+
+Adding objects only appends to the arrays (which grow by doubling), and
+only the appended part is uploaded on the next upload(). Removing an
+object compacts the arrays, after which everything from that object on
+is uploaded again.
+"""
+
+import ctypes
+import numpy as np
+
+from transforms import transform_points
+
+
+VERTEX_DTYPE = np.dtype([('a_position', np.float32, 3),
+                         ('a_normal', np.float32, 3),
+                         ('a_texcoord', np.float32, 2)])
+
+
+class StaticBatch(object):
+    """ StaticBatch(capacity=1024)
+
+    Parameters
+    ----------
+    capacity : int
+        The initial number of vertices (and indices) to allocate.
+
+    """
+
+    def __init__(self, capacity=1024):
+        self._vertices = np.zeros(capacity, VERTEX_DTYPE)
+        self._indices = np.zeros(capacity, np.uint32)
+        self._nvertices = 0
+        self._nindices = 0
+        self._objects = {}  # id -> [vstart, vcount, istart, icount]
+        self._order = []  # ids in the order in which they are stored
+        self._next_id = 0
+        self._handles = None
+        self._uploaded = (0, 0)  # Lengths that are up to date on the GPU
+        self._allocated = (0, 0)  # Sizes of the GPU buffers
+
+
+    def __len__(self):
+        return len(self._objects)
+
+
+    @property
+    def vertices(self):
+        """ The interleaved vertex data of all objects.
+        """
+        return self._vertices[:self._nvertices]
+
+
+    @property
+    def indices(self):
+        """ The indices of all objects, three per triangle.
+        """
+        return self._indices[:self._nindices]
+
+
+    def ranges(self, ids=None):
+        """ Get a list of (index_start, index_count) for the given object
+        ids (default all), sorted and with adjacent ranges merged.
+        """
+        if ids is None:
+            return [(0, self._nindices)] if self._nindices else []
+        spans = sorted(self._objects[i][2:] for i in ids)
+        merged = []
+        for start, count in spans:
+            if merged and merged[-1][0] + merged[-1][1] == start:
+                merged[-1][1] += count
+            else:
+                merged.append([start, count])
+        return [tuple(m) for m in merged]
+
+
+    def add(self, mesh, model=None):
+        """ Add a mesh, i.e. a (vertices, faces, normals, texcoords) tuple
+        as returned by read_mesh. faces, normals and texcoords may be
+        None. The model matrix (default identity) is applied to the
+        positions and normals. Returns the id of the new object.
+        """
+        positions, faces, normals, texcoords = mesh
+        nv = len(positions)
+        if faces is None:
+            faces = np.arange(nv, dtype=np.uint32)
+        faces = np.asarray(faces, np.uint32).reshape(-1)
+        ni = len(faces)
+        self._reserve(self._nvertices + nv, self._nindices + ni)
+
+        v = self._vertices[self._nvertices:self._nvertices + nv]
+        if model is None:
+            v['a_position'] = positions
+            if normals is not None:
+                v['a_normal'] = normals
+        else:
+            model = np.asarray(model, np.float32)
+            v['a_position'] = transform_points(positions, model)
+            if normals is not None:
+                # Normals transform with the inverse transpose
+                R = np.linalg.inv(model[:3,:3].astype(np.float64)).T
+                n = np.dot(np.asarray(normals, np.float64), R)
+                n /= np.sqrt((n*n).sum(1))[:, np.newaxis]
+                v['a_normal'] = n
+        if normals is None:
+            v['a_normal'] = 0
+        if texcoords is not None:
+            v['a_texcoord'] = np.asarray(texcoords)[:,:2]
+        else:
+            v['a_texcoord'] = 0
+        self._indices[self._nindices:self._nindices + ni] = (
+            faces + self._nvertices)
+
+        id = self._next_id
+        self._next_id += 1
+        self._objects[id] = [self._nvertices, nv, self._nindices, ni]
+        self._order.append(id)
+        self._nvertices += nv
+        self._nindices += ni
+        return id
+
+
+    def remove(self, id):
+        """ Remove the object with the given id, compacting the arrays.
+        """
+        vstart, nv, istart, ni = self._objects.pop(id)
+        self._order.remove(id)
+        vend, iend = vstart + nv, istart + ni
+        # Shift everything after the object
+        self._vertices[vstart:self._nvertices - nv] = (
+            self._vertices[vend:self._nvertices])
+        tail = self._indices[iend:self._nindices] - nv
+        self._indices[istart:self._nindices - ni] = tail
+        self._nvertices -= nv
+        self._nindices -= ni
+        for other in self._order:
+            entry = self._objects[other]
+            if entry[0] > vstart:
+                entry[0] -= nv
+                entry[2] -= ni
+        # Everything from the object on must be uploaded again
+        self._uploaded = (min(self._uploaded[0], vstart),
+                          min(self._uploaded[1], istart))
+
+
+    def _reserve(self, nvertices, nindices):
+        if nvertices > len(self._vertices):
+            size = max(nvertices, 2 * len(self._vertices))
+            vertices = np.zeros(size, VERTEX_DTYPE)
+            vertices[:self._nvertices] = self.vertices
+            self._vertices = vertices
+        if nindices > len(self._indices):
+            size = max(nindices, 2 * len(self._indices))
+            indices = np.zeros(size, np.uint32)
+            indices[:self._nindices] = self.indices
+            self._indices = indices
+
+
+    def upload(self, gl):
+        """ Upload what changed since the last upload to the GPU, creating
+        the buffers if needed. Needs a current GL context.
+        """
+        if self._handles is None:
+            self._handles = gl.glGenBuffers(1), gl.glGenBuffers(1)
+        targets = gl.GL_ARRAY_BUFFER, gl.GL_ELEMENT_ARRAY_BUFFER
+        arrays = self._vertices, self._indices
+        lengths = self._nvertices, self._nindices
+        allocated = list(self._allocated)
+        for i in range(2):
+            target, array, n = targets[i], arrays[i], lengths[i]
+            gl.glBindBuffer(target, self._handles[i])
+            if len(array) != allocated[i]:
+                # Grown: allocate the full capacity, upload what is used
+                gl.glBufferData(target, array.nbytes, None, gl.GL_STATIC_DRAW)
+                allocated[i] = len(array)
+                start = 0
+            else:
+                start = self._uploaded[i]
+            if n > start:
+                data = array[start:n]
+                gl.glBufferSubData(target, start * array.itemsize,
+                                   data.nbytes, data)
+        self._allocated = tuple(allocated)
+        self._uploaded = lengths
+
+
+    def draw(self, gl, program, ids=None):
+        """ Draw the given objects (default all) with the given (active)
+        program, using one draw call per contiguous range.
+        """
+        stride = VERTEX_DTYPE.itemsize
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self._handles[0])
+        for name in VERTEX_DTYPE.names:
+            loc = gl.glGetAttribLocation(program, name)
+            if loc < 0:
+                continue  # Not used by the program
+            size = VERTEX_DTYPE[name].shape[0]
+            offset = VERTEX_DTYPE.fields[name][1]
+            gl.glEnableVertexAttribArray(loc)
+            gl.glVertexAttribPointer(loc, size, gl.GL_FLOAT, False, stride,
+                                     ctypes.c_void_p(offset))
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self._handles[1])
+        for start, count in self.ranges(ids):
+            gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT,
+                              ctypes.c_void_p(4 * start))
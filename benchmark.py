@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the loaders, the transforms and the particle generation.
+
+Each benchmark is a function that is called a number of times (repeat);
+the minimum, median and mean duration are reported. The results can be
+written as JSON, and compared with a stored baseline, e.g. from before a
+change::
+
+    python benchmark.py --save-baseline       # on the old code
+    python benchmark.py                       # on the new code
+
+The comparison shows the ratio of the minimum durations (the least
+noisy statistic) per benchmark, and the script exits with status 1 if
+any benchmark got slower than the threshold. Timings are only comparable
+on the same machine.
+
+Use --quick to skip the large inputs, and --filter to select benchmarks
+by name. The import benchmarks time importing the demo modules (with
+their dependencies already imported), which should do nearly no work;
+demos whose dependencies are not installed are skipped. The read_mesh
+benchmarks also report the peak traced memory and
+the size of the resulting arrays (see vispy_io.read_mesh_memory), which
+are stored but not compared.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import importlib
+
+import numpy as np
+
+import vispy_io as io
+from vispy_io.wavefront import WavefrontWriter
+import transforms
+from explosions import VERTEX_DTYPE, fill_explosion
+
+THISDIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(THISDIR, 'benchmark_baseline.json')
+
+# A benchmark that is this much slower than the baseline is a regression
+THRESHOLD = 1.2
+
+# The demos, which load their assets on first use rather than on import
+DEMO_MODULES = ('cube_v1', 'cube_v2', 'cube_v3', 'cube_v4', 'cube_glut',
+                'cube_instanced', 'fireworks_v1', 'fireworks_glut',
+                'fireworks_pool')
+
+
+def measure(func, repeat=5):
+    """ Call func repeat times, returns a dict with the minimum, median
+    and mean duration in seconds.
+    """
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return {'repeat': repeat,
+            'min': min(times),
+            'median': float(np.median(times)),
+            'mean': sum(times) / repeat}
+
+
+def write_grid_obj(fname, n):
+    """ Write an OBJ file with a grid of n x n vertices, with texcoords
+    and normals, and 2*(n-1)**2 triangles.
+    """
+    L = np.linspace(0, 1, n, dtype=np.float32)
+    X, Y = np.meshgrid(L, L)
+    vertices = np.column_stack([X.ravel(), Y.ravel(),
+                                np.sin(6 * X.ravel()) * 0.1])
+    texcoords = np.column_stack([X.ravel(), Y.ravel()])
+    i = np.arange(n * n).reshape(n, n)[:-1, :-1].ravel()
+    faces = np.concatenate([np.column_stack([i, i + 1, i + n + 1]),
+                            np.column_stack([i, i + n + 1, i + n])])
+    with open(fname, 'wb') as f:
+        lines = ['v %f %f %f' % tuple(v) for v in vertices]
+        lines += ['vt %f %f' % tuple(t) for t in texcoords]
+        lines += ['vn 0 0 1']
+        lines += ['f %i/%i/1 %i/%i/1 %i/%i/1' % (a, a, b, b, c, c)
+                  for a, b, c in faces + 1]
+        f.write(('\n'.join(lines) + '\n').encode('ascii'))
+
+
+def mesh_memory(fname):
+    """ Get the memory statistics of reading a mesh: the peak traced
+    memory, the size of the arrays and the peak of each phase, in bytes.
+    """
+    mesh, report = io.read_mesh_memory(fname)
+    memory = {'peak_bytes': report['peak'],
+              'array_bytes': report['array_bytes']}
+    for phase in report['phases']:
+        memory[phase['name'] + '_bytes'] = phase['peak']
+    return memory
+
+
+def reimport(name):
+    """ Import a module again, its dependencies stay imported.
+    """
+    sys.modules.pop(name, None)
+    importlib.import_module(name)
+
+
+def legacy_explosion(data):
+    """ Generate an explosion the way _new_explosion in the fireworks
+    demos originally did, with the legacy global random generator.
+    """
+    n = len(data)
+    data['a_lifetime'] = np.random.normal(2.0, 0.5, (n,))
+    data['a_startPosition'] = np.random.normal(0.0, 0.2, (n,3))
+    data['a_endPosition'] = np.random.normal(0.0, 1.2, (n,3))
+
+
+def benchmarks(tempdir, quick=False):
+    """ Get a list of (name, func, repeat, memory) tuples, with memory
+    None or a function that returns a dict of memory statistics. Input
+    files are made in tempdir.
+    """
+    result = []
+
+    # Importing the demos
+    for name in DEMO_MODULES:
+        try:
+            reimport(name)
+        except ImportError:
+            continue  # vispy or OpenGL is not installed
+        result.append(('import/' + name, lambda name=name: reimport(name),
+                       5, None))
+
+    # Reading meshes
+    for fname in ('cube.obj', 'triceratops.obj'):
+        result.append(('read_mesh/' + fname,
+                       lambda fname=fname: io.read_mesh(fname), 5,
+                       lambda fname=fname: mesh_memory(fname)))
+    for n in ((100,) if quick else (100, 300)):
+        fname = os.path.join(tempdir, 'grid%i.obj' % n)
+        write_grid_obj(fname, n)
+        result.append(('read_mesh/grid%i' % n,
+                       lambda fname=fname: io.read_mesh(fname), 3,
+                       lambda fname=fname: mesh_memory(fname)))
+
+    # Writing meshes
+    mesh = io.read_mesh('triceratops.obj')
+    fname = os.path.join(tempdir, 'written.obj')
+    result.append(('write_mesh/triceratops.obj',
+                   lambda: WavefrontWriter.write(fname, *mesh), 3, None))
+
+    # Images
+    result.append(('image/lena', io.lena, 5, None))
+    result.append(('image/cat', io.cat, 5, None))
+    blob = os.path.join(io.RESOURCE_DIR, 'lena.bz2')
+    tiled = io.convert_blob(blob, (512, 512, 3),
+                            os.path.join(tempdir, 'lena.tiled'))
+    result.append(('image/lena tiled',
+                   lambda tiled=tiled: io.read_tiled(tiled), 5, None))
+    result.append(('image/lena tiled region',
+                   lambda tiled=tiled: io.read_tiled(tiled, (192, 320,
+                                                             192, 320)),
+                   5, None))
+
+    # Matrix functions; each call is too fast to time, so do a batch
+    def matrix_functions(func, args, count=1000):
+        def run():
+            for i in range(count):
+                func(np.eye(4, dtype=np.float32), *args)
+        return run
+    for name, args in [('translate', (1, 2, 3)), ('scale', (2,)),
+                       ('xrotate', (30,)), ('yrotate', (30,)),
+                       ('zrotate', (30,)), ('rotate', (30, 1, 1, 0))]:
+        result.append(('transforms/%s x1000' % name,
+                       matrix_functions(getattr(transforms, name), args),
+                       5, None))
+    for name, args in [('ortho', (-1, 1, -1, 1, 1, 10)),
+                       ('frustum', (-1, 1, -1, 1, 1, 10)),
+                       ('perspective', (45, 1, 1, 10))]:
+        func = getattr(transforms, name)
+        result.append(('transforms/%s x1000' % name,
+                       lambda func=func, args=args:
+                       [func(*args) for i in range(1000)], 5, None))
+
+    # Transforming points
+    n = 100000 if quick else 1000000
+    points = np.random.uniform(-1, 1, (n, 3)).astype(np.float32)
+    out = np.empty_like(points)
+    M = transforms.perspective(45, 1, 1, 10)
+    I = np.eye(4, dtype=np.float32)
+    viewport = (0, 0, 800, 600)
+    result.append(('transforms/transform_points %i' % n,
+                   lambda: transforms.transform_points(points, M, out),
+                   5, None))
+    result.append(('transforms/project %i' % n,
+                   lambda: transforms.project(points, I, I, M, viewport,
+                                              out), 5, None))
+    result.append(('transforms/unproject %i' % n,
+                   lambda: transforms.unproject(points, I, I, M, viewport,
+                                                out), 5, None))
+
+    # Generating explosions
+    for n in ((10000, 100000) if quick else (10000, 100000, 1000000)):
+        data = np.zeros(n, VERTEX_DTYPE)
+        result.append(('explosion/legacy %i' % n,
+                       lambda data=data: legacy_explosion(data), 5, None))
+        result.append(('explosion/fill_explosion %i' % n,
+                       lambda data=data: fill_explosion(data, 0), 5, None))
+    return result
+
+
+def run(quick=False, filter=None, verbose=True):
+    """ Run the benchmarks, returns a dict that can be stored as JSON.
+    """
+    tempdir = tempfile.mkdtemp()
+    try:
+        results = {}
+        for name, func, repeat, memory in benchmarks(tempdir, quick):
+            if filter and filter not in name:
+                continue
+            results[name] = measure(func, repeat)
+            if memory is not None:
+                results[name]['memory'] = memory()
+            if verbose:
+                line = '%-40s %10.3f ms' % (name, 1000 * results[name]['min'])
+                if memory is not None:
+                    line += '  peak %7.1f MB, arrays %6.1f MB' % (
+                        results[name]['memory']['peak_bytes'] / 1e6,
+                        results[name]['memory']['array_bytes'] / 1e6)
+                print(line)
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+    return {'machine': {'platform': platform.platform(),
+                        'python': platform.python_version(),
+                        'numpy': np.__version__,
+                        'cpus': os.cpu_count()},
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'results': results}
+
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """ Compare results with a baseline. Returns a list of (name,
+    baseline min, current min, ratio) for the benchmarks in both, and a
+    list of the names that regressed.
+    """
+    rows, regressions = [], []
+    for name, result in sorted(current['results'].items()):
+        if name not in baseline['results']:
+            continue
+        old = baseline['results'][name]['min']
+        new = result['min']
+        ratio = new / old if old else float('inf')
+        rows.append((name, old, new, ratio))
+        if ratio > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the benchmarks.')
+    parser.add_argument('--quick', action='store_true',
+                        help='skip the large inputs')
+    parser.add_argument('--filter', help='only run benchmarks whose name '
+                        'contains this')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline', default=BASELINE_FILE,
+                        help='the baseline to compare with')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='ratio above which a benchmark regressed')
+    args = parser.parse_args(argv)
+
+    current = run(args.quick, args.filter)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print('Stored baseline in %s' % args.baseline)
+        return 0
+    if not os.path.isfile(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows, regressions = compare(current, baseline, args.threshold)
+    print('\nCompared with %s (%s):' % (args.baseline, baseline['time']))
+    for name, old, new, ratio in rows:
+        flag = '  SLOWER' if name in regressions else ''
+        print('%-40s %10.3f -> %10.3f ms  x%.2f%s' %
+              (name, 1000 * old, 1000 * new, ratio, flag))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
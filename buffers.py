@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Vertex buffers that upload only what changed.
+
+A DynamicBuffer wraps a NumPy array (which may be structured, like the
+vertex_data of the fireworks demos) and a GL buffer. Assigning to slices
+of the buffer, or calling mark_dirty(), records which elements changed.
+On upload(), the dirty ranges are sorted and merged (ranges separated by
+a small gap are sent together, as one call is cheaper than two), and sent
+with glBufferSubData. If most of the buffer changed, the whole buffer is
+respecified with glBufferData instead, which lets the driver orphan the
+old storage rather than wait until the GPU is done with it.
+"""
+
+import numbers
+
+
+class DynamicBuffer(object):
+    """ DynamicBuffer(data, gl=None, target=None, usage=None, merge_gap=64,
+    orphan_fraction=0.5)
+
+    Parameters
+    ----------
+    data : numpy array
+        The data, which is not copied. The first axis is the one that
+        dirty ranges refer to.
+    gl : module
+        The GL module to use. Default is OpenGL.GL.
+    target : GL enum
+        Default GL_ARRAY_BUFFER.
+    usage : GL enum
+        Default GL_DYNAMIC_DRAW.
+    merge_gap : int
+        Dirty ranges that are at most this many elements apart are
+        uploaded as one.
+    orphan_fraction : float
+        If at least this fraction of the buffer is dirty, the whole buffer
+        is respecified.
+
+    """
+
+    def __init__(self, data, gl=None, target=None, usage=None, merge_gap=64,
+                 orphan_fraction=0.5):
+        if gl is None:
+            import OpenGL.GL as gl
+        if not data.flags.c_contiguous:
+            raise ValueError('DynamicBuffer needs C-contiguous data.')
+        self._gl = gl
+        self.data = data
+        self.target = gl.GL_ARRAY_BUFFER if target is None else target
+        self.usage = gl.GL_DYNAMIC_DRAW if usage is None else usage
+        self.merge_gap = merge_gap
+        self.orphan_fraction = orphan_fraction
+        self.handle = None
+        self._dirty = []
+        self.uploads = 0
+        self.orphans = 0
+        self.bytes_uploaded = 0
+
+
+    def __len__(self):
+        return len(self.data)
+
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.mark_dirty(*self._key_range(key))
+
+
+    def _key_range(self, key):
+        if isinstance(key, tuple):
+            key = key[0] if key else slice(None)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self.data))
+            if step < 0:
+                start, stop = stop + 1, start + 1
+            return start, max(start, stop)
+        if isinstance(key, numbers.Integral):
+            key = int(key)
+            if key < 0:
+                key += len(self.data)
+            return key, key + 1
+        # Field names, Ellipsis, fancy indexing: assume everything changed
+        return 0, len(self.data)
+
+
+    def mark_dirty(self, start=0, stop=None):
+        """ Mark the elements start:stop (default all) as changed.
+        """
+        if stop is None:
+            stop = len(self.data)
+        if stop > start:
+            self._dirty.append((start, stop))
+
+
+    @property
+    def dirty(self):
+        """ The merged list of dirty (start, stop) ranges.
+        """
+        merged = []
+        for start, stop in sorted(self._dirty):
+            if merged and start - merged[-1][1] <= self.merge_gap:
+                merged[-1][1] = max(merged[-1][1], stop)
+            else:
+                merged.append([start, stop])
+        return [tuple(m) for m in merged]
+
+
+    def upload(self):
+        """ Send the dirty parts to the GPU; the first call creates the
+        buffer. Needs a current GL context. Binds the buffer if anything
+        is sent, and returns the number of bytes sent.
+        """
+        gl = self._gl
+        if self.handle is None:
+            self.handle = gl.glGenBuffers(1)
+            self._dirty = [(0, len(self.data))]
+        ranges = self.dirty
+        self._dirty = []
+        if not ranges:
+            return 0
+
+        gl.glBindBuffer(self.target, self.handle)
+        itemsize = self.data.nbytes // len(self.data)
+        ndirty = sum(stop - start for start, stop in ranges)
+        nbytes = 0
+        if ndirty >= self.orphan_fraction * len(self.data):
+            gl.glBufferData(self.target, self.data.nbytes, self.data,
+                            self.usage)
+            nbytes += self.data.nbytes
+            self.orphans += 1
+        else:
+            for start, stop in ranges:
+                chunk = self.data[start:stop]
+                gl.glBufferSubData(self.target, start * itemsize,
+                                   chunk.nbytes, chunk)
+                nbytes += chunk.nbytes
+        self.uploads += 1
+        self.bytes_uploaded += nbytes
+        return nbytes
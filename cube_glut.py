@@ -7,9 +7,17 @@ The use of vertex and element buffer can be turned on or off.
 This demo uses GLUT and does not depend on vispy.
 """
 
+import sys
+import atexit
 import numpy as np
 import OpenGL.GLUT as glut
-from transforms import perspective, translate, rotate
+from transforms import perspective, translate
+from animation import Timeline, Track
+from scheduler import FrameScheduler
+from glstate import GLState
+from programs import ProgramCache, CACHE_DIR
+from instrument import Profiler
+from assets import Asset
 
 import OpenGL.GL as gl  # We only use the ES 2.0 subset
 # from vispy import gl
@@ -49,9 +57,15 @@ void main()
 """
 
 
-# Read cube data (replace 'cube.obj' with 'teapot.obj'
-positions, faces, normals, texcoords = io.read_mesh('cube.obj')
-colors = np.random.uniform(0,1,positions.shape).astype('float32')
+# Cube data (replace 'cube.obj' with 'teapot.obj') and texture, read on
+# first use (see assets.py)
+mesh = Asset(io.read_mesh, 'cube.obj')
+texture = Asset(io.cat)
+
+# Spin 30 degrees per second around z and y (0.5 degree per tick at 60 fps)
+spin = Timeline(loop=True)
+spin.add([Track('rotate', [0, 12], [0, 360], axis=(0,0,1)),
+          Track('rotate', [0, 12], [0, 360], axis=(0,1,0))])
 
 
 class Canvas:
@@ -60,43 +74,16 @@ class Canvas:
     
     
     def on_initialize(self):
+        self._state = GLState(gl)
         gl.glClearColor(1,1,1,1)
         gl.glEnable(gl.GL_DEPTH_TEST)
         
-        # Create shader program
-        self._prog_handle = gl.glCreateProgram()
-
-        # Create vertex shader
-        shader = gl.glCreateShader(gl.GL_VERTEX_SHADER)
-        gl.glShaderSource(shader, VERT_CODE)
-        gl.glCompileShader(shader)
-        status = gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS)
-        if not status:
-            # We could show more useful info here, but that takes a few lines
-            raise RuntimeError('Vertex shader did not compile.')
-        else:
-            gl.glAttachShader(self._prog_handle, shader)
-        
-        # Create fragment shader
-        shader = gl.glCreateShader(gl.GL_FRAGMENT_SHADER)
-        gl.glShaderSource(shader, FRAG_CODE)
-        gl.glCompileShader(shader)
-        status = gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS)
-        if not status:
-            # We could show more useful info here, but that takes a few lines
-            raise RuntimeError('Fragment shader did not compile.')
-        else:
-            gl.glAttachShader(self._prog_handle, shader)
-        
-        # Link
-        gl.glLinkProgram(self._prog_handle)
-        status = gl.glGetProgramiv(self._prog_handle, gl.GL_LINK_STATUS)
-        if not status:
-            # We could show more useful info here, but that takes a few lines
-            raise RuntimeError('Program did not link.')
+        # Create shader program (cached by source, and on disk if possible)
+        self._programs = ProgramCache(gl, cache_dir=CACHE_DIR)
+        self._prog_handle = self._programs.get(VERT_CODE, FRAG_CODE)
         
         # Create texture
-        im = io.cat()
+        im = texture.get()
         self._tex_handle = gl.glGenTextures(1)
         gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
         gl.glBindTexture(gl.GL_TEXTURE_2D, self._tex_handle)
@@ -105,6 +92,9 @@ class Canvas:
         gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
         gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
         
+        positions, faces, normals, texcoords = mesh.get()
+        self._positions, self._faces = positions, faces
+        self._texcoords = texcoords
         if use_buffers:
             # Create vertex buffer
             self._positions_handle = gl.glGenBuffers(1)
@@ -119,6 +109,10 @@ class Canvas:
             self._faces_handle = gl.glGenBuffers(1)
             gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self._faces_handle)
             gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, faces.nbytes, faces, gl.GL_DYNAMIC_DRAW)
+        
+        # We made GL calls directly, so the state object must not trust
+        # what it knows
+        self._state.invalidate()
     
     
     def on_resize(self, width, height):
@@ -130,40 +124,42 @@ class Canvas:
         
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
         
-        # Activate program  and texture
-        gl.glUseProgram(self._prog_handle)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self._tex_handle)
+        # Activate program  and texture (skipped if already active)
+        state = self._state
+        state.use_program(self._prog_handle)
+        state.bind_texture(gl.GL_TEXTURE_2D, self._tex_handle)
         
-        # Set attributes (again, the loc can be cached)
-        loc = gl.glGetAttribLocation(self._prog_handle, 'a_position')
-        gl.glEnableVertexAttribArray(loc)
+        # Set attributes (the locs are cached by the state object)
+        loc = state.attrib_location(self._prog_handle, 'a_position')
+        state.enable_vertex_attrib_array(loc)
         if use_buffers:
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self._positions_handle)
-            gl.glVertexAttribPointer(loc, 3, gl.GL_FLOAT, False, 0, None)
+            state.bind_buffer(gl.GL_ARRAY_BUFFER, self._positions_handle)
+            state.vertex_attrib_pointer(loc, 3, gl.GL_FLOAT, False, 0, None)
         else:
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)  # 0 means do not use buffer
-            gl.glVertexAttribPointer(loc, 3, gl.GL_FLOAT, False, 0, positions)
+            state.bind_buffer(gl.GL_ARRAY_BUFFER, 0)  # 0 means do not use buffer
+            state.vertex_attrib_pointer(loc, 3, gl.GL_FLOAT, False, 0, self._positions)
         #
-        loc = gl.glGetAttribLocation(self._prog_handle, 'a_texcoord')
-        gl.glEnableVertexAttribArray(loc)
+        loc = state.attrib_location(self._prog_handle, 'a_texcoord')
+        state.enable_vertex_attrib_array(loc)
         if use_buffers:
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self._texcoords_handle)
-            gl.glVertexAttribPointer(loc, 2, gl.GL_FLOAT, False, 0, None)
+            state.bind_buffer(gl.GL_ARRAY_BUFFER, self._texcoords_handle)
+            state.vertex_attrib_pointer(loc, 2, gl.GL_FLOAT, False, 0, None)
         else:
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)  # 0 means do not use buffer
-            gl.glVertexAttribPointer(loc, 2, gl.GL_FLOAT, False, 0, texcoords)
+            state.bind_buffer(gl.GL_ARRAY_BUFFER, 0)  # 0 means do not use buffer
+            state.vertex_attrib_pointer(loc, 2, gl.GL_FLOAT, False, 0, self._texcoords)
         
-        # Set uniforms (note that you could cache the locations)
-        loc = gl.glGetUniformLocation(self._prog_handle, 'u_view')
-        gl.glUniformMatrix4fv(loc, 1, False, self.view)
-        loc = gl.glGetUniformLocation(self._prog_handle, 'u_model')
-        gl.glUniformMatrix4fv(loc, 1, False, self.model)
-        loc = gl.glGetUniformLocation(self._prog_handle, 'u_projection')
-        gl.glUniformMatrix4fv(loc, 1, False, self.projection)
+        # Set uniforms (only uploaded when changed)
+        loc = state.uniform_location(self._prog_handle, 'u_view')
+        state.uniform_matrix4fv(loc, self.view)
+        loc = state.uniform_location(self._prog_handle, 'u_model')
+        state.uniform_matrix4fv(loc, self.model)
+        loc = state.uniform_location(self._prog_handle, 'u_projection')
+        state.uniform_matrix4fv(loc, self.projection)
         
         # Draw
+        faces = self._faces
         if use_buffers:
-            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self._faces_handle)
+            state.bind_buffer(gl.GL_ELEMENT_ARRAY_BUFFER, self._faces_handle)
             gl.glDrawElements(gl.GL_TRIANGLES, faces.size, gl.GL_UNSIGNED_INT, None)
         else:
             gl.glDrawElements(gl.GL_TRIANGLES, faces.size, gl.GL_UNSIGNED_INT, faces)
@@ -177,25 +173,28 @@ class Canvas:
         self.model      = np.eye(4,dtype=np.float32)
         self.projection = np.eye(4,dtype=np.float32)
         
-        self.theta = 0
-        self.phi = 0
+        # Fixed-step animation clock, rendered at the interpolated time
+        self.scheduler = FrameScheduler(fps=60)
         
         translate(self.view, 0,0,-5)
     
     
     def update_transforms(self, event):
-        self.theta += .5
-        self.phi += .5
-        self.model = np.eye(4, dtype=np.float32)
-        rotate(self.model, self.theta, 0,0,1)
-        rotate(self.model, self.phi,   0,1,0)
+        steps, alpha = self.scheduler.advance()
+        t = self.scheduler.time + alpha * self.scheduler.step
+        self.model = spin.sample(t)[0]
         
-        # Redraw and invoke new timer
-        glut.glutTimerFunc(1000/fps, self.update_transforms, fps)
+        # Redraw and invoke new timer at the next (drift free) deadline
+        glut.glutTimerFunc(self.scheduler.delay_ms(), self.update_transforms, fps)
         glut.glutPostRedisplay()
 
 
 if __name__ == '__main__':
+    # Run with --profile to write timings to cube_glut_profile.json on exit
+    profiler = Profiler(enabled='--profile' in sys.argv)
+    profiler.instrument(Canvas, 'on_paint', 'update_transforms', frame='on_paint')
+    atexit.register(profiler.dump, 'cube_glut_profile.json')
+    
     c = Canvas()
     fps = 60
     use_buffers = False
@@ -210,5 +209,6 @@ if __name__ == '__main__':
     
     # Go!
     c.on_initialize()
+    c.scheduler.start()
     glut.glutMainLoop()
     
\ No newline at end of file
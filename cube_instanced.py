@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Show a spinning 100x100 grid of cubes, all drawn in a single call using
+instanced rendering. Without instancing support, the cubes are expanded
+into one big mesh on the CPU instead.
+
+This demo uses GLUT and does not depend on vispy.
+"""
+
+import numpy as np
+import OpenGL.GLUT as glut
+import OpenGL.GL as gl
+from transforms import perspective, translate, scale, rotate
+from animation import Timeline, Track
+from instancing import INSTANCED_VERT_CODE, InstancedMesh
+from programs import ProgramCache, CACHE_DIR
+from scheduler import FrameScheduler
+from assets import Asset
+
+import vispy_io as io
+
+
+FRAG_CODE = """
+uniform sampler2D u_texture;
+varying vec2 v_texcoord;
+void main()
+{
+    gl_FragColor = texture2D(u_texture, v_texcoord);
+}
+"""
+
+
+# Number of cubes along each side of the grid
+n = 100
+
+
+def grid_matrices(n):
+    """ Get the model matrices of the n x n cubes, in one contiguous
+    array.
+    """
+    matrices = np.empty((n*n, 4, 4), np.float32)
+    for i in range(n*n):
+        x, y = i % n, i // n
+        M = matrices[i]
+        M[...] = np.eye(4)
+        scale(M, 0.4)
+        rotate(M, 3 * (x + y), 0,0,1)
+        rotate(M, 5 * x, 0,1,0)
+        translate(M, x - (n-1)/2.0, y - (n-1)/2.0, 0)
+    return matrices
+
+
+# Cube data, texture and model matrices, made on first use (see assets.py)
+mesh = Asset(io.read_mesh, 'cube.obj')
+texture = Asset(io.cat)
+matrices = Asset(grid_matrices, n)
+
+# Spin the whole grid 30 degrees per second
+spin = Timeline(loop=True)
+spin.add([Track('rotate', [0, 12], [0, 360], axis=(0,0,1)),
+          Track('rotate', [0, 12], [0, 360], axis=(1,0,0)),
+          Track('translate', [0, 12], [(0,0,-120)]*2)])
+
+
+class Canvas:
+    def __init__(self):
+        self.view = spin.sample(0)[0]
+        self.projection = np.eye(4, dtype=np.float32)
+        self.scheduler = FrameScheduler(fps=60)
+
+
+    def on_initialize(self):
+        gl.glClearColor(1,1,1,1)
+        gl.glEnable(gl.GL_DEPTH_TEST)
+
+        # Create shader program
+        self._programs = ProgramCache(gl, cache_dir=CACHE_DIR)
+        self._prog_handle = self._programs.get(INSTANCED_VERT_CODE, FRAG_CODE)
+
+        # Create texture
+        im = texture.get()
+        self._tex_handle = gl.glGenTextures(1)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self._tex_handle)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB,
+            im.shape[1], im.shape[0], 0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, im)
+        gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+
+        # Create the mesh with all instances
+        positions, faces, normals, texcoords = mesh.get()
+        self._mesh = InstancedMesh(gl, positions, faces, texcoords,
+                                   matrices.get())
+        self._mesh.initialize()
+        print('Drawing %i cubes, instanced: %s' % (len(self._mesh),
+                                                   self._mesh.instanced))
+
+
+    def on_resize(self, width, height):
+        gl.glViewport(0, 0, width, height)
+        self.projection = perspective( 45.0, width/float(height), 2.0, 500.0 )
+
+
+    def on_paint(self):
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+
+        gl.glUseProgram(self._prog_handle)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self._tex_handle)
+
+        loc = gl.glGetUniformLocation(self._prog_handle, 'u_view')
+        gl.glUniformMatrix4fv(loc, 1, False, self.view)
+        loc = gl.glGetUniformLocation(self._prog_handle, 'u_projection')
+        gl.glUniformMatrix4fv(loc, 1, False, self.projection)
+
+        # One draw call for all cubes
+        self._mesh.draw(self._prog_handle)
+
+        glut.glutSwapBuffers()
+
+
+    def update_transforms(self, value):
+        steps, alpha = self.scheduler.advance()
+        t = self.scheduler.time + alpha * self.scheduler.step
+        self.view = spin.sample(t)[0]
+
+        glut.glutTimerFunc(self.scheduler.delay_ms(), self.update_transforms, 0)
+        glut.glutPostRedisplay()
+
+
+if __name__ == '__main__':
+    c = Canvas()
+
+    glut.glutInit([])
+    glut.glutInitDisplayMode(glut.GLUT_DOUBLE | glut.GLUT_RGBA | glut.GLUT_DEPTH)
+    glut.glutCreateWindow('glut-cubes-instanced')
+    glut.glutReshapeWindow(600, 600)
+    glut.glutDisplayFunc(c.on_paint)
+    glut.glutReshapeFunc(c.on_resize)
+    glut.glutTimerFunc(0, c.update_transforms, 0)
+
+    # Go!
+    c.on_initialize()
+    c.scheduler.start()
+    glut.glutMainLoop()
@@ -8,6 +8,7 @@ import numpy as np
 from vispy import app, gl, oogl
 import vispy_io as io  # Because vispy 0.1.0 lacks some data files
 from transforms import translate, rotate, perspective
+from assets import Asset, random_colors
 
 
 VERT_CODE = """
@@ -38,12 +39,9 @@ void main()
 """
 
 
-# Read cube data
-positions, faces, normals, texcoords = io.read_mesh('cube.obj')
-colors = np.random.uniform(0,1,positions.shape).astype('float32')
-
-# Make uint16 to get past bug (which is fixed in next release)
-faces = faces.astype(np.uint16)  
+# Cube data, read on first use (see assets.py)
+mesh = Asset(io.read_mesh, 'cube.obj')
+colors = Asset(random_colors, mesh)
 
 
 class Canvas(app.Canvas):
@@ -8,6 +8,7 @@ import numpy as np
 from vispy import app, gl, oogl
 import vispy_io as io  # Because vispy 0.1.0 lacks some data files
 from transforms import translate, rotate, perspective
+from assets import Asset, random_colors
 
 
 VERT_CODE = """
@@ -38,10 +39,9 @@ void main()
 """
 
 
-# Read cube data
-positions, faces, normals, texcoords = io.read_mesh('cube.obj')
-colors = np.random.uniform(0,1,positions.shape).astype('float32')
-faces = faces.astype(np.uint16)
+# Cube data, read on first use (see assets.py)
+mesh = Asset(io.read_mesh, 'cube.obj')
+colors = Asset(random_colors, mesh)
 
 
 class Canvas(app.Canvas):
@@ -52,13 +52,16 @@ class Canvas(app.Canvas):
         
         self.program = oogl.ShaderProgram(  oogl.VertexShader(VERT_CODE),
                                             oogl.FragmentShader(FRAG_CODE) )
-        
-        self.program.attributes['a_position'] = positions
-        self.program.attributes['a_color'] = colors
     
     
     def on_initialize(self, event):
         gl.glClearColor(1,1,1,1)
+        
+        positions, faces, normals, texcoords = mesh.get()
+        self.program.attributes['a_position'] = positions
+        self.program.attributes['a_color'] = colors.get()
+        # Make uint16 to get past bug (which is fixed in next release)
+        self._faces = faces.astype(np.uint16)
     
     
     def on_resize(self, event):
@@ -73,7 +76,7 @@ class Canvas(app.Canvas):
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
         
         with self.program as prog:
-            prog.draw_elements(gl.GL_TRIANGLES, faces)
+            prog.draw_elements(gl.GL_TRIANGLES, self._faces)
         
         # Swap buffers
         self.swap_buffers()
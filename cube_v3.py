@@ -8,6 +8,7 @@ import numpy as np
 from vispy import app, gl, oogl
 import vispy_io as io  # Because vispy 0.1.0 lacks some data files
 from transforms import perspective, translate, rotate
+from assets import Asset, random_colors
 
 
 VERT_CODE = """
@@ -38,11 +39,9 @@ void main()
 """
 
 
-# Read cube data (replace 'cube.obj' with 'teapot.obj'
-positions, faces, normals, texcoords = io.read_mesh('cube.obj')
-colors = np.random.uniform(0,1,positions.shape).astype('float32')
-
-faces_buffer = oogl.ElementBuffer(faces.astype(np.uint16))
+# Cube data (replace 'cube.obj' with 'teapot.obj'), read on first use
+mesh = Asset(io.read_mesh, 'cube.obj')
+colors = Asset(random_colors, mesh)
 
 
 class Canvas(app.Canvas):
@@ -54,10 +53,6 @@ class Canvas(app.Canvas):
         self.program = oogl.ShaderProgram(  oogl.VertexShader(VERT_CODE),
                                             oogl.FragmentShader(FRAG_CODE) )
         
-        # Set attributes
-        self.program.attributes['a_position'] = oogl.VertexBuffer(positions)
-        self.program.attributes['a_color'] = oogl.VertexBuffer(colors)
-        
         self.init_transforms()
         
         self.timer = app.Timer(1.0/60)
@@ -68,6 +63,12 @@ class Canvas(app.Canvas):
     def on_initialize(self, event):
         gl.glClearColor(1,1,1,1)
         gl.glEnable(gl.GL_DEPTH_TEST)
+        
+        # Set attributes
+        positions, faces, normals, texcoords = mesh.get()
+        self.program.attributes['a_position'] = oogl.VertexBuffer(positions)
+        self.program.attributes['a_color'] = oogl.VertexBuffer(colors.get())
+        self._faces_buffer = oogl.ElementBuffer(faces.astype(np.uint16))
     
     
     def on_resize(self, event):
@@ -82,7 +83,7 @@ class Canvas(app.Canvas):
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
         
         with self.program as prog:
-            prog.draw_elements(gl.GL_TRIANGLES, faces_buffer)
+            prog.draw_elements(gl.GL_TRIANGLES, self._faces_buffer)
         
         # Swap buffers
         self.swap_buffers()
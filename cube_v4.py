@@ -4,10 +4,16 @@
 Show spinning cube using VBO's, and transforms, and texturing.
 """
 
+import sys
+import atexit
 import numpy as np
 from vispy import app, gl, oogl
 import vispy_io as io  # Because vispy 0.1.0 lacks some data files
-from transforms import perspective, translate, rotate
+from transforms import perspective, translate
+from animation import Timeline, Track
+from scheduler import FrameScheduler
+from instrument import Profiler
+from assets import Asset
 
 
 VERT_CODE = """
@@ -43,11 +49,14 @@ void main()
 """
 
 
-# Read cube data
-positions, faces, normals, texcoords = io.read_mesh('cube.obj')
-colors = np.random.uniform(0,1,positions.shape).astype('float32')
+# Cube data and texture, read on first use (see assets.py)
+mesh = Asset(io.read_mesh, 'cube.obj')
+texture = Asset(io.cat)
 
-faces_buffer = oogl.ElementBuffer(faces.astype(np.uint16))
+# Spin 30 degrees per second around z and y (0.5 degree per tick at 60 fps)
+spin = Timeline(loop=True)
+spin.add([Track('rotate', [0, 12], [0, 360], axis=(0,0,1)),
+          Track('rotate', [0, 12], [0, 360], axis=(0,1,0))])
 
 
 class Canvas(app.Canvas):
@@ -59,12 +68,6 @@ class Canvas(app.Canvas):
         self.program = oogl.ShaderProgram(  oogl.VertexShader(VERT_CODE),
                                             oogl.FragmentShader(FRAG_CODE) )
         
-        # Set attributes
-        self.program.attributes['a_position'] = oogl.VertexBuffer(positions)
-        self.program.attributes['a_texcoord'] = oogl.VertexBuffer(texcoords)
-        
-        self.program.uniforms['u_texture'] = oogl.Texture2D(io.cat())
-        
         # Handle transformations
         self.init_transforms()
         
@@ -76,6 +79,14 @@ class Canvas(app.Canvas):
     def on_initialize(self, event):
         gl.glClearColor(1,1,1,1)
         gl.glEnable(gl.GL_DEPTH_TEST)
+        
+        # Set attributes
+        positions, faces, normals, texcoords = mesh.get()
+        self.program.attributes['a_position'] = oogl.VertexBuffer(positions)
+        self.program.attributes['a_texcoord'] = oogl.VertexBuffer(texcoords)
+        self._faces_buffer = oogl.ElementBuffer(faces.astype(np.uint16))
+        
+        self.program.uniforms['u_texture'] = oogl.Texture2D(texture.get())
     
     
     def on_resize(self, event):
@@ -90,7 +101,7 @@ class Canvas(app.Canvas):
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
         
         with self.program as prog:
-            prog.draw_elements(gl.GL_TRIANGLES, faces_buffer)
+            prog.draw_elements(gl.GL_TRIANGLES, self._faces_buffer)
         
         # Swap buffers
         self.swap_buffers()
@@ -101,8 +112,8 @@ class Canvas(app.Canvas):
         self.model      = np.eye(4,dtype=np.float32)
         self.projection = np.eye(4,dtype=np.float32)
         
-        self.theta = 0
-        self.phi = 0
+        # Fixed-step animation clock, rendered at the interpolated time
+        self.scheduler = FrameScheduler(fps=60)
         
         translate(self.view, 0,0,-5)
         self.program.uniforms['u_model'] = self.model
@@ -110,16 +121,19 @@ class Canvas(app.Canvas):
     
     
     def update_transforms(self,event):
-        self.theta += .5
-        self.phi += .5
-        self.model = np.eye(4, dtype=np.float32)
-        rotate(self.model, self.theta, 0,0,1)
-        rotate(self.model, self.phi,   0,1,0)
+        steps, alpha = self.scheduler.advance()
+        t = self.scheduler.time + alpha * self.scheduler.step
+        self.model = spin.sample(t)[0]
         self.program.uniforms['u_model'] = self.model
         self.update()
 
 
 if __name__ == '__main__':
+    # Run with --profile to write timings to cube_v4_profile.json on exit
+    profiler = Profiler(enabled='--profile' in sys.argv)
+    profiler.instrument(Canvas, 'on_paint', 'update_transforms', frame='on_paint')
+    atexit.register(profiler.dump, 'cube_v4_profile.json')
+    
     c = Canvas()
     c.show()
     app.run()
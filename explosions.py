@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generating the data for the explosions of the fireworks demos.
+
+Creating the vertex data of an explosion takes 7*N normally distributed
+random numbers, which at large N takes long enough to cause a visible
+hitch when done in the draw loop. The ExplosionGenerator therefore
+creates the next explosion on a worker thread, in a second buffer, while
+the current one is shown. next() waits for it (normally it is long done),
+swaps the buffers and starts on the one after that.
+
+The particles are sorted by decreasing lifetime, so that the particles
+that are still alive at any time are a prefix of the data; alive_count()
+gives its length, and only that many vertices need to be drawn.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from randomfill import fill_normal
+
+
+VERTEX_DTYPE = np.dtype([('a_lifetime', np.float32),
+                         ('a_startPosition', np.float32, 3),
+                         ('a_endPosition', np.float32, 3)])
+
+# The distributions (mean, std) of the fields of an explosion
+EXPLOSION_FIELDS = (('a_lifetime', 2.0, 0.5),
+                    ('a_startPosition', 0.0, 0.2),
+                    ('a_endPosition', 0.0, 1.2))
+
+
+def fill_explosion(data, seed=None, threads=None):
+    """ Fill the vertex data (with the fields of VERTEX_DTYPE) of an
+    explosion in place, and return a random center position and color.
+    The result only depends on the seed (an int or SeedSequence), not on
+    the number of threads (see randomfill.fill_normal).
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    rng_seed, fill_seed = seed.spawn(2)
+    rng = np.random.default_rng(rng_seed)
+    centerpos = rng.uniform(-0.5, 0.5, (3,))
+    # New color, scale alpha with N
+    alpha = 1.0 / len(data)**0.08
+    color = tuple(rng.uniform(0.1, 0.9, (3,))) + (alpha,)
+    fill_normal(data, EXPLOSION_FIELDS, fill_seed, threads=threads)
+    return centerpos, color
+
+
+def sort_by_lifetime(data):
+    """ Sort the vertex data in place by decreasing a_lifetime.
+    """
+    order = np.argsort(data['a_lifetime'], kind='stable')[::-1]
+    data[...] = data[order]
+
+
+def alive_count(data, t):
+    """ Get the number of particles in the sorted vertex data that are
+    still alive at time t, i.e. for which t <= a_lifetime.
+    """
+    lifetimes = data['a_lifetime'][::-1]  # Increasing
+    return len(data) - int(np.searchsorted(lifetimes, t, side='left'))
+
+
+def _make_explosion(data, seed, sort, threads, layout=None, scratch=None):
+    if layout is None:
+        scratch = data
+    centerpos, color = fill_explosion(scratch, seed, threads)
+    if sort:
+        sort_by_lifetime(scratch)
+    if layout is not None:
+        layout.pack(scratch, out=data)
+    return centerpos, color
+
+
+
+class ExplosionGenerator(object):
+    """ ExplosionGenerator(n, dtype=VERTEX_DTYPE, background=True, seed=None,
+    sort=True, threads=None, layout=None)
+
+    Parameters
+    ----------
+    n : int
+        The number of particles per explosion.
+    dtype : numpy dtype
+        The dtype of the vertex data.
+    background : bool
+        Whether to generate the next explosion on a worker thread. If
+        False, explosions are generated when next() is called.
+    seed : int
+        Seed for the random numbers. Every explosion gets its own seed,
+        spawned from this one, so the sequence of explosions is
+        reproducible.
+    sort : bool
+        Whether to sort the particles by decreasing lifetime (see
+        alive_count).
+    threads : int
+        The number of threads to generate the random numbers with.
+        Default is the number of CPUs.
+    layout : ParticleLayout
+        If given, the vertex data is packed into this layout (see
+        layouts.py) and dtype is ignored.
+
+    """
+
+    def __init__(self, n, dtype=VERTEX_DTYPE, background=True, seed=None,
+                 sort=True, threads=None, layout=None):
+        self._layout = self._scratch = None
+        if layout is not None:
+            dtype = layout.dtype
+            if dtype != VERTEX_DTYPE:
+                # Generate in float32, then pack
+                self._layout = layout
+                self._scratch = np.zeros(n, VERTEX_DTYPE)
+        self._buffers = [np.zeros(n, dtype), np.zeros(n, dtype)]
+        self._back = 0
+        self._seed = np.random.SeedSequence(seed)
+        self.background = background
+        self.sort = sort
+        self.threads = threads
+        self._executor = None
+        self._future = None
+        if background:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+            self._start()
+
+
+    def _start(self):
+        data = self._buffers[self._back]
+        seed = self._seed.spawn(1)[0]
+        self._future = self._executor.submit(_make_explosion, data, seed,
+                                             self.sort, self.threads,
+                                             self._layout, self._scratch)
+
+
+    def next(self):
+        """ Get the next explosion, as (vertex_data, centerpos, color).
+        The vertex data is valid until the next call, after which its
+        buffer is used to generate the explosion after that.
+        """
+        data = self._buffers[self._back]
+        if self.background:
+            centerpos, color = self._future.result()
+        else:
+            seed = self._seed.spawn(1)[0]
+            centerpos, color = _make_explosion(data, seed, self.sort,
+                                               self.threads, self._layout,
+                                               self._scratch)
+        # Swap, and fill the other buffer while this one is shown
+        self._back = 1 - self._back
+        if self.background:
+            self._start()
+        return data, centerpos, color
+
+
+    def close(self):
+        """ Stop the worker thread.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self.background = False
@@ -13,6 +13,8 @@ Object (VBO). After each explosion, vertex data for the next explosion are
 calculated, such that each explostion is unique.
 """
 
+import sys
+import atexit
 import time
 import numpy as np
 import OpenGL.GLUT as glut
@@ -20,24 +22,24 @@ import ctypes
 
 import OpenGL.GL as gl  # We only use the ES 2.0 subset
 import vispy_io as io
+from glstate import GLState
+from buffers import DynamicBuffer
+from programs import ProgramCache, CACHE_DIR
+from instrument import Profiler
+from explosions import ExplosionGenerator
+from layouts import LAYOUTS
+from sprites import sprite_levels
 
 
-# Create a texture
-radius = 32
-im1 = np.random.normal(0.8, 0.3, (radius*2+1, radius*2+1))
-
-# Mask it with a disk
-L = np.linspace(-radius, radius, 2 * radius + 1)
-(X, Y) = np.meshgrid(L, L)
-im1 *= np.array((X**2 + Y**2) <= radius * radius, dtype='float32')
-
 # Set number of particles, you should be able to scale this to 100000
 N = 10000
 
-# Create vertex data container
-vertex_data = np.zeros((N,), dtype=[('a_lifetime', np.float32, 1),
-                                    ('a_startPosition', np.float32, 3),
-                                    ('a_endPosition', np.float32, 3)])
+# Whether to generate the next explosion in the background (see explosions.py)
+background = True
+
+# The layout of the vertex data; 'half' and 'packed' take half the memory
+# of 'float32' (see layouts.py)
+layout = LAYOUTS['float32']
 
 
 VERT_CODE = """
@@ -89,10 +91,15 @@ void main()
 class Canvas:
     def __init__(self):
         self._starttime = time.time()
+        # The vertex data is made per canvas, not at import
+        self._vbo = DynamicBuffer(np.zeros((N,), layout.dtype), gl)
+        self._explosions = ExplosionGenerator(N, background=background,
+                                              layout=layout)
         self._new_explosion()
     
     
     def on_initialize(self):
+        self._state = GLState(gl)
         gl.glClearColor(0,0,0,1);
         
         # Enable blending
@@ -104,50 +111,25 @@ class Canvas:
         gl.glEnable(GL.GL_VERTEX_PROGRAM_POINT_SIZE)
         gl.glEnable(GL.GL_POINT_SPRITE)
         
-        # Create shader program
-        self._prog_handle = gl.glCreateProgram()
-
-        # Create vertex shader
-        shader = gl.glCreateShader(gl.GL_VERTEX_SHADER)
-        gl.glShaderSource(shader, VERT_CODE)
-        gl.glCompileShader(shader)
-        status = gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS)
-        if not status:
-            # We could show more useful info here, but that takes a few lines
-            raise RuntimeError('Vertex shader did not compile.')
-        else:
-            gl.glAttachShader(self._prog_handle, shader)
-        
-        # Create fragment shader
-        shader = gl.glCreateShader(gl.GL_FRAGMENT_SHADER)
-        gl.glShaderSource(shader, FRAG_CODE)
-        gl.glCompileShader(shader)
-        status = gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS)
-        if not status:
-            # We could show more useful info here, but that takes a few lines
-            raise RuntimeError('Fragment shader did not compile.')
-        else:
-            gl.glAttachShader(self._prog_handle, shader)
-        
-        # Link
-        gl.glLinkProgram(self._prog_handle)
-        status = gl.glGetProgramiv(self._prog_handle, gl.GL_LINK_STATUS)
-        if not status:
-            # We could show more useful info here, but that takes a few lines
-            raise RuntimeError('Program did not link.')
+        # Create shader program (cached by source, and on disk if possible)
+        self._programs = ProgramCache(gl, cache_dir=CACHE_DIR)
+        self._prog_handle = self._programs.get(layout.shader(VERT_CODE),
+                                               FRAG_CODE)
         
         # Create texture
         self._tex_handle = gl.glGenTextures(1)
         gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
         gl.glBindTexture(gl.GL_TEXTURE_2D, self._tex_handle)
-        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_LUMINANCE, 
-            im1.shape[1], im1.shape[0], 0, gl.GL_LUMINANCE, gl.GL_FLOAT,
-             im1.astype(np.float32))
-        gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        for level, im in enumerate(sprite_levels()):
+            gl.glTexImage2D(gl.GL_TEXTURE_2D, level, gl.GL_LUMINANCE,
+                im.shape[1], im.shape[0], 0, gl.GL_LUMINANCE, gl.GL_FLOAT, im)
+        gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER,
+                          gl.GL_LINEAR_MIPMAP_LINEAR)
         gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
         
-        # Create vertex buffer
-        self._vbo_handle = gl.glGenBuffers(1)
+        # We made GL calls directly, so the state object must not trust
+        # what it knows
+        self._state.invalidate()
     
     
     def on_paint(self):
@@ -159,39 +141,37 @@ class Canvas:
         
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
         
-        # Activate program  and texture
-        gl.glUseProgram(self._prog_handle)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self._tex_handle)
-        
-        # Update VBO
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self._vbo_handle)
-        gl.glBufferData(gl.GL_ARRAY_BUFFER, vertex_data.nbytes, vertex_data, gl.GL_DYNAMIC_DRAW)
-        
-        # Set attributes (again, the loc can be cached)
-        loc = gl.glGetAttribLocation(self._prog_handle, 'a_lifetime')
-        gl.glEnableVertexAttribArray(loc)
-        gl.glVertexAttribPointer(loc, 1, gl.GL_FLOAT, False, 7*4, ctypes.c_voidp(0))
+        # Activate program  and texture (skipped if already active)
+        state = self._state
+        state.use_program(self._prog_handle)
+        state.bind_texture(gl.GL_TEXTURE_2D, self._tex_handle)
+        
+        # Update VBO, only if the data changed (the first time it is created)
+        self._vbo.upload()
+        state.bind_buffer(gl.GL_ARRAY_BUFFER, self._vbo.handle)
+        
+        # Set attributes (the locs are cached by the state object), with
+        # the types and offsets of the layout
+        stride = layout.dtype.itemsize
+        for name, size, gltype, normalized, offset in layout.attrib_pointers(gl):
+            loc = state.attrib_location(self._prog_handle, name)
+            state.enable_vertex_attrib_array(loc)
+            state.vertex_attrib_pointer(loc, size, gltype, normalized, stride,
+                                        ctypes.c_voidp(offset))
         #
-        loc = gl.glGetAttribLocation(self._prog_handle, 'a_startPosition')
-        gl.glEnableVertexAttribArray(loc)
-        gl.glVertexAttribPointer(loc, 3, gl.GL_FLOAT, False, 7*4, ctypes.c_voidp(1*4))
-        #
-        loc = gl.glGetAttribLocation(self._prog_handle, 'a_endPosition')
-        gl.glEnableVertexAttribArray(loc)
-        gl.glVertexAttribPointer(loc, 3, gl.GL_FLOAT, False, 7*4, ctypes.c_voidp(4*4))
-        #
-        loc = gl.glGetUniformLocation(self._prog_handle, 'u_color')
-        gl.glUniform4f(loc, *self._color)
+        loc = state.uniform_location(self._prog_handle, 'u_color')
+        state.uniformf(loc, *self._color)
         
-        # Set unforms
-        loc = gl.glGetUniformLocation(self._prog_handle, 'u_time')
-        gl.glUniform1f(loc, time.time()-self._starttime)
+        # Set unforms (only uploaded when changed)
+        t = time.time() - self._starttime
+        loc = state.uniform_location(self._prog_handle, 'u_time')
+        state.uniformf(loc, t)
         #
-        loc = gl.glGetUniformLocation(self._prog_handle, 'u_centerPosition')
-        gl.glUniform3f(loc, *self._centerpos)
+        loc = state.uniform_location(self._prog_handle, 'u_centerPosition')
+        state.uniformf(loc, *self._centerpos)
         
-        # Draw
-        gl.glDrawArrays(gl.GL_POINTS, 0, N)
+        # Draw, only the particles that are still alive (they are sorted)
+        gl.glDrawArrays(gl.GL_POINTS, 0, layout.alive_count(self._vbo.data, t))
         
         # Swap buffers
         glut.glutSwapBuffers()
@@ -205,18 +185,13 @@ class Canvas:
     
     
     def _new_explosion(self):
-        # New centerpos
-        self._centerpos = np.random.uniform(-0.5, 0.5, (3,))
-        
-        # New color, scale alpha with N
-        alpha = 1.0 / N**0.08
-        color = np.random.uniform(0.1, 0.9, (3,))
-        self._color = tuple(color)+ (alpha,)
-        
-        # Create new vertex data
-        vertex_data['a_lifetime'] = np.random.normal(2.0, 0.5, (N,))
-        vertex_data['a_startPosition'] = np.random.normal(0.0, 0.2, (N,3))
-        vertex_data['a_endPosition'] = np.random.normal(0.0, 1.2, (N,3))
+        # Take the next explosion (normally made in the background while
+        # the previous one was shown), with its centerpos and color
+        data, self._centerpos, self._color = self._explosions.next()
+
+        # Swap the vertex data of the VBO
+        self._vbo.data = data
+        self._vbo.mark_dirty()
         
         # Set time to zero
         self._starttime = time.time()
@@ -225,6 +200,18 @@ class Canvas:
 
 
 if __name__ == '__main__':
+    # Run with --profile to write timings to fireworks_glut_profile.json on
+    # exit, and add --sync to compare the worst-case frame time (max_ms of
+    # the frame) with explosions generated in the draw loop
+    background = '--sync' not in sys.argv
+    # Run with --layout=half or --layout=packed for a compact vertex layout
+    for arg in sys.argv[1:]:
+        if arg.startswith('--layout='):
+            layout = LAYOUTS[arg.split('=', 1)[1]]
+    profiler = Profiler(enabled='--profile' in sys.argv)
+    profiler.instrument(Canvas, 'on_paint', '_new_explosion', frame='on_paint')
+    atexit.register(profiler.dump, 'fireworks_glut_profile.json')
+    
     c = Canvas()
     fps = 60
     use_buffers = False
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Example demonstrating many overlapping explosions using point sprites.
+
+Unlike the other fireworks examples, where one explosion owns all
+particles, this one keeps about a million particles in a fixed-size pool.
+A new burst starts every 0.1 s, with its own start time, center and
+color stored per particle, and its slots are reused when it has died.
+Only the slots that were written are uploaded to the vertex buffer.
+
+This demo uses GLUT and does not depend on vispy.
+"""
+
+import time
+import ctypes
+import numpy as np
+import OpenGL.GLUT as glut
+
+import OpenGL.GL as gl
+from particles import ParticlePool, POOL_VERT_SHADER, POOL_FRAG_SHADER
+from buffers import DynamicBuffer
+from glstate import GLState
+from programs import ProgramCache, CACHE_DIR
+from sprites import sprite_levels
+
+
+# Size of the pool, particles per burst and time between bursts
+CAPACITY = 2**20
+BURST = 25000
+INTERVAL = 0.1
+
+
+class Canvas:
+    def __init__(self):
+        self._starttime = time.time()
+        self._lastburst = -INTERVAL
+        self._pool = ParticlePool(CAPACITY)
+        self._vbo = DynamicBuffer(self._pool.data, gl)
+    
+    
+    def on_initialize(self):
+        self._state = GLState(gl)
+        gl.glClearColor(0,0,0,1);
+        
+        # Enable blending
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE)
+        
+        # Note: normal GL requires these lines, ES 2.0 does not
+        gl.glEnable(gl.GL_VERTEX_PROGRAM_POINT_SIZE)
+        gl.glEnable(gl.GL_POINT_SPRITE)
+        
+        # Create shader program
+        self._programs = ProgramCache(gl, cache_dir=CACHE_DIR)
+        self._prog_handle = self._programs.get(POOL_VERT_SHADER, POOL_FRAG_SHADER)
+        
+        # Create texture
+        self._tex_handle = gl.glGenTextures(1)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self._tex_handle)
+        for level, im in enumerate(sprite_levels()):
+            gl.glTexImage2D(gl.GL_TEXTURE_2D, level, gl.GL_LUMINANCE,
+                im.shape[1], im.shape[0], 0, gl.GL_LUMINANCE, gl.GL_FLOAT, im)
+        gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER,
+                          gl.GL_LINEAR_MIPMAP_LINEAR)
+        gl.glTexParameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        
+        # We made GL calls directly, so the state object must not trust
+        # what it knows
+        self._state.invalidate()
+    
+    
+    def on_paint(self):
+        t = time.time() - self._starttime
+        self._update_pool(t)
+        
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        
+        state = self._state
+        state.use_program(self._prog_handle)
+        state.bind_texture(gl.GL_TEXTURE_2D, self._tex_handle)
+        
+        # Upload the slots that changed
+        for start, stop in self._pool.take_changed():
+            self._vbo.mark_dirty(start, stop)
+        self._vbo.upload()
+        state.bind_buffer(gl.GL_ARRAY_BUFFER, self._vbo.handle)
+        
+        # All attributes are interleaved in one buffer
+        dtype = self._pool.data.dtype
+        for name in dtype.names:
+            loc = state.attrib_location(self._prog_handle, name)
+            size = int(np.prod(dtype[name].shape or (1,)))
+            offset = dtype.fields[name][1]
+            state.enable_vertex_attrib_array(loc)
+            state.vertex_attrib_pointer(loc, size, gl.GL_FLOAT, False,
+                                        dtype.itemsize, ctypes.c_void_p(offset))
+        
+        loc = state.uniform_location(self._prog_handle, 'u_time')
+        state.uniformf(loc, t)
+        
+        # Draw all slots, free ones are hidden by the shader
+        gl.glDrawArrays(gl.GL_POINTS, 0, self._pool.capacity)
+        
+        glut.glutSwapBuffers()
+        glut.glutPostRedisplay()
+    
+    
+    def _update_pool(self, t):
+        # Free the slots of dead bursts, then start new ones when due
+        self._pool.update(t)
+        while t - self._lastburst >= INTERVAL:
+            self._lastburst += INTERVAL
+            if self._pool.free < BURST:
+                continue  # Pool is full, skip this burst
+            center = np.random.uniform(-0.5, 0.5, (3,))
+            color = tuple(np.random.uniform(0.1, 0.9, (3,))) + (0.3,)
+            self._pool.emit(BURST, self._lastburst, center, color)
+
+
+if __name__ == '__main__':
+    c = Canvas()
+    
+    glut.glutInit([])
+    glut.glutInitDisplayMode(glut.GLUT_DOUBLE | glut.GLUT_RGBA | glut.GLUT_DEPTH)
+    glut.glutCreateWindow('glut-fireworks-pool')
+    glut.glutReshapeWindow(400, 400)
+    glut.glutDisplayFunc(c.on_paint)
+    
+    # Go!
+    c.on_initialize()
+    glut.glutMainLoop()
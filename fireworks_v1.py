@@ -10,29 +10,23 @@ Object (VBO). After each explosion, vertex data for the next explosion are
 calculated, such that each explostion is unique.
 """
 
+import sys
+import atexit
 import time
 import numpy as np
 import vispy
 from vispy import oogl
 from vispy import app
 from vispy import gl
-
-# Create a texture
-radius = 32
-im1 = np.random.normal(0.8, 0.3, (radius*2+1, radius*2+1))
-
-# Mask it with a disk
-L = np.linspace(-radius, radius, 2 * radius + 1)
-(X, Y) = np.meshgrid(L, L)
-im1 *= np.array((X**2 + Y**2) <= radius * radius, dtype='float32')
+from instrument import Profiler
+from explosions import ExplosionGenerator, alive_count, VERTEX_DTYPE
+from sprites import sprite_levels
 
 # Set number of particles, you should be able to scale this to 100000
 N = 10000
 
-# Create vertex data container
-vertex_data = np.zeros((N,), dtype=[('a_lifetime', np.float32, 1),
-                                    ('a_startPosition', np.float32, 3),
-                                    ('a_endPosition', np.float32, 3)])
+# Whether to generate the next explosion in the background (see explosions.py)
+background = True
 
 
 VERT_SHADER = """
@@ -93,14 +87,16 @@ class Canvas(app.Canvas):
         self._program = oogl.ShaderProgram( oogl.VertexShader(VERT_SHADER), 
                                             oogl.FragmentShader(FRAG_SHADER) )
         
-        # Create vbo
-        self._vbo = oogl.VertexBuffer(vertex_data)
+        # Create vbo (the vertex data is made per canvas, not at import)
+        self._vbo = oogl.VertexBuffer(np.zeros((N,), VERTEX_DTYPE))
         
         # Set uniforms, samplers, attributes
         self._program.attributes.update(self._vbo)
-        self._program.uniforms['s_texture'] = oogl.Texture2D(im1)
+        self._program.uniforms['s_texture'] = oogl.Texture2D(sprite_levels()[0])
         
         # Create first explosion
+        self._explosions = ExplosionGenerator(N, VERTEX_DTYPE,
+                                              background=background)
         self._new_explosion()
     
     
@@ -123,10 +119,11 @@ class Canvas(app.Canvas):
         gl.glViewport(0, 0, *self.geometry[2:])
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
         
-        # Draw
+        # Draw, only the particles that are still alive (they are sorted)
+        t = time.time() - self._starttime
         with self._program as prog:
-            prog.uniforms['u_time'] = time.time() - self._starttime
-            prog.draw_arrays(gl.GL_POINTS)
+            prog.uniforms['u_time'] = t
+            prog.draw_arrays(gl.GL_POINTS, 0, alive_count(self._data, t))
         
         # Swap buffers and invoke a new draw
         self.swap_buffers()
@@ -138,30 +135,32 @@ class Canvas(app.Canvas):
     
     
     def _new_explosion(self):
-        
-        # New centerpos
-        centerpos = np.random.uniform(-0.5, 0.5, (3,))
+
+        # Take the next explosion (normally made in the background while
+        # the previous one was shown)
+        data, centerpos, color = self._explosions.next()
+        self._data = data
+
+        # New centerpos and color
         self._program.uniforms['u_centerPosition'] = centerpos
-        
-        # New color, scale alpha with N
-        alpha = 1.0 / N**0.08
-        color = np.random.uniform(0.1, 0.9, (3,))
-        
-        self._program.uniforms['u_color'] = tuple(color)+ (alpha,)
-        
-        # Create new vertex data
-        vertex_data['a_lifetime'] = np.random.normal(2.0, 0.5, (N,))
-        vertex_data['a_startPosition'] = np.random.normal(0.0, 0.2, (N,3))
-        vertex_data['a_endPosition'] = np.random.normal(0.0, 1.2, (N,3))
-       
+        self._program.uniforms['u_color'] = color
+
         # Update VBO
-        self._vbo.set_data(vertex_data)
+        self._vbo.set_data(data)
         
         # Set time to zero
         self._starttime = time.time()
 
 
 if __name__ == '__main__':
+    # Run with --profile to write timings to fireworks_v1_profile.json on
+    # exit, and add --sync to compare the worst-case frame time (max_ms of
+    # the frame) with explosions generated in the draw loop
+    background = '--sync' not in sys.argv
+    profiler = Profiler(enabled='--profile' in sys.argv)
+    profiler.instrument(Canvas, 'on_paint', '_new_explosion', frame='on_paint')
+    atexit.register(profiler.dump, 'fireworks_v1_profile.json')
+    
     c = Canvas()
     c.show()
     app.run()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A thin state tracking layer over a GL module.
+
+GLState remembers what program, textures and buffers are bound, which
+vertex attribute arrays are enabled and what was last given to
+glVertexAttribPointer and glUniform*, and skips calls that would not
+change anything. Attribute and uniform locations are cached per program.
+Calls that are issued and calls that are avoided are counted per GL
+function, so the effect can be measured.
+
+The GL module is passed in (default OpenGL.GL), so anything that has the
+same functions can be used, e.g. a fake that records the calls. Calls
+that are not tracked are passed on to the GL module unchanged. If GL
+state is changed behind the back of a GLState object, call invalidate().
+"""
+
+from collections import Counter
+
+
+class GLState(object):
+    """ GLState(gl=None)
+
+    Parameters
+    ----------
+    gl : module
+        The GL module to forward calls to. Default is OpenGL.GL.
+
+    """
+
+    def __init__(self, gl=None):
+        if gl is None:
+            import OpenGL.GL as gl
+        self._gl = gl
+        self.issued = Counter()
+        self.avoided = Counter()
+        self._attrib_locations = {}
+        self._uniform_locations = {}
+        self.invalidate()
+
+
+    def __getattr__(self, name):
+        # Pass on everything we do not track
+        return getattr(self._gl, name)
+
+
+    def invalidate(self):
+        """ Forget the tracked state (but not the cached locations), so
+        that the next calls are all issued.
+        """
+        self._program = None
+        self._active_texture = None
+        self._textures = {}
+        self._buffers = {}
+        self._enabled = set()
+        self._pointers = {}
+        self._uniforms = {}
+
+
+    def _call(self, name, *args):
+        self.issued[name] += 1
+        return getattr(self._gl, name)(*args)
+
+
+    def _skip(self, name):
+        self.avoided[name] += 1
+
+
+    def attrib_location(self, program, name):
+        """ Cached glGetAttribLocation.
+        """
+        key = program, name
+        try:
+            loc = self._attrib_locations[key]
+        except KeyError:
+            loc = self._call('glGetAttribLocation', program, name)
+            self._attrib_locations[key] = loc
+        else:
+            self._skip('glGetAttribLocation')
+        return loc
+
+
+    def uniform_location(self, program, name):
+        """ Cached glGetUniformLocation.
+        """
+        key = program, name
+        try:
+            loc = self._uniform_locations[key]
+        except KeyError:
+            loc = self._call('glGetUniformLocation', program, name)
+            self._uniform_locations[key] = loc
+        else:
+            self._skip('glGetUniformLocation')
+        return loc
+
+
+    def forget_program(self, program):
+        """ Drop the cached locations and uniform values of a program,
+        e.g. when it is relinked or deleted.
+        """
+        for cache in (self._attrib_locations, self._uniform_locations,
+                      self._uniforms):
+            for key in [key for key in cache if key[0] == program]:
+                del cache[key]
+        if self._program == program:
+            self._program = None
+
+
+    def use_program(self, program):
+        if program == self._program:
+            self._skip('glUseProgram')
+        else:
+            self._call('glUseProgram', program)
+            self._program = program
+
+
+    def active_texture(self, unit):
+        if unit == self._active_texture:
+            self._skip('glActiveTexture')
+        else:
+            self._call('glActiveTexture', unit)
+            self._active_texture = unit
+
+
+    def bind_texture(self, target, texture):
+        key = self._active_texture, target
+        if self._textures.get(key) == texture:
+            self._skip('glBindTexture')
+        else:
+            self._call('glBindTexture', target, texture)
+            self._textures[key] = texture
+
+
+    def bind_buffer(self, target, buffer):
+        if self._buffers.get(target) == buffer:
+            self._skip('glBindBuffer')
+        else:
+            self._call('glBindBuffer', target, buffer)
+            self._buffers[target] = buffer
+
+
+    def buffer_bound(self, target):
+        """ Get the buffer that is bound to target, or None if unknown.
+        """
+        return self._buffers.get(target)
+
+
+    def enable_vertex_attrib_array(self, loc):
+        if loc in self._enabled:
+            self._skip('glEnableVertexAttribArray')
+        else:
+            self._call('glEnableVertexAttribArray', loc)
+            self._enabled.add(loc)
+
+
+    def disable_vertex_attrib_array(self, loc):
+        if loc not in self._enabled:
+            self._skip('glDisableVertexAttribArray')
+        else:
+            self._call('glDisableVertexAttribArray', loc)
+            self._enabled.discard(loc)
+
+
+    def vertex_attrib_pointer(self, loc, size, type, normalized, stride,
+                              pointer):
+        """ glVertexAttribPointer. The call is skipped only if a buffer
+        is bound and the arguments are the same as before; with client
+        side arrays the data is sent on every call.
+        """
+        buffer = self._buffers.get(self._gl.GL_ARRAY_BUFFER)
+        if buffer:
+            offset = getattr(pointer, 'value', pointer)  # ctypes pointers
+            key = buffer, size, type, bool(normalized), stride, offset
+            if self._pointers.get(loc) == key:
+                self._skip('glVertexAttribPointer')
+                return
+            self._pointers[loc] = key
+        else:
+            self._pointers.pop(loc, None)
+        self._call('glVertexAttribPointer', loc, size, type, normalized,
+                   stride, pointer)
+
+
+    def _uniform_changed(self, loc, value):
+        key = self._program, loc
+        if self._uniforms.get(key) == value:
+            return False
+        self._uniforms[key] = value
+        return True
+
+
+    def uniformf(self, loc, *values):
+        """ glUniform1f .. glUniform4f, depending on the number of values.
+        """
+        name = 'glUniform%if' % len(values)
+        values = tuple(float(v) for v in values)
+        if self._uniform_changed(loc, values):
+            self._call(name, loc, *values)
+        else:
+            self._skip(name)
+
+
+    def uniform_matrix4fv(self, loc, matrix):
+        """ glUniformMatrix4fv for a single (non-transposed) matrix.
+        """
+        value = matrix.astype('float32').tobytes()
+        if self._uniform_changed(loc, value):
+            self._call('glUniformMatrix4fv', loc, 1, False, matrix)
+        else:
+            self._skip('glUniformMatrix4fv')
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Drawing many copies of a mesh with instanced rendering.
+
+The model matrices of all instances are stored in one contiguous
+(N, 4, 4) float32 array, which is uploaded to a vertex buffer. The vertex
+shader gets the matrix as a mat4 attribute (a_model), which takes four
+consecutive attribute locations; with an attribute divisor of 1 each
+instance gets the next matrix, so all instances are drawn with a single
+call to glDrawElementsInstanced.
+
+Contexts without instancing (it needs GL 3.3 or ARB_instanced_arrays)
+get a fallback: the instances are expanded on the CPU into one big mesh,
+and a_model is set to the identity matrix as a constant attribute, so the
+same shader and a single glDrawElements call can be used.
+
+The matrices can be made with the functions in transforms.py, which
+work in place on views of the array::
+
+    matrices = np.empty((n, 4, 4), np.float32)
+    for i in range(n):
+        M = matrices[i]
+        M[...] = np.eye(4)
+        rotate(M, angle[i], 0,0,1)
+        translate(M, x[i], y[i], z[i])
+
+"""
+
+import ctypes
+import numpy as np
+
+
+INSTANCED_VERT_CODE = """
+uniform mat4 u_view;
+uniform mat4 u_projection;
+
+attribute vec3 a_position;
+attribute vec2 a_texcoord;
+attribute mat4 a_model;
+
+varying vec2 v_texcoord;
+
+void main()
+{
+    v_texcoord = a_texcoord;
+    gl_Position = u_projection * u_view * a_model * vec4(a_position,1.0);
+}
+"""
+
+
+def supports_instancing(gl):
+    """ Whether the GL module (and driver) can do instanced drawing.
+    PyOpenGL functions that the driver lacks evaluate to False.
+    """
+    return bool(getattr(gl, 'glVertexAttribDivisor', None) and
+                getattr(gl, 'glDrawElementsInstanced', None))
+
+
+def as_matrices(matrices):
+    """ Get the model matrices as a contiguous (N, 4, 4) float32 array.
+    """
+    matrices = np.ascontiguousarray(matrices, dtype=np.float32)
+    return matrices.reshape(-1, 4, 4)
+
+
+def expand_instances(positions, faces, matrices, texcoords=None):
+    """ Expand the instances into a single mesh, by applying each model
+    matrix to a copy of the positions. Returns positions, faces and
+    texcoords (None if not given) of the combined mesh.
+    """
+    matrices = as_matrices(matrices)
+    n, nverts = len(matrices), len(positions)
+    positions = np.asarray(positions, np.float32)
+    # Model matrices are affine, so [x, y, z, 1] @ M = xyz @ R + t
+    out = np.matmul(positions[np.newaxis], matrices[:, :3, :3])
+    out += matrices[:, np.newaxis, 3, :3]
+    offsets = np.arange(n, dtype=np.uint32) * nverts
+    faces = np.asarray(faces, np.uint32).reshape(1, -1, 3)
+    faces = faces + offsets[:, np.newaxis, np.newaxis]
+    if texcoords is not None:
+        texcoords = np.tile(np.asarray(texcoords, np.float32), (n, 1))
+    return out.reshape(-1, 3), faces.reshape(-1, 3), texcoords
+
+
+
+class InstancedMesh(object):
+    """ InstancedMesh(gl, positions, faces, texcoords, matrices,
+    instanced=None)
+
+    Parameters
+    ----------
+    gl : module
+        The GL module to use, e.g. OpenGL.GL.
+    positions, faces, texcoords : numpy arrays
+        The mesh to draw, as given by read_mesh.
+    matrices : numpy array
+        The model matrices, of shape (N, 4, 4).
+    instanced : bool
+        Whether to use instanced drawing. Default is to use it if the
+        GL module supports it.
+
+    """
+
+    def __init__(self, gl, positions, faces, texcoords, matrices,
+                 instanced=None):
+        self._gl = gl
+        if instanced is None:
+            instanced = supports_instancing(gl)
+        self.instanced = instanced
+        self._positions = np.ascontiguousarray(positions, np.float32)
+        self._faces = np.ascontiguousarray(faces, np.uint32)
+        self._texcoords = np.ascontiguousarray(texcoords, np.float32)
+        self.matrices = as_matrices(matrices)
+        self._handles = None
+
+
+    def __len__(self):
+        return len(self.matrices)
+
+
+    def initialize(self):
+        """ Create the buffers. Needs a current GL context.
+        """
+        gl = self._gl
+        self._handles = dict((name, gl.glGenBuffers(1)) for name in
+                             ('positions', 'texcoords', 'faces', 'models'))
+        self._upload()
+
+
+    def set_matrices(self, matrices):
+        """ Set new model matrices (also changes the number of instances).
+        """
+        self.matrices = as_matrices(matrices)
+        if self._handles is not None:
+            self._upload()
+
+
+    def _upload(self):
+        gl = self._gl
+        if self.instanced:
+            positions, faces, texcoords = (self._positions, self._faces,
+                                           self._texcoords)
+            data = [('models', gl.GL_ARRAY_BUFFER, self.matrices)]
+        else:
+            positions, faces, texcoords = expand_instances(
+                self._positions, self._faces, self.matrices, self._texcoords)
+            data = []
+        data += [('positions', gl.GL_ARRAY_BUFFER, positions),
+                 ('texcoords', gl.GL_ARRAY_BUFFER, texcoords),
+                 ('faces', gl.GL_ELEMENT_ARRAY_BUFFER, faces)]
+        for name, target, array in data:
+            gl.glBindBuffer(target, self._handles[name])
+            gl.glBufferData(target, array.nbytes, array, gl.GL_STATIC_DRAW)
+        self._count = faces.size
+
+
+    def draw(self, program):
+        """ Draw all instances with the given (active) program, which has
+        the attributes a_position, a_texcoord and a_model.
+        """
+        gl = self._gl
+        h = self._handles
+
+        loc = gl.glGetAttribLocation(program, 'a_position')
+        gl.glEnableVertexAttribArray(loc)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, h['positions'])
+        gl.glVertexAttribPointer(loc, 3, gl.GL_FLOAT, False, 0, None)
+        #
+        loc = gl.glGetAttribLocation(program, 'a_texcoord')
+        gl.glEnableVertexAttribArray(loc)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, h['texcoords'])
+        gl.glVertexAttribPointer(loc, 2, gl.GL_FLOAT, False, 0, None)
+
+        # A mat4 attribute uses four locations, one per row of our matrix
+        loc = gl.glGetAttribLocation(program, 'a_model')
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, h['faces'])
+        if self.instanced:
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, h['models'])
+            for i in range(4):
+                gl.glEnableVertexAttribArray(loc + i)
+                gl.glVertexAttribPointer(loc + i, 4, gl.GL_FLOAT, False, 64,
+                                         ctypes.c_void_p(16 * i))
+                gl.glVertexAttribDivisor(loc + i, 1)
+            gl.glDrawElementsInstanced(gl.GL_TRIANGLES, self._count,
+                                       gl.GL_UNSIGNED_INT, None, len(self))
+            # Do not affect other draws
+            for i in range(4):
+                gl.glVertexAttribDivisor(loc + i, 0)
+                gl.glDisableVertexAttribArray(loc + i)
+        else:
+            # Instances are already in place; use a constant identity
+            for i in range(4):
+                gl.glDisableVertexAttribArray(loc + i)
+                gl.glVertexAttrib4f(loc + i, *np.eye(4)[i])
+            gl.glDrawElements(gl.GL_TRIANGLES, self._count,
+                              gl.GL_UNSIGNED_INT, None)
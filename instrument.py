@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing instrumentation for the Canvas classes.
+
+A Profiler keeps, per name, the most recent durations in a ring buffer,
+from which percentiles and histograms are computed. Methods of a Canvas
+(class or instance) can be instrumented by name, and code can be timed
+with the section() context manager. The interval between two calls of
+the method that draws (e.g. on_paint) is recorded as the frame time.
+
+A disabled profiler does not patch anything and section() returns a
+shared no-op context manager, so it costs (nearly) nothing.
+
+Example::
+
+    profiler = Profiler(enabled='--profile' in sys.argv)
+    profiler.instrument(Canvas, 'on_paint', 'update_transforms',
+                        frame='on_paint')
+    ...
+    profiler.dump('profile.json')
+
+"""
+
+import json
+import time
+import functools
+
+import numpy as np
+
+# Edges of the histogram bins, in milliseconds. The last bin also counts
+# everything above it.
+HISTOGRAM_EDGES = tuple(range(0, 34, 2)) + (50, 100, 250, 1000)
+
+
+class Timings(object):
+    """ Timings(size=1024)
+
+    Ring buffer with the last size durations (in seconds) for one name.
+    The total count and time are kept for all durations.
+    """
+
+    def __init__(self, size=1024):
+        self._data = np.zeros(size, np.float64)
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    def add(self, dt):
+        self._data[self._index] = dt
+        self._index = (self._index + 1) % len(self._data)
+        self.count += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+
+
+    @property
+    def values(self):
+        """ The durations in the window, oldest first.
+        """
+        if self.count < len(self._data):
+            return self._data[:self.count].copy()
+        return np.roll(self._data, -self._index)
+
+
+    def percentiles(self, q=(50, 95, 99)):
+        values = self.values
+        if not len(values):
+            return [0.0 for i in q]
+        return list(np.percentile(values, q))
+
+
+    def histogram(self, edges=HISTOGRAM_EDGES):
+        """ Get the number of durations in the window per bin, with the
+        bin edges in milliseconds.
+        """
+        ms = np.minimum(self.values * 1000, edges[-1])
+        counts, _ = np.histogram(ms, bins=edges)
+        return counts
+
+
+    def summary(self, edges=HISTOGRAM_EDGES):
+        """ Get a dict with the statistics, times in milliseconds.
+        """
+        p50, p95, p99 = self.percentiles((50, 95, 99))
+        return {'count': self.count,
+                'mean_ms': 1000 * self.total / max(self.count, 1),
+                'max_ms': 1000 * self.max,
+                'p50_ms': 1000 * p50,
+                'p95_ms': 1000 * p95,
+                'p99_ms': 1000 * p99,
+                'histogram': {'edges_ms': list(edges),
+                              'counts': [int(c) for c in
+                                         self.histogram(edges)]},
+                }
+
+
+
+class _NullSection(object):
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        return False
+
+_null_section = _NullSection()
+
+
+class _Section(object):
+    def __init__(self, timings, clock):
+        self._timings = timings
+        self._clock = clock
+    def __enter__(self):
+        self._t0 = self._clock()
+        return self
+    def __exit__(self, *args):
+        self._timings.add(self._clock() - self._t0)
+        return False
+
+
+
+class Profiler(object):
+    """ Profiler(enabled=True, window=1024, clock=time.perf_counter)
+
+    Parameters
+    ----------
+    enabled : bool
+        If False, nothing is instrumented or recorded.
+    window : int
+        The number of most recent durations kept per name.
+    clock : callable
+        The function that gives the time in seconds.
+
+    """
+
+    def __init__(self, enabled=True, window=1024, clock=time.perf_counter):
+        self.enabled = bool(enabled)
+        self.window = window
+        self.clock = clock
+        self.timings = {}
+        self._last_frame = None
+
+
+    def __getitem__(self, name):
+        try:
+            return self.timings[name]
+        except KeyError:
+            timings = self.timings[name] = Timings(self.window)
+            return timings
+
+
+    def add(self, name, dt):
+        """ Record a duration (in seconds) for the given name.
+        """
+        if self.enabled:
+            self[name].add(dt)
+
+
+    def section(self, name):
+        """ Context manager that records the time spent in it.
+        """
+        if not self.enabled:
+            return _null_section
+        return _Section(self[name], self.clock)
+
+
+    def frame(self):
+        """ Mark the start of a frame, recording the time since the
+        previous one as 'frame'.
+        """
+        if not self.enabled:
+            return
+        t = self.clock()
+        if self._last_frame is not None:
+            self['frame'].add(t - self._last_frame)
+        self._last_frame = t
+
+
+    def wrap(self, func, name=None, frame=False):
+        """ Get a function that calls func and records its duration. If
+        frame is True, each call also marks the start of a frame.
+        """
+        if not self.enabled:
+            return func
+        timings = self[name or func.__name__]
+        clock = self.clock
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if frame:
+                self.frame()
+            t0 = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.add(clock() - t0)
+        return wrapper
+
+
+    def instrument(self, target, *names, frame=None):
+        """ Replace the methods with the given names on target (a class or
+        an instance) by timed versions. Instrumenting the class is needed
+        if methods are connected to events when the object is created,
+        as with vispy. The method named by frame also marks the frames.
+        """
+        if not self.enabled:
+            return
+        for name in names:
+            func = getattr(target, name)
+            setattr(target, name, self.wrap(func, name, name == frame))
+
+
+    def summary(self):
+        """ Get a dict that maps names to their statistics.
+        """
+        return dict((name, t.summary()) for name, t in self.timings.items())
+
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+
+    def dump(self, filename):
+        """ Write the statistics as JSON to the given file (if enabled).
+        """
+        if not self.enabled:
+            return
+        with open(filename, 'w') as f:
+            f.write(self.to_json())
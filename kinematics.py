@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A CPU reference of the vertex shader of the fireworks demos.
+
+The motion of the particles is only defined in the vertex shader
+(VERT_SHADER in fireworks_v1.py): a particle moves from a_startPosition
+with velocity a_endPosition, falls with gravity along y, and is hidden
+after its lifetime. evaluate() computes the same outputs (gl_Position,
+v_lifetime and gl_PointSize) with NumPy, in float32 like the GPU does,
+for all particles at once. explosion_bounds() uses it to get the
+bounding box of the live particles of an explosion over time, which
+tells whether the explosion is on screen (see on_screen).
+"""
+
+import numpy as np
+
+
+# Where the shader puts particles that are dead
+HIDDEN_POSITION = (-1000.0, -1000.0, 0.0, 0.0)
+
+# gl_PointSize of a particle that was just born
+MAX_POINT_SIZE = 40.0
+
+
+def evaluate(data, u_time, center=(0.0, 0.0, 0.0), layout=None):
+    """
+    evaluate runs the explosion vertex shader on the CPU.
+
+    Parameters
+    ----------
+    data
+        The vertex data, with fields a_lifetime, a_startPosition and
+        a_endPosition.
+
+    u_time
+        The time since the start of the explosion.
+
+    center
+        The center of the explosion (u_centerPosition).
+
+    layout
+        The ParticleLayout of the data (see layouts.py), if it is packed.
+
+    Returns (position, v_lifetime, point_size) for each particle, with
+    position the (N, 4) gl_Position.
+    """
+    if layout is not None:
+        data = layout.unpack(data)
+    t = np.float32(u_time)
+    lifetimes = data['a_lifetime']
+    alive = t <= lifetimes
+
+    position = np.empty((len(data), 4), np.float32)
+    position[:] = HIDDEN_POSITION
+    xyz = data['a_startPosition'][alive] + t * data['a_endPosition'][alive]
+    xyz += np.asarray(center, np.float32)
+    xyz[:,1] -= np.float32(1.0) * t * t
+    position[alive,:3] = xyz
+    position[alive,3] = 1.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v_lifetime = np.float32(1.0) - t / lifetimes
+    # clamp() of NaN is undefined in GLSL; a lifetime of 0 means dead
+    v_lifetime = np.nan_to_num(v_lifetime, nan=0.0)
+    v_lifetime = np.clip(v_lifetime, 0.0, 1.0).astype(np.float32)
+    point_size = v_lifetime * v_lifetime * np.float32(MAX_POINT_SIZE)
+    return position, v_lifetime, point_size
+
+
+def explosion_bounds(data, times, center=(0.0, 0.0, 0.0), layout=None):
+    """ Get the bounding box of the live particles of an explosion, as an
+    array of shape (len(times), 2, 3) with the minimum and maximum
+    corner at each time. The boxes of times at which no particle is
+    alive are NaN.
+    """
+    if layout is not None:
+        data = layout.unpack(data)
+    bounds = np.empty((len(times), 2, 3), np.float32)
+    for i, t in enumerate(times):
+        position, v_lifetime, point_size = evaluate(data, t, center)
+        live = position[position[:,3] == 1.0, :3]
+        if len(live):
+            bounds[i,0], bounds[i,1] = live.min(0), live.max(0)
+        else:
+            bounds[i] = np.nan
+    return bounds
+
+
+def on_screen(bounds, margin=0.0):
+    """ Get whether the given bounding boxes (as from explosion_bounds)
+    overlap the visible x and y range [-1, 1]. The margin (in the same
+    units) accounts for the size of the sprites, e.g. the largest point
+    size divided by the viewport size.
+    """
+    lo, hi = bounds[...,0,:2], bounds[...,1,:2]
+    with np.errstate(invalid='ignore'):
+        overlaps = (lo <= 1.0 + margin) & (hi >= -1.0 - margin)
+    return overlaps.all(-1)
+
+
+if __name__ == '__main__':
+    from explosions import VERTEX_DTYPE, fill_explosion, sort_by_lifetime
+    from layouts import LAYOUTS
+
+    data = np.zeros(100000, VERTEX_DTYPE)
+    centerpos, color = fill_explosion(data, seed=0)
+    sort_by_lifetime(data)
+    times = np.linspace(0, 1.5, 7)
+    bounds = explosion_bounds(data, times, centerpos)
+    visible = on_screen(bounds, margin=MAX_POINT_SIZE / 400)
+    for t, (lo, hi), vis in zip(times, bounds, visible):
+        print('t=%.2f  min=%s  max=%s  on screen: %s' %
+              (t, np.round(lo, 2), np.round(hi, 2), vis))
+
+    # The compact layouts against float32, as the shader sees them
+    for name in ('half', 'packed'):
+        layout = LAYOUTS[name]
+        packed = layout.pack(data)
+        error = 0.0
+        for t in times:
+            a = evaluate(data, t, centerpos)
+            b = evaluate(packed, t, centerpos, layout)
+            both = (a[0][:,3] == 1) & (b[0][:,3] == 1)
+            error = max(error, float(np.abs(a[0][both] - b[0][both]).max()))
+        print('%s: max position error %.5f' % (name, error))
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compact vertex layouts for the particles of the fireworks demos.
+
+The vertex data of an explosion has three float32 fields, 28 bytes per
+particle. A ParticleLayout describes the same fields with smaller types:
+float16 positions and velocities, and a float16 or normalized uint16
+lifetime (GL maps the latter to [0, 1], so the shader scales it back).
+Both compact layouts take 14 bytes per particle. A layout packs float32
+data, describes its attribute pointers, and derives the matching variant
+of the vertex shader.
+
+error_report() quantifies what is lost, by comparing the positions and
+lifetimes of the packed particles with those of the float32 data. Run
+this module to print it for each layout.
+"""
+
+import re
+
+import numpy as np
+
+from explosions import VERTEX_DTYPE
+
+
+# Largest lifetime (in seconds) that a normalized uint16 can hold
+LIFETIME_SCALE = 8.0
+
+_GL_TYPES = {np.dtype(np.float32): 'GL_FLOAT',
+             np.dtype(np.float16): 'GL_HALF_FLOAT',
+             np.dtype(np.uint16): 'GL_UNSIGNED_SHORT'}
+
+
+class ParticleLayout(object):
+    """ ParticleLayout(name, dtype, lifetime_scale=None)
+
+    Parameters
+    ----------
+    name : str
+        The name of the layout.
+    dtype : numpy dtype
+        The dtype of the packed data, with the fields of VERTEX_DTYPE.
+    lifetime_scale : float
+        If given, a_lifetime is stored normalized, as a fraction of this.
+
+    """
+
+    def __init__(self, name, dtype, lifetime_scale=None):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.lifetime_scale = lifetime_scale
+
+
+    def __repr__(self):
+        return '<ParticleLayout %s (%i bytes)>' % (self.name,
+                                                  self.dtype.itemsize)
+
+
+    def pack(self, data, out=None):
+        """ Convert vertex data with VERTEX_DTYPE to this layout. A
+        normalized lifetime cannot be negative; such particles are never
+        shown anyway, and get lifetime 0.
+        """
+        if out is None:
+            out = np.empty(len(data), self.dtype)
+        out['a_startPosition'] = data['a_startPosition']
+        out['a_endPosition'] = data['a_endPosition']
+        lifetimes = data['a_lifetime']
+        if self.lifetime_scale is not None:
+            lifetimes = np.clip(lifetimes / self.lifetime_scale, 0.0, 1.0)
+            lifetimes = np.rint(lifetimes * 65535)
+        out['a_lifetime'] = lifetimes
+        return out
+
+
+    def unpack(self, packed, out=None):
+        """ Convert packed data back to VERTEX_DTYPE, with the values the
+        shader sees.
+        """
+        if out is None:
+            out = np.empty(len(packed), VERTEX_DTYPE)
+        out['a_startPosition'] = packed['a_startPosition']
+        out['a_endPosition'] = packed['a_endPosition']
+        out['a_lifetime'] = self.lifetimes(packed)
+        return out
+
+
+    def lifetimes(self, packed):
+        """ Get the lifetimes in seconds, as float32.
+        """
+        lifetimes = packed['a_lifetime'].astype(np.float32)
+        if self.lifetime_scale is not None:
+            lifetimes *= np.float32(self.lifetime_scale / 65535.0)
+        return lifetimes
+
+
+    def alive_count(self, packed, t):
+        """ Like explosions.alive_count, for packed data sorted by
+        decreasing lifetime.
+        """
+        if self.lifetime_scale is not None:
+            t = t * 65535.0 / self.lifetime_scale
+        lifetimes = packed['a_lifetime'][::-1]  # Increasing
+        return len(packed) - int(np.searchsorted(lifetimes, t, side='left'))
+
+
+    def attrib_pointers(self, gl):
+        """ Get a list of (name, size, type, normalized, offset) tuples
+        for glVertexAttribPointer; the stride is dtype.itemsize.
+        """
+        pointers = []
+        for name in self.dtype.names:
+            dtype, offset = self.dtype.fields[name][:2]
+            size = dtype.shape[0] if dtype.shape else 1
+            gltype = getattr(gl, _GL_TYPES[dtype.base])
+            normalized = dtype.base.kind == 'u'
+            pointers.append((name, size, gltype, normalized, offset))
+        return pointers
+
+
+    def shader(self, source):
+        """ Derive the vertex shader for this layout from the float32
+        one. Conversion of the types is done by GL; only a normalized
+        lifetime needs to be scaled.
+        """
+        if self.lifetime_scale is None:
+            return source
+        head, body = source.split('void main', 1)
+        body = re.sub(r'\ba_lifetime\b',
+                      '(a_lifetime * %r)' % float(self.lifetime_scale), body)
+        return head + 'void main' + body
+
+
+
+LAYOUTS = {
+    'float32': ParticleLayout('float32', VERTEX_DTYPE),
+    'half': ParticleLayout('half', [('a_lifetime', np.float16),
+                                    ('a_startPosition', np.float16, 3),
+                                    ('a_endPosition', np.float16, 3)]),
+    'packed': ParticleLayout('packed', [('a_lifetime', np.uint16),
+                                        ('a_startPosition', np.float16, 3),
+                                        ('a_endPosition', np.float16, 3)],
+                             lifetime_scale=LIFETIME_SCALE),
+}
+
+
+def error_report(data, layout, times=None):
+    """ Compare vertex data with VERTEX_DTYPE to its packed version.
+    Returns a dict with the bytes per particle, the largest errors in the
+    fields, and, over the given times (default 0.1 to 1.5 s), the largest
+    error in the position of the particles (relative to the center of the
+    explosion) and the number of particles that are alive in one but not
+    the other. The lifetime error is over the particles with a
+    non-negative lifetime.
+    """
+    if times is None:
+        times = np.linspace(0.1, 1.5, 15)
+    unpacked = layout.unpack(layout.pack(data))
+    report = {'layout': layout.name,
+              'bytes_per_particle': layout.dtype.itemsize,
+              'ratio': float(layout.dtype.itemsize) / VERTEX_DTYPE.itemsize}
+    shown = data['a_lifetime'] >= 0
+    for name in VERTEX_DTYPE.names:
+        err = np.abs(unpacked[name][shown].astype(np.float64) -
+                     data[name][shown])
+        report[name + '_max_error'] = float(err.max())
+    position_error = 0.0
+    alive_mismatches = 0
+    for t in times:
+        a = data['a_startPosition'] + t * data['a_endPosition']
+        b = unpacked['a_startPosition'] + t * unpacked['a_endPosition']
+        position_error = max(position_error, float(np.abs(a - b).max()))
+        alive_mismatches += int(((t <= data['a_lifetime']) !=
+                                 (t <= unpacked['a_lifetime'])).sum())
+    report['position_max_error'] = position_error
+    report['alive_mismatches'] = alive_mismatches
+    return report
+
+
+if __name__ == '__main__':
+    from explosions import fill_explosion
+    data = np.zeros(100000, VERTEX_DTYPE)
+    fill_explosion(data, seed=0)
+    for name in ('float32', 'half', 'packed'):
+        report = error_report(data, LAYOUTS[name])
+        print(', '.join('%s: %s' % (key, report[key]) for key in
+                        ('layout', 'bytes_per_particle', 'a_lifetime_max_error',
+                         'position_max_error', 'alive_mismatches')))
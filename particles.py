@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A fixed-capacity particle pool for many concurrent explosions.
+
+In the fireworks demos a single explosion owns all particles, with its
+start time, center and color as uniforms. Here, these are per-particle
+attributes instead, so particles of many explosions (bursts) can live in
+one vertex buffer and be drawn with one call. The shader computes each
+particle's age from the global u_time and its own a_startTime.
+
+The particle data is allocated once. Bursts take slots from a free list
+and give them back when their last particle has died; free slots are
+hidden by the shader (their lifetime is negative, or over). The ranges of slots
+that were written are collected in ParticlePool.changed, so that only
+those need to be uploaded (see buffers.DynamicBuffer).
+"""
+
+import numpy as np
+
+
+PARTICLE_DTYPE = np.dtype([('a_startTime', np.float32),
+                           ('a_lifetime', np.float32),
+                           ('a_startPosition', np.float32, 3),
+                           ('a_endPosition', np.float32, 3),
+                           ('a_center', np.float32, 3),
+                           ('a_color', np.float32, 4)])
+
+
+POOL_VERT_SHADER = """
+// explosion vertex shader, with per-particle start time, center and color
+#version 120
+
+uniform float u_time;
+attribute float a_startTime;
+attribute float a_lifetime;
+attribute vec3 a_startPosition;
+attribute vec3 a_endPosition;
+attribute vec3 a_center;
+attribute vec4 a_color;
+varying float v_lifetime;
+varying vec4 v_color;
+
+void main () {
+    float t = u_time - a_startTime;
+    if (t >= 0.0 && t <= a_lifetime)
+    {
+        gl_Position.xyz = a_startPosition + (t * a_endPosition);
+        gl_Position.xyz += a_center;
+        gl_Position.y -= 1.0 * t * t;
+        gl_Position.w = 1.0;
+    }
+    else
+        gl_Position = vec4(-1000, -1000, 0, 0);
+
+    v_lifetime = 1.0 - (t / a_lifetime);
+    v_lifetime = clamp(v_lifetime, 0.0, 1.0);
+    v_color = a_color;
+    gl_PointSize = (v_lifetime * v_lifetime) * 40.0;
+}
+"""
+
+POOL_FRAG_SHADER = """
+// explosion fragment shader, with per-particle color
+#version 120
+
+uniform sampler2D s_texture;
+varying float v_lifetime;
+varying vec4 v_color;
+
+void main()
+{
+    vec4 texColor;
+    texColor = texture2D(s_texture, gl_PointCoord);
+    gl_FragColor = v_color * texColor;
+    gl_FragColor.a *= v_lifetime;
+}
+"""
+
+
+def _runs(slots):
+    """ Split an array of slot indices into sorted (start, stop) ranges.
+    """
+    if not len(slots):
+        return []
+    slots = np.sort(slots)
+    breaks = np.nonzero(np.diff(slots) != 1)[0] + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(slots)]])
+    return [(int(slots[a]), int(slots[b-1]) + 1) for a, b in zip(starts, stops)]
+
+
+
+class ParticlePool(object):
+    """ ParticlePool(capacity, seed=None)
+
+    Parameters
+    ----------
+    capacity : int
+        The maximum number of live particles.
+    seed : int
+        Seed for the random generator used to create bursts.
+
+    """
+
+    def __init__(self, capacity, seed=None):
+        self.data = np.zeros(capacity, PARTICLE_DTYPE)
+        self.data['a_lifetime'] = -1  # Hidden
+        # Stack of free slots; popping from the end gives ascending slots
+        self._free = np.arange(capacity - 1, -1, -1, dtype=np.intp)
+        self._nfree = capacity
+        self._bursts = []  # (end time, slots)
+        self.rng = np.random.default_rng(seed)
+        self.changed = []
+
+
+    @property
+    def capacity(self):
+        return len(self.data)
+
+
+    @property
+    def free(self):
+        """ The number of free slots.
+        """
+        return self._nfree
+
+
+    @property
+    def live(self):
+        """ The number of slots in use.
+        """
+        return self.capacity - self._nfree
+
+
+    @property
+    def bursts(self):
+        return len(self._bursts)
+
+
+    def allocate(self, n):
+        """ Take n free slots, returns their indices. Raises a
+        RuntimeError if the pool does not have n free slots.
+        """
+        if n > self._nfree:
+            raise RuntimeError('Particle pool has %i free slots, need %i.' %
+                               (self._nfree, n))
+        slots = self._free[self._nfree - n:self._nfree][::-1].copy()
+        self._nfree -= n
+        return slots
+
+
+    def release(self, slots, hide=True):
+        """ Give slots back to the pool. Their particles are hidden, unless
+        hide is False (e.g. because they are known to be dead already).
+        """
+        if hide:
+            self.data['a_lifetime'][slots] = -1
+            self.changed.extend(_runs(slots))
+        # Push in reverse so the lowest slots are handed out first again
+        slots = np.sort(slots)[::-1]
+        self._free[self._nfree:self._nfree + len(slots)] = slots
+        self._nfree += len(slots)
+
+
+    def emit(self, n, time, center, color, lifetime=(2.0, 0.5),
+             start_spread=0.2, speed=1.2):
+        """ Start a burst of n particles at the given time.
+
+        Parameters
+        ----------
+        n : int
+            The number of particles.
+        time : float
+            The start time, on the same clock as u_time.
+        center : (x, y, z)
+            The center of the burst.
+        color : (r, g, b, a)
+            The color of the particles.
+        lifetime : (mean, std)
+            The distribution of the lifetimes of the particles.
+        start_spread, speed : float
+            The std of the start positions and of the velocities.
+
+        Returns the slots of the particles.
+        """
+        slots = self.allocate(n)
+        if not n:
+            return slots  # No burst to keep track of
+        rng = self.rng
+        lifetimes = rng.normal(lifetime[0], lifetime[1], n)
+        p = np.empty(n, PARTICLE_DTYPE)
+        p['a_startTime'] = time
+        p['a_lifetime'] = lifetimes
+        p['a_startPosition'] = rng.normal(0.0, start_spread, (n, 3))
+        p['a_endPosition'] = rng.normal(0.0, speed, (n, 3))
+        p['a_center'] = center
+        p['a_color'] = color
+        self.data[slots] = p
+        self.changed.extend(_runs(slots))
+        self._bursts.append((time + max(lifetimes.max(), 0), slots))
+        return slots
+
+
+    def update(self, time):
+        """ Release the slots of the bursts whose particles are all dead
+        at the given time.
+        """
+        alive = []
+        for end, slots in self._bursts:
+            if end < time:
+                # Dead particles stay hidden, no need to touch them
+                self.release(slots, hide=False)
+            else:
+                alive.append((end, slots))
+        self._bursts = alive
+
+
+    def take_changed(self):
+        """ Get the (start, stop) ranges of slots that were written since
+        the last call.
+        """
+        changed, self.changed = self.changed, []
+        return changed
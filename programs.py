@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Creating shader programs, with caching.
+
+ProgramCache compiles and links a program from vertex and fragment shader
+source code, and keeps it keyed by a hash of the source, so asking for the
+same program twice gives the same handle. If a cache directory is given
+and the driver supports program binaries (GL 4.1 or ARB_get_program_binary)
+the linked binary is stored on disk, and loaded instead of compiling the
+next time the application starts. If loading fails (e.g. because the
+driver was updated), the program is built from source again.
+
+The time it takes to get each program is recorded in ProgramCache.timings.
+The GL module is passed in (default OpenGL.GL), so the cache logic can be
+tried with a stub.
+"""
+
+import os
+import time
+import hashlib
+from collections import Counter
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'euroscipy2013',
+                         'programs')
+
+
+class ProgramCache(object):
+    """ ProgramCache(gl=None, cache_dir=None)
+
+    Parameters
+    ----------
+    gl : module
+        The GL module to use. Default is OpenGL.GL. Program handles are
+        only valid for the GL context they were created in, so use one
+        cache per context.
+    cache_dir : str
+        Directory to store program binaries in. If None, programs are
+        only cached in memory.
+
+    """
+
+    def __init__(self, gl=None, cache_dir=None):
+        if gl is None:
+            import OpenGL.GL as gl
+        self._gl = gl
+        self.cache_dir = cache_dir
+        self._programs = {}
+        self._binary_supported = None
+        self.stats = Counter()  # How programs were obtained
+        self.timings = []
+
+
+    @staticmethod
+    def key(vert_code, frag_code):
+        """ Get the key for the given shader source code.
+        """
+        h = hashlib.sha1()
+        for code in (vert_code, frag_code):
+            h.update(code.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+
+    def get(self, vert_code, frag_code):
+        """ Get the handle of a linked program for the given vertex and
+        fragment shader source code.
+        """
+        t0 = time.perf_counter()
+        key = self.key(vert_code, frag_code)
+        record = {'key': key, 'compile': 0.0, 'link': 0.0}
+
+        handle = self._programs.get(key)
+        if handle is not None:
+            how = 'memory'
+        else:
+            handle = self._load_binary(key)
+            how = 'binary'
+            if handle is None:
+                handle = self._build(vert_code, frag_code, record)
+                how = 'source'
+                self._save_binary(key, handle)
+            self._programs[key] = handle
+
+        record['how'] = how
+        record['total'] = time.perf_counter() - t0
+        self.stats[how] += 1
+        self.timings.append(record)
+        return handle
+
+
+    def clear(self):
+        """ Delete all programs in the in-memory cache.
+        """
+        for handle in self._programs.values():
+            self._gl.glDeleteProgram(handle)
+        self._programs.clear()
+
+
+    def report(self):
+        """ Get a short text with how long each program took to get.
+        """
+        lines = []
+        for r in self.timings:
+            lines.append('%s %-6s %7.2f ms (compile %1.2f ms, link %1.2f ms)' %
+                         (r['key'][:8], r['how'], r['total'] * 1000,
+                          r['compile'] * 1000, r['link'] * 1000))
+        return '\n'.join(lines)
+
+
+    def _build(self, vert_code, frag_code, record):
+        gl = self._gl
+        t0 = time.perf_counter()
+        shaders = [self._compile(gl.GL_VERTEX_SHADER, vert_code, 'Vertex'),
+                   self._compile(gl.GL_FRAGMENT_SHADER, frag_code, 'Fragment')]
+        t1 = time.perf_counter()
+
+        handle = gl.glCreateProgram()
+        for shader in shaders:
+            gl.glAttachShader(handle, shader)
+        if self._supports_binary():
+            gl.glProgramParameteri(handle, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT,
+                                   gl.GL_TRUE)
+        gl.glLinkProgram(handle)
+        status = gl.glGetProgramiv(handle, gl.GL_LINK_STATUS)
+        # The program keeps what it needs, the shaders can go
+        for shader in shaders:
+            gl.glDetachShader(handle, shader)
+            gl.glDeleteShader(shader)
+        if not status:
+            log = _as_str(gl.glGetProgramInfoLog(handle))
+            gl.glDeleteProgram(handle)
+            raise RuntimeError('Program did not link:\n%s' % log)
+
+        record['compile'] = t1 - t0
+        record['link'] = time.perf_counter() - t1
+        return handle
+
+
+    def _compile(self, type, code, what):
+        gl = self._gl
+        shader = gl.glCreateShader(type)
+        gl.glShaderSource(shader, code)
+        gl.glCompileShader(shader)
+        status = gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS)
+        if not status:
+            log = _as_str(gl.glGetShaderInfoLog(shader))
+            gl.glDeleteShader(shader)
+            raise RuntimeError('%s shader did not compile:\n%s' % (what, log))
+        return shader
+
+
+    def _supports_binary(self):
+        if self._binary_supported is None:
+            gl = self._gl
+            supported = False
+            # PyOpenGL functions that the driver lacks evaluate to False
+            if (self.cache_dir and getattr(gl, 'glGetProgramBinary', None) and
+                    getattr(gl, 'glProgramBinary', None)):
+                try:
+                    n = gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS)
+                    supported = int(np.asarray(n).ravel()[0]) > 0
+                except Exception:
+                    supported = False
+            self._binary_supported = supported
+        return self._binary_supported
+
+
+    def _binary_filename(self, key):
+        # Binaries are only valid for the driver that made them
+        gl = self._gl
+        driver = hashlib.sha1()
+        for name in (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION):
+            driver.update(_as_str(gl.glGetString(name)).encode('utf-8'))
+        name = '%s-%s.bin' % (key, driver.hexdigest()[:12])
+        return os.path.join(self.cache_dir, name)
+
+
+    def _load_binary(self, key):
+        """ Create a program from a stored binary. Returns None if there is
+        no binary, if it is truncated, or if the driver does not accept it.
+        """
+        if not self._supports_binary():
+            return None
+        filename = self._binary_filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                bb = f.read()
+        except OSError:
+            return None
+        if len(bb) <= 4:
+            _remove(filename)
+            return None
+        format = int(np.frombuffer(bb[:4], np.uint32)[0])
+        binary = np.frombuffer(bb[4:], np.uint8)
+
+        gl = self._gl
+        handle = None
+        try:
+            handle = gl.glCreateProgram()
+            gl.glProgramBinary(handle, format, binary, binary.size)
+            linked = gl.glGetProgramiv(handle, gl.GL_LINK_STATUS)
+        except Exception:
+            linked = False
+        if not linked:
+            # Outdated or otherwise invalid, rebuild from source
+            if handle:
+                try:
+                    gl.glDeleteProgram(handle)
+                except Exception:
+                    pass
+            _remove(filename)
+            return None
+        return handle
+
+
+    def _save_binary(self, key, handle):
+        if not self._supports_binary():
+            return
+        gl = self._gl
+        size = int(gl.glGetProgramiv(handle, gl.GL_PROGRAM_BINARY_LENGTH))
+        if not size:
+            return
+        length = np.zeros(1, np.int32)
+        format = np.zeros(1, np.uint32)
+        binary = np.zeros(size, np.uint8)
+        gl.glGetProgramBinary(handle, size, length, format, binary)
+
+        # Write to a temporary file first, so we never leave half a binary.
+        # The disk cache is optional: if it cannot be written, skip it.
+        filename = self._binary_filename(key)
+        tmpname = '%s.%i.tmp' % (filename, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(tmpname, 'wb') as f:
+                f.write(format.tobytes())
+                f.write(binary[:int(length[0])].tobytes())
+            os.replace(tmpname, filename)
+        except OSError:
+            _remove(tmpname)
+
+
+def _remove(filename):
+    """ Remove a file, if it exists and can be removed.
+    """
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+def _as_str(s):
+    if isinstance(s, bytes):
+        return s.decode('utf-8', 'replace')
+    return str(s)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Filling (fields of) large arrays with random numbers, in parallel.
+
+The data is split in chunks of a fixed size, and every chunk gets its own
+random stream, spawned from one SeedSequence. The numbers in a chunk thus
+only depend on the seed and the index of the chunk, so the result for a
+given seed is the same regardless of the number of threads that the
+chunks are distributed over. The bit generators release the GIL while
+filling, so the threads run in parallel.
+
+Example::
+
+    fill_normal(vertex_data, [('a_lifetime', 2.0, 0.5),
+                              ('a_endPosition', 0.0, 1.2)], seed=42)
+
+"""
+
+import os
+
+import numpy as np
+
+from transforms import run_chunked
+
+
+def _seed_sequence(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def fill_normal(data, fields, seed=None, chunk_size=65536, threads=None):
+    """
+    fill_normal fills fields of a structured array in place with normally
+    distributed random numbers.
+
+    Parameters
+    ----------
+    data
+        Structured array (e.g. the vertex_data of the fireworks demos).
+        The first axis is divided into chunks.
+
+    fields
+        Sequence of (name, mean, std) tuples. A field may have a shape,
+        e.g. 3 for a position.
+
+    seed
+        An int or SeedSequence. If None, fresh entropy is used.
+
+    chunk_size
+        Number of elements per chunk (and per random stream). Changing it
+        changes the result.
+
+    threads
+        Number of threads to distribute the chunks over. Default is the
+        number of CPUs.
+    """
+    n = len(data)
+    seqs = _seed_sequence(seed).spawn((n + chunk_size - 1) // chunk_size)
+    if threads is None:
+        threads = os.cpu_count() or 1
+
+    def work(i0, i1):
+        rng = np.random.Generator(np.random.PCG64(seqs[i0 // chunk_size]))
+        for name, mean, std in fields:
+            # The field is a strided view; the generator wants contiguous
+            # output, so generate into a temporary buffer first
+            view = data[name][i0:i1]
+            dtype = np.float32 if view.dtype == np.float32 else np.float64
+            values = np.empty(view.shape, dtype)
+            rng.standard_normal(out=values, dtype=dtype)
+            values *= std
+            values += mean
+            view[...] = values
+
+    run_chunked(work, n, chunk_size, threads)
+    return data
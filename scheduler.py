@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Frame scheduling with a fixed simulation timestep.
+
+The FrameScheduler decouples the simulation, which advances in fixed
+steps, from rendering, which happens whenever the timer fires. On each
+frame, advance() says how many simulation steps to take to catch up with
+the clock, and how far (0..1) the clock is into the next step, so the
+renderer can interpolate between the last two simulation states.
+
+Frames are scheduled at absolute deadlines (start + i * interval), so
+timer callbacks that arrive late do not make the frame rate drift. If a
+frame is so late that deadlines were missed, those frames are skipped
+rather than rendered in a burst, and if the simulation falls behind by
+more than max_steps, the surplus time is dropped instead of spiralling.
+
+The clock is passed in, so the scheduler can be driven by a fake clock.
+
+Example for GLUT::
+
+    def on_timer(value):
+        steps, alpha = scheduler.advance()
+        for i in range(steps):
+            simulate(scheduler.step)
+        glut.glutPostRedisplay()
+        glut.glutTimerFunc(scheduler.delay_ms(), on_timer, 0)
+
+"""
+
+import time
+import math
+from collections import deque
+
+
+class FrameScheduler(object):
+    """ FrameScheduler(fps=60, step=None, max_steps=5, clock=time.perf_counter)
+
+    Parameters
+    ----------
+    fps : float
+        The target number of frames per second.
+    step : float
+        The simulation timestep in seconds. Default 1/fps.
+    max_steps : int
+        The maximum number of simulation steps per frame.
+    clock : callable
+        The function that gives the time in seconds.
+
+    """
+
+    def __init__(self, fps=60, step=None, max_steps=5, clock=time.perf_counter):
+        self.interval = 1.0 / fps
+        self.step = float(step or self.interval)
+        self.max_steps = max_steps
+        self.clock = clock
+        self._frame_times = deque(maxlen=121)
+        self.start()
+
+
+    def start(self):
+        """ (Re)start the schedule at the current time.
+        """
+        now = self.clock()
+        self._last = now
+        self._deadline = now + self.interval
+        self._accumulator = 0.0
+        self._frame_times.clear()
+        self.time = 0.0  # Simulation time, a multiple of step
+        self.frames = 0
+        self.steps = 0
+        self.skipped_frames = 0
+        self.dropped_time = 0.0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+
+    def advance(self):
+        """ Start a new frame. Returns the number of simulation steps to
+        take and the interpolation factor (0..1) into the next step.
+        """
+        now = self.clock()
+        self._frame_times.append(now)
+        self.frames += 1
+
+        # Steps to catch up with the clock
+        self._accumulator += now - self._last
+        self._last = now
+        steps = int(self._accumulator / self.step)
+        if steps > self.max_steps:
+            self.dropped_time += (steps - self.max_steps) * self.step
+            self._accumulator -= (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self._accumulator -= steps * self.step
+        self.steps += steps
+        self.time += steps * self.step
+
+        # Next deadline, skipping those that have already passed
+        lateness = max(now - self._deadline, 0.0)
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        missed = int(math.floor((now - self._deadline) / self.interval)) + 1
+        if missed > 1:
+            self.skipped_frames += missed - 1
+        self._deadline += max(missed, 1) * self.interval
+
+        return steps, self._accumulator / self.step
+
+
+    @property
+    def alpha(self):
+        """ How far the clock is into the next simulation step (0..1).
+        """
+        return self._accumulator / self.step
+
+
+    def delay(self):
+        """ The time in seconds until the next frame is due.
+        """
+        return max(self._deadline - self.clock(), 0.0)
+
+
+    def delay_ms(self):
+        """ The delay until the next frame in whole milliseconds, as
+        glutTimerFunc wants it.
+        """
+        return int(self.delay() * 1000)
+
+
+    @property
+    def fps(self):
+        """ The measured frame rate over (up to) the last 120 frames.
+        """
+        times = self._frame_times
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+    def pacing(self):
+        """ Get a dict with the measured pacing.
+        """
+        return {'target_fps': 1.0 / self.interval,
+                'fps': self.fps,
+                'frames': self.frames,
+                'steps': self.steps,
+                'skipped_frames': self.skipped_frames,
+                'dropped_ms': 1000 * self.dropped_time,
+                'mean_lateness_ms': 1000 * self.total_lateness / max(self.frames, 1),
+                'max_lateness_ms': 1000 * self.max_lateness,
+                }
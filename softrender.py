@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Headless software renderer written in NumPy.
+
+This renders the same data as the cube demos (positions, faces,
+texcoords, a texture and the u_model/u_view/u_projection matrices)
+without an OpenGL context, so that frames can be produced and compared
+on machines without a GPU. Triangles are clipped against the near plane,
+rasterized in batches, textured with perspective correction and resolved
+with a z-buffer, following the same conventions as OpenGL.
+
+Point sprites, as in the fireworks demos, are splatted with additive
+blending. The sprite image only depends on the size of the point, so
+points are grouped by size, and each group is splatted at once.
+
+Run this module to render the spinning cube and a fireworks explosion,
+and report the number of triangles and points per second.
+"""
+
+import time
+import numpy as np
+
+from sprites import select_level
+
+
+def sample_texture(texture, texcoords):
+    """ Sample a texture with bilinear filtering and GL_REPEAT wrapping,
+    like texture2D with GL_LINEAR filters.
+
+    Parameters
+    ----------
+    texture : numpy array
+        Image of shape (H, W) or (H, W, C). The first row corresponds to
+        t=0, as it does after glTexImage2D. Integer data is normalized.
+    texcoords : numpy array
+        Array of shape (N, 2) with the (s, t) coordinates.
+
+    Returns an (N, 4) float32 array of RGBA colors.
+    """
+    tex = _texture_as_rgba(texture)
+    h, w = tex.shape[:2]
+    x = texcoords[:,0] * w - 0.5
+    y = texcoords[:,1] * h - 0.5
+    x0, y0 = np.floor(x), np.floor(y)
+    fx = (x - x0).astype(np.float32)[:, np.newaxis]
+    fy = (y - y0).astype(np.float32)[:, np.newaxis]
+    x0 = x0.astype(np.intp) % w
+    y0 = y0.astype(np.intp) % h
+    x1, y1 = (x0 + 1) % w, (y0 + 1) % h
+    top = tex[y0, x0] * (1 - fx) + tex[y0, x1] * fx
+    bottom = tex[y1, x0] * (1 - fx) + tex[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def _texture_as_rgba(texture):
+    """ Convert a texture to a float32 RGBA array with values in [0, 1].
+    """
+    tex = np.asarray(texture)
+    if tex.ndim == 2:
+        tex = tex[:, :, np.newaxis]
+    if tex.dtype.kind in 'ui':
+        tex = tex.astype(np.float32) / np.iinfo(tex.dtype).max
+    else:
+        tex = tex.astype(np.float32)
+    if tex.shape[2] == 1:  # Luminance
+        tex = np.concatenate([tex, tex, tex], 2)
+    if tex.shape[2] == 3:
+        alpha = np.ones(tex.shape[:2] + (1,), np.float32)
+        tex = np.concatenate([tex, alpha], 2)
+    return tex
+
+
+def cube_fragment(texcoords, texture):
+    """ The fragment shader (FRAG_CODE) of the textured cube demos.
+    """
+    tc = texcoords.copy()
+    tc[:,0] += np.sin(tc[:,1] * 20.0) * 0.05
+    return sample_texture(texture, tc)
+
+
+def _clip_near(clip, attr):
+    """ Clip triangles against the near plane (z >= -w in clip space).
+
+    clip is an (F, 3, 4) array with clip coordinates, attr an (F, 3, K)
+    array with the vertex attributes. Returns the new arrays; triangles
+    that cross the plane are replaced by one or two triangles.
+    """
+    d = clip[:,:,2] + clip[:,:,3]
+    inside = d >= 0
+    count = inside.sum(1)
+    data = np.concatenate([clip, attr], 2)
+    result = [data[count == 3]]
+
+    for n_in in (1, 2):
+        sel = count == n_in
+        if not sel.any():
+            continue
+        tri, dd, ins = data[sel], d[sel], inside[sel]
+        # Rotate the vertices (keeping the winding) such that the odd one
+        # out is the first: the inside vertex for n_in==1, the outside
+        # vertex for n_in==2.
+        odd = ins if n_in == 1 else ~ins
+        first = np.argmax(odd, 1)
+        order = (first[:, np.newaxis] + np.arange(3)) % 3
+        rows = np.arange(len(tri))[:, np.newaxis]
+        tri, dd = tri[rows, order], dd[rows, order]
+        a, b, c = tri[:,0], tri[:,1], tri[:,2]
+        # Intersections of the edges a-b and a-c with the plane
+        tab = (dd[:,0] / (dd[:,0] - dd[:,1]))[:, np.newaxis]
+        tac = (dd[:,0] / (dd[:,0] - dd[:,2]))[:, np.newaxis]
+        pab = a + (b - a) * tab
+        pac = a + (c - a) * tac
+        if n_in == 1:
+            result.append(np.stack([a, pab, pac], 1))
+        else:
+            result.append(np.stack([pab, b, c], 1))
+            result.append(np.stack([pab, c, pac], 1))
+
+    data = np.concatenate(result, 0)
+    return data[:,:,:4], data[:,:,4:]
+
+
+class SoftwareRenderer(object):
+    """ SoftwareRenderer(width, height, clear_color=(1, 1, 1, 1))
+
+    Renders triangles into a float32 RGBA color buffer and a depth buffer.
+    Like glReadPixels, row 0 of the buffers is the bottom of the image;
+    use image() to get an uint8 image with the top row first.
+
+    The renderer keeps track of the number of triangles drawn and the
+    time spent drawing them, see triangles_per_second, and likewise for
+    points (points_per_second).
+    """
+
+    def __init__(self, width, height, clear_color=(1, 1, 1, 1)):
+        self.width, self.height = int(width), int(height)
+        self.clear_color = clear_color
+        self.color = np.zeros((self.height, self.width, 4), np.float32)
+        self.depth = np.ones((self.height, self.width), np.float32)
+        self.fragments_per_batch = 1 << 20
+        self.triangles = 0
+        self.time_spent = 0.0
+        self.points = 0
+        self.points_time = 0.0
+        self.clear()
+
+
+    def clear(self):
+        """ Clear the color and depth buffer, like glClear.
+        """
+        self.color[...] = self.clear_color
+        self.depth[...] = 1.0
+
+
+    @property
+    def triangles_per_second(self):
+        if not self.time_spent:
+            return 0.0
+        return self.triangles / self.time_spent
+
+
+    @property
+    def points_per_second(self):
+        if not self.points_time:
+            return 0.0
+        return self.points / self.points_time
+
+
+    def image(self):
+        """ Get the color buffer as an uint8 RGBA image (top row first).
+        """
+        im = np.clip(self.color[::-1] * 255 + 0.5, 0, 255)
+        return im.astype(np.uint8)
+
+
+    def draw_triangles(self, positions, faces, texcoords, texture,
+                       model, view, projection, fragment=None):
+        """ Draw a textured triangle mesh.
+
+        Parameters
+        ----------
+        positions : numpy array
+            The (N, 3) vertex positions.
+        faces : numpy array
+            The (F, 3) vertex indices, or None to use consecutive vertices.
+        texcoords : numpy array
+            The (N, 2) texture coordinates.
+        texture : numpy array
+            The texture image, e.g. from io.cat().
+        model, view, projection : numpy array
+            The 4x4 matrices as they would be given to the shader.
+        fragment : callable
+            Function fragment(texcoords, texture) that returns an (M, 4)
+            array of colors. Default samples the texture.
+        """
+        t0 = time.time()
+        fragment = fragment or (lambda tc, tex: sample_texture(tex, tc))
+        if faces is None:
+            faces = np.arange(len(positions)).reshape(-1, 3)
+        faces = np.asarray(faces).reshape(-1, 3)
+
+        # Vertex stage
+        M = np.dot(np.dot(model, view), projection).astype(np.float32)
+        clip = np.dot(np.asarray(positions, np.float32), M[:3])
+        clip += M[3]
+        texcoords = np.asarray(texcoords, np.float32)[:,:2]
+
+        # Primitive assembly and clipping
+        clip, attr = _clip_near(clip[faces], texcoords[faces])
+
+        # Perspective divide and viewport transform
+        inv_w = 1.0 / clip[:,:,3]
+        win = np.empty(clip.shape[:2] + (3,), np.float32)
+        win[:,:,0] = (clip[:,:,0] * inv_w + 1) * 0.5 * self.width
+        win[:,:,1] = (clip[:,:,1] * inv_w + 1) * 0.5 * self.height
+        win[:,:,2] = (clip[:,:,2] * inv_w + 1) * 0.5
+        # Attributes divided by w, for perspective correct interpolation
+        attr_w = attr * inv_w[:,:,np.newaxis]
+
+        # Everything that is interpolated is linear in window space:
+        # depth, 1/w and the attributes divided by w.
+        values = np.concatenate([win[:,:,2:3], inv_w[:,:,np.newaxis],
+                                 attr_w], 2)
+        xy = win[:,:,:2].astype(np.float64)
+        area = ((xy[:,1,0] - xy[:,0,0]) * (xy[:,2,1] - xy[:,0,1]) -
+                (xy[:,2,0] - xy[:,0,0]) * (xy[:,1,1] - xy[:,0,1]))
+        keep = area != 0
+        xy, values, area = xy[keep], values[keep], area[keep]
+        edges = _planes(xy, area, np.eye(3)[np.newaxis].repeat(len(xy), 0))
+        planes = _planes(xy, area, values)
+
+        # Rows covered by each triangle, pixel centers are at i+0.5
+        ylo = np.maximum(np.ceil(xy[:,:,1].min(1) - 0.5), 0)
+        yhi = np.minimum(np.floor(xy[:,:,1].max(1) - 0.5), self.height - 1)
+        nrows = np.maximum(yhi - ylo + 1, 0).astype(np.intp)
+        tri = np.repeat(np.arange(len(xy)), nrows)
+        y = (np.arange(len(tri)) - np.repeat(np.cumsum(nrows) - nrows, nrows)
+             + ylo[tri] + 0.5)
+
+        # The span of each row: the edge functions must all be >= 0
+        xlo = np.repeat(xy[:,:,0].min(1), nrows)
+        xhi = np.repeat(xy[:,:,0].max(1), nrows)
+        A, B, C = edges[0][tri], edges[1][tri], edges[2][tri]
+        rest = B * y[:, np.newaxis] + C
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bound = -rest / A
+        xlo = np.maximum(xlo, np.where(A > 0, bound, -np.inf).max(1))
+        xhi = np.minimum(xhi, np.where(A < 0, bound, np.inf).min(1))
+        empty = ((A == 0) & (rest < 0)).any(1)
+        pxlo = np.maximum(np.ceil(xlo - 0.5), 0).astype(np.intp)
+        pxhi = np.minimum(np.floor(xhi - 0.5), self.width - 1).astype(np.intp)
+        count = np.where(empty, 0, np.maximum(pxhi - pxlo + 1, 0))
+
+        # Per row, the planes reduce to value = A * x + constant
+        slope = planes[0][tri].astype(np.float32)
+        offset = (planes[1][tri] * y[:, np.newaxis] +
+                  planes[2][tri]).astype(np.float32)
+        row_pix = (y - 0.5).astype(np.intp) * self.width + pxlo
+
+        # Rasterize in batches of roughly fragments_per_batch fragments
+        cum = np.cumsum(count)
+        start = 0
+        while start < len(count):
+            base = cum[start - 1] if start else 0
+            stop = np.searchsorted(cum, base + self.fragments_per_batch,
+                                   'right')
+            stop = max(stop, start + 1)
+            sl = slice(start, stop)
+            self._shade_spans(count[sl], pxlo[sl], row_pix[sl], slope[sl],
+                              offset[sl], texture, fragment)
+            start = stop
+
+        self.triangles += len(faces)
+        self.time_spent += time.time() - t0
+
+
+    def draw_points(self, position, point_size, color, texture):
+        """ Draw point sprites with additive blending, like GL_POINTS with
+        GL_POINT_SPRITE and glBlendFunc(GL_SRC_ALPHA, GL_ONE). The
+        fragment color is the texture (at gl_PointCoord) times the color
+        of the point.
+
+        Parameters
+        ----------
+        position : numpy array
+            The (N, 4) clip coordinates (gl_Position). Points whose center
+            is outside the clip volume are not drawn, like in GL.
+        point_size : numpy array
+            The (N,) sizes in pixels (gl_PointSize). Rounded to whole
+            pixels, and at least 1.
+        color : numpy array
+            The (N, 4) or (4,) RGBA colors.
+        texture : numpy array or sequence
+            The sprite image, or its mip levels (as from
+            sprites.sprite_levels), of which each point samples the level
+            closest to its size.
+        """
+        t0 = time.time()
+        position = np.asarray(position, np.float32)
+        x, y, z, w = position.T
+        inside = ((w > 0) & (np.abs(x) <= w) & (np.abs(y) <= w) &
+                  (np.abs(z) <= w))
+        color = np.broadcast_to(np.asarray(color, np.float32),
+                                (len(position), 4))[inside]
+        size = np.asarray(point_size, np.float32)
+        size = np.broadcast_to(size, (len(position),))[inside]
+        x, y, w = x[inside], y[inside], w[inside]
+        xw = (x / w + 1) * 0.5 * self.width
+        yw = (y / w + 1) * 0.5 * self.height
+        k = np.maximum(np.rint(size), 1).astype(np.intp)
+
+        # Blending factors: rgb += src.rgb * src.a, a += src.a * src.a
+        factor = np.empty_like(color)
+        factor[:,:3] = color[:,:3] * color[:,3:]
+        factor[:,3] = color[:,3] * color[:,3]
+
+        # Accumulate in a padded buffer, so sprites need no clipping.
+        # Per size group, splat the sprites directly if there are few
+        # fragments, otherwise convolve an image of the point centers
+        # with the sprite, by FFT, which costs the same for any number of
+        # points.
+        pad = int(k.max(initial=0)) + 1
+        shape = self.height + 3 * pad, self.width + 3 * pad
+        acc = np.zeros((4, shape[0] * shape[1]), np.float64)
+        spectrum = None
+        for size in np.unique(k):
+            group = np.nonzero(k == size)[0]
+            if isinstance(texture, (tuple, list)):
+                sprite = _sprite(select_level(texture, size), size)
+            else:
+                sprite = _sprite(texture, size)
+            # Lower left pixel of each point; the sprite is centered on
+            # the point, snapped to the pixel grid
+            px0 = np.floor(xw[group] - 0.5 * size + 0.5).astype(np.intp)
+            py0 = np.floor(yw[group] - 0.5 * size + 0.5).astype(np.intp)
+            base = (py0 + pad) * shape[1] + (px0 + pad)
+            f = factor[group]
+            if len(group) * size * size > acc.shape[1]:
+                if spectrum is None:
+                    spectrum = np.zeros((4, shape[0], shape[1] // 2 + 1),
+                                        np.complex128)
+                kernel = np.zeros((4,) + shape, np.float32)
+                kernel[:, :size, :size] = sprite.T.reshape(4, size, size)
+                for c in range(4):
+                    centers = np.bincount(base, f[:,c], acc.shape[1])
+                    spectrum[c] += (np.fft.rfft2(centers.reshape(shape)) *
+                                    np.fft.rfft2(kernel[c]))
+                continue
+            rows, cols = np.divmod(np.arange(size * size), size)
+            offsets = rows * shape[1] + cols
+            per_batch = max(1, self.fragments_per_batch // (size * size))
+            for i in range(0, len(group), per_batch):
+                sl = slice(i, i + per_batch)
+                pix = (base[sl, np.newaxis] + offsets).ravel()
+                for c in range(4):
+                    weights = np.outer(f[sl, c], sprite[:, c]).ravel()
+                    acc[c] += np.bincount(pix, weights, acc.shape[1])
+
+        acc = acc.reshape((4,) + shape)
+        if spectrum is not None:
+            acc += np.fft.irfft2(spectrum, shape)
+        self.color += acc[:, pad:pad + self.height,
+                          pad:pad + self.width].transpose(1, 2, 0)
+
+        self.points += len(color)
+        self.points_time += time.time() - t0
+
+
+    def _shade_spans(self, count, pxlo, row_pix, slope, offset, texture,
+                     fragment):
+        total = int(count.sum())
+        if not total:
+            return
+        row = np.repeat(np.arange(len(count)), count)
+        local = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+        pix = row_pix[row] + local
+        x = (pxlo[row] + local).astype(np.float32) + 0.5
+        values = slope[row] * x[:, np.newaxis] + offset[row]
+
+        # Discard what is beyond the far plane, then do the depth test.
+        # Where several fragments hit a pixel, the nearest one wins.
+        z = values[:,0]
+        depth = self.depth.reshape(-1)
+        ok = (z >= 0) & (z <= 1) & (z < depth[pix])
+        pix, z, values = pix[ok], z[ok], values[ok]
+        np.minimum.at(depth, pix, z)
+        ok = z == depth[pix]
+        pix, values = pix[ok], values[ok]
+        if not len(pix):
+            return
+
+        # Perspective correct attributes
+        attr = values[:,2:] / values[:,1:2]
+        self.color.reshape(-1, 4)[pix] = fragment(attr, texture)
+
+
+def _sprite(texture, size):
+    """ Sample a texture for a point sprite of size x size pixels. Returns
+    a (size*size, 4) array, the first row is the bottom of the sprite,
+    where gl_PointCoord.t is 1. The color is premultiplied by alpha, as
+    needed for the blending with GL_SRC_ALPHA.
+    """
+    coords = (np.arange(size) + 0.5) / size
+    s, t = np.meshgrid(coords, 1 - coords)
+    rgba = sample_texture(texture, np.column_stack([s.ravel(), t.ravel()]))
+    rgba[:,:3] *= rgba[:,3:]
+    rgba[:,3] *= rgba[:,3]
+    return rgba
+
+
+def _planes(xy, area, values):
+    """ Get the planes value = A*x + B*y + C through the values at the
+    three vertices of each triangle. xy has shape (T, 3, 2), values has
+    shape (T, 3, P). Returns A, B and C, each of shape (T, P).
+    """
+    x, y = xy[:,:,0:1], xy[:,:,1:2]
+    d1 = values[:,1] - values[:,0]
+    d2 = values[:,2] - values[:,0]
+    area = area[:, np.newaxis]
+    A = (d1 * (y[:,2] - y[:,0]) - d2 * (y[:,1] - y[:,0])) / area
+    B = (d2 * (x[:,1] - x[:,0]) - d1 * (x[:,2] - x[:,0])) / area
+    C = values[:,0] - A * x[:,0] - B * y[:,0]
+    return A, B, C
+
+
+if __name__ == '__main__':
+    import vispy_io as io
+    from transforms import perspective, translate
+    from animation import Timeline, Track
+
+    positions, faces, normals, texcoords = io.read_mesh('cube.obj')
+    texture = io.cat()
+    spin = Timeline(loop=True)
+    spin.add([Track('rotate', [0, 12], [0, 360], axis=(0,0,1)),
+              Track('rotate', [0, 12], [0, 360], axis=(0,1,0))])
+
+    view = np.eye(4, dtype=np.float32)
+    translate(view, 0,0,-5)
+    projection = perspective(45.0, 1.0, 2.0, 10.0)
+
+    renderer = SoftwareRenderer(400, 400)
+    for i in range(120):
+        renderer.clear()
+        model = spin.sample(i / 60.0)[0]
+        renderer.draw_triangles(positions, faces, texcoords, texture,
+                                model, view, projection, cube_fragment)
+    print('%i frames, %i triangles in %1.3f s: %1.0f triangles per second' %
+          (120, renderer.triangles, renderer.time_spent,
+           renderer.triangles_per_second))
+
+    # A fireworks explosion of 100k particles, as in fireworks_glut.py
+    from explosions import VERTEX_DTYPE, fill_explosion
+    from kinematics import evaluate
+    from sprites import sprite_levels
+
+    data = np.zeros(100000, VERTEX_DTYPE)
+    centerpos, color = fill_explosion(data, seed=0)
+    renderer = SoftwareRenderer(400, 400, clear_color=(0, 0, 0, 1))
+    for t in np.linspace(0, 1.5, 16):
+        renderer.clear()
+        position, v_lifetime, point_size = evaluate(data, t, centerpos)
+        colors = np.empty((len(data), 4), np.float32)
+        colors[:] = color
+        colors[:,3] *= v_lifetime
+        renderer.draw_points(position, point_size, colors, sprite_levels())
+    print('%i frames, %i points in %1.3f s: %1.0f points per second' %
+          (16, renderer.points, renderer.points_time,
+           renderer.points_per_second))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Procedural sprite textures for point sprites, with mip levels.
+
+The fireworks demos used to create their sprite (a disk of noise) at
+import time. sprite_levels() creates it on first use instead, and caches
+it by its parameters, so all demos and renderers share one copy. Besides
+the full resolution image it returns all mip levels, down to 1x1, so
+that small points can sample a texture of about their own size: by GL
+with GL_LINEAR_MIPMAP_LINEAR, or explicitly with select_level().
+
+The cached images are read-only; copy them to modify them.
+"""
+
+import functools
+
+import numpy as np
+
+
+KINDS = ('disk', 'gaussian')
+
+
+def make_sprite(size=64, kind='disk', mean=0.8, std=0.3, seed=0):
+    """
+    make_sprite creates a square luminance sprite.
+
+    Parameters
+    ----------
+    size
+        The width and height in pixels.
+
+    kind
+        'disk' for noise masked by a disk (as in the fireworks demos), or
+        'gaussian' for noise that fades out with a gaussian profile.
+
+    mean, std
+        The distribution of the noise. With std 0 the sprite is smooth.
+
+    seed
+        Seed for the noise.
+
+    Returns a float32 array of shape (size, size).
+    """
+    if kind not in KINDS:
+        raise ValueError('Unknown sprite kind %r, use one of %r.' %
+                         (kind, KINDS))
+    rng = np.random.default_rng(seed)
+    im = rng.normal(mean, std, (size, size)).astype(np.float32)
+    # Distance of the pixel centers to the center, in units of the radius
+    L = (np.arange(size) + 0.5) / (0.5 * size) - 1.0
+    X, Y = np.meshgrid(L, L)
+    R2 = X**2 + Y**2
+    if kind == 'disk':
+        im *= R2 <= 1.0
+    else:
+        im *= np.exp(-R2 / (2 * 0.35**2)).astype(np.float32)
+    return im
+
+
+def mipmaps(im):
+    """ Get the mip levels of a square power of two image, down to 1x1,
+    by averaging blocks of 2x2 pixels. Level 0 is the image itself.
+    """
+    size = im.shape[0]
+    if im.shape[1] != size or size & (size - 1):
+        raise ValueError('Mip levels need a square power of two image, '
+                         'not %r.' % (im.shape[:2],))
+    levels = [im]
+    while size > 1:
+        im = levels[-1]
+        size //= 2
+        im = im.reshape((size, 2, size, 2) + im.shape[2:]).mean((1, 3))
+        levels.append(im.astype(levels[0].dtype))
+    return levels
+
+
+@functools.lru_cache(maxsize=None)
+def sprite_levels(size=64, kind='disk', mean=0.8, std=0.3, seed=0):
+    """ Get a (cached) sprite as a tuple of mip levels, the full size
+    image first. See make_sprite for the parameters.
+    """
+    levels = mipmaps(make_sprite(size, kind, mean, std, seed))
+    for im in levels:
+        im.flags.writeable = False
+    return tuple(levels)
+
+
+def select_level(levels, point_size):
+    """ Get the smallest mip level that is at least point_size pixels
+    wide (or the full image for larger points).
+    """
+    for im in reversed(levels):
+        if im.shape[0] >= point_size:
+            return im
+    return levels[0]
@@ -0,0 +1,8 @@
+# The modules of the demos are at the top of the repository, and the
+# test helpers (like fakegl) next to the tests
+import os
+import sys
+
+TESTDIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTDIR))
+sys.path.insert(0, TESTDIR)
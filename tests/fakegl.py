@@ -0,0 +1,101 @@
+""" A fake GL module that records calls, for testing the GL helpers
+without a GL context.
+"""
+
+import numpy as np
+
+
+class FakeGL(object):
+    """ Records each gl* call as (name, args) in calls. Functions that are
+    not defined here return None. Programs link, and their binaries load
+    unless reject_binary or fail_binary is set.
+    """
+
+    GL_ARRAY_BUFFER = 0x8892
+    GL_ELEMENT_ARRAY_BUFFER = 0x8893
+    GL_TEXTURE_2D = 0x0DE1
+    GL_VERTEX_SHADER = 0x8B31
+    GL_FRAGMENT_SHADER = 0x8B30
+    GL_COMPILE_STATUS = 0x8B81
+    GL_LINK_STATUS = 0x8B82
+    GL_PROGRAM_BINARY_LENGTH = 0x8741
+    GL_PROGRAM_BINARY_RETRIEVABLE_HINT = 0x8257
+    GL_NUM_PROGRAM_BINARY_FORMATS = 0x87FE
+    GL_VENDOR, GL_RENDERER, GL_VERSION = 0x1F00, 0x1F01, 0x1F02
+    GL_TRUE = 1
+
+    BINARY_FORMAT = 7
+
+    def __init__(self, binary_formats=1):
+        self.calls = []
+        self.binary_formats = binary_formats
+        self.reject_binary = False  # glProgramBinary does not link
+        self.fail_binary = False  # glProgramBinary raises
+        self._handles = 0
+        self._linked = {}
+
+    def __getattr__(self, name):
+        if not name.startswith('gl'):
+            raise AttributeError(name)
+        return lambda *args: self._record(name, args)
+
+    def _record(self, name, args):
+        self.calls.append((name, args))
+
+    def count(self, name):
+        return sum(1 for call in self.calls if call[0] == name)
+
+    def _new_handle(self):
+        self._handles += 1
+        return self._handles
+
+    def glCreateShader(self, type):
+        self._record('glCreateShader', (type,))
+        return self._new_handle()
+
+    def glGetShaderiv(self, shader, pname):
+        return 1
+
+    def glCreateProgram(self):
+        self._record('glCreateProgram', ())
+        handle = self._new_handle()
+        self._linked[handle] = False
+        return handle
+
+    def glLinkProgram(self, handle):
+        self._record('glLinkProgram', (handle,))
+        self._linked[handle] = True
+
+    def glGetProgramiv(self, handle, pname):
+        if pname == self.GL_LINK_STATUS:
+            return int(self._linked[handle])
+        if pname == self.GL_PROGRAM_BINARY_LENGTH:
+            return 16
+        raise ValueError(pname)
+
+    def glGetProgramBinary(self, handle, size, length, format, binary):
+        self._record('glGetProgramBinary', (handle,))
+        length[0] = size
+        format[0] = self.BINARY_FORMAT
+        binary[:] = np.arange(size)
+
+    def glProgramBinary(self, handle, format, binary, size):
+        self._record('glProgramBinary', (handle, format))
+        if self.fail_binary:
+            raise RuntimeError('GLError: invalid binary format')
+        self._linked[handle] = (format == self.BINARY_FORMAT and
+                                not self.reject_binary)
+
+    def glGetIntegerv(self, pname):
+        return np.array([self.binary_formats])
+
+    def glGetString(self, name):
+        return b'fake'
+
+    def glGetAttribLocation(self, program, name):
+        self._record('glGetAttribLocation', (program, name))
+        return len(name)
+
+    def glGetUniformLocation(self, program, name):
+        self._record('glGetUniformLocation', (program, name))
+        return len(name)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from depthsort import DepthSorter, _argsort
+
+
+def assert_sorted(depth, order):
+    assert sorted(order) == list(range(len(depth)))
+    d = depth[order]
+    assert not (d[1:] < d[:-1]).any()
+
+
+def test_argsort_of_special_values():
+    depth = np.array([3.0, -0.0, 0.0, -np.inf, np.inf, -1e-30, 1e-30,
+                      -5.0, 2.0, -5.0], np.float32)
+    assert_sorted(depth, _argsort(depth))
+    assert_sorted(depth[:0], _argsort(depth[:0]))
+
+
+def test_ways_of_sorting():
+    np.random.seed(0)
+    depth = np.random.normal(0, 1, 10000).astype(np.float32)
+    sorter = DepthSorter()
+    assert_sorted(depth, sorter.sort(depth))
+    assert sorter.full == 1
+    # Nothing moved
+    assert_sorted(depth, sorter.sort(depth))
+    assert sorter.unchanged == 1
+    # A few moved
+    depth[np.random.randint(0, len(depth), 20)] += 0.5
+    assert_sorted(depth, sorter.sort(depth))
+    assert sorter.merged == 1
+    # Everything moved
+    depth = np.random.normal(0, 1, 10000).astype(np.float32)
+    assert_sorted(depth, sorter.sort(depth))
+    assert sorter.full == 2
@@ -0,0 +1,96 @@
+import numpy as np
+
+from glstate import GLState
+from fakegl import FakeGL
+
+
+def test_repeated_calls_are_skipped():
+    gl = FakeGL()
+    state = GLState(gl)
+    for i in range(3):
+        state.use_program(1)
+        state.bind_buffer(gl.GL_ARRAY_BUFFER, 5)
+        state.enable_vertex_attrib_array(0)
+        state.uniformf(2, 1.0, 0.5)
+    assert gl.count('glUseProgram') == 1
+    assert gl.count('glBindBuffer') == 1
+    assert gl.count('glEnableVertexAttribArray') == 1
+    assert gl.count('glUniform2f') == 1
+    assert state.issued['glUseProgram'] == 1
+    assert state.avoided['glUseProgram'] == 2
+
+
+def test_changes_are_issued():
+    gl = FakeGL()
+    state = GLState(gl)
+    state.use_program(1)
+    state.use_program(2)
+    state.uniformf(2, 1.0)
+    state.uniformf(2, 2.0)
+    state.use_program(1)
+    state.uniformf(2, 2.0)  # Uniforms are per program
+    assert gl.count('glUseProgram') == 3
+    assert gl.count('glUniform1f') == 3
+
+
+def test_invalidate_issues_calls_again():
+    gl = FakeGL()
+    state = GLState(gl)
+    m = np.eye(4)
+    state.use_program(1)
+    state.uniform_matrix4fv(0, m)
+    state.invalidate()
+    state.use_program(1)
+    state.uniform_matrix4fv(0, m)
+    assert gl.count('glUseProgram') == 2
+    assert gl.count('glUniformMatrix4fv') == 2
+
+
+def test_textures_are_tracked_per_unit():
+    gl = FakeGL()
+    state = GLState(gl)
+    for unit in (0, 1, 0, 1):
+        state.active_texture(unit)
+        state.bind_texture(gl.GL_TEXTURE_2D, 3)
+    assert gl.count('glActiveTexture') == 4
+    assert gl.count('glBindTexture') == 2
+
+
+def test_vertex_attrib_pointer_needs_a_buffer():
+    gl = FakeGL()
+    state = GLState(gl)
+    data = np.zeros((3, 3), 'float32')
+    state.vertex_attrib_pointer(0, 3, 'float', False, 0, data)
+    state.vertex_attrib_pointer(0, 3, 'float', False, 0, data)
+    assert gl.count('glVertexAttribPointer') == 2
+    state.bind_buffer(gl.GL_ARRAY_BUFFER, 5)
+    state.vertex_attrib_pointer(0, 3, 'float', False, 0, 0)
+    state.vertex_attrib_pointer(0, 3, 'float', False, 0, 0)
+    assert gl.count('glVertexAttribPointer') == 3
+    state.bind_buffer(gl.GL_ARRAY_BUFFER, 6)
+    state.vertex_attrib_pointer(0, 3, 'float', False, 0, 0)
+    assert gl.count('glVertexAttribPointer') == 4
+
+
+def test_locations_are_cached_until_forgotten():
+    gl = FakeGL()
+    state = GLState(gl)
+    state.use_program(1)
+    state.uniformf(4, 1.0)
+    for i in range(3):
+        assert state.attrib_location(1, 'a_position') == len('a_position')
+        assert state.uniform_location(1, 'u_color') == len('u_color')
+    # Locations survive invalidate()
+    state.invalidate()
+    state.attrib_location(1, 'a_position')
+    assert gl.count('glGetAttribLocation') == 1
+    assert gl.count('glGetUniformLocation') == 1
+
+    state.use_program(1)
+    state.forget_program(1)
+    state.attrib_location(1, 'a_position')
+    state.use_program(1)
+    state.uniformf(4, 1.0)
+    assert gl.count('glGetAttribLocation') == 2
+    assert gl.count('glUseProgram') == 3
+    assert gl.count('glUniform1f') == 2
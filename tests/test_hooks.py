@@ -0,0 +1,50 @@
+import pytest
+
+import vispy_io as io
+from vispy_io import hooks
+
+
+@pytest.fixture
+def events():
+    events = []
+    io.add_hook(events.append)
+    yield events
+    io.remove_hook(events.append)
+
+
+def test_events_per_phase(events):
+    phase = hooks.phases('image', 'x.bz2')
+    with phase('read'):
+        pass
+    with phase('decompress'):
+        pass
+    assert [(e.reader, e.phase, e.asset) for e in events] == [
+        ('image', 'read', 'x.bz2'), ('image', 'decompress', 'x.bz2')]
+    assert all(e.duration >= 0 for e in events)
+
+
+def test_no_timing_without_hooks():
+    assert hooks.phases('image', 'x.bz2') is hooks.null_phase
+
+
+def test_failed_phase_is_not_emitted(events):
+    phase = hooks.phases('image', 'x.bz2')
+    with pytest.raises(ZeroDivisionError):
+        with phase('decompress'):
+            1 / 0
+    assert events == []
+
+
+def test_failing_hook_warns(events):
+    def broken(event):
+        raise KeyError(event.phase)
+    io.add_hook(broken)
+    try:
+        phase = hooks.phases('image', 'x.bz2')
+        with pytest.warns(RuntimeWarning, match='decompress'):
+            with phase('decompress'):
+                pass
+    finally:
+        io.remove_hook(broken)
+    # The other hooks are still called
+    assert [e.phase for e in events] == ['decompress']
@@ -0,0 +1,54 @@
+import os
+import bz2
+
+import numpy as np
+
+import vispy_io as io
+
+
+def make_blob(tmpdir, monkeypatch, shape=(40, 30, 3)):
+    monkeypatch.setattr(io, 'RESOURCE_DIR', str(tmpdir))
+    im = np.random.randint(0, 255, shape).astype(np.uint8)
+    fname = str(tmpdir.join('image.bz2'))
+    with open(fname, 'wb') as f:
+        f.write(bz2.compress(im.tobytes()))
+    return fname, im
+
+
+def test_tiled_version_is_used(tmpdir, monkeypatch):
+    fname, im = make_blob(tmpdir, monkeypatch)
+    tiled = io.convert_blob(fname, im.shape, tile_size=16)
+    assert tiled == str(tmpdir.join('image' + io.TILED_EXT))
+    # Write something else in it, to see which one was read
+    io.write_tiled(tiled, im[::-1], tile_size=16)
+    assert np.array_equal(io._read_image('image.bz2', im.shape), im[::-1])
+
+
+def test_tiled_version_of_other_shape_is_ignored(tmpdir, monkeypatch):
+    fname, im = make_blob(tmpdir, monkeypatch)
+    io.write_tiled(str(tmpdir.join('image.tiled')), im[:20])
+    assert np.array_equal(io._read_image('image.bz2', im.shape), im)
+    io.write_tiled(str(tmpdir.join('image.tiled')), im.astype(np.float32))
+    assert np.array_equal(io._read_image('image.bz2', im.shape), im)
+    tmpdir.join('image.tiled').write('not a tiled image')
+    assert np.array_equal(io._read_image('image.bz2', im.shape), im)
+
+
+def test_stale_tiled_version_is_ignored(tmpdir, monkeypatch):
+    fname, im = make_blob(tmpdir, monkeypatch)
+    tiled = str(tmpdir.join('image.tiled'))
+    io.write_tiled(tiled, im[::-1])
+    mtime = os.path.getmtime(fname)
+    os.utime(tiled, (mtime - 10, mtime - 10))
+    assert np.array_equal(io._read_image('image.bz2', im.shape), im)
+
+
+def test_truncated_tiled_version_is_ignored(tmpdir, monkeypatch):
+    fname, im = make_blob(tmpdir, monkeypatch)
+    tiled = str(tmpdir.join('image.tiled'))
+    io.write_tiled(tiled, im[::-1], tile_size=8)
+    with open(tiled, 'rb') as f:
+        bb = f.read()
+    with open(tiled, 'wb') as f:
+        f.write(bb[:io.tiled.HEADER.size + 16])  # Two offsets of the index
+    assert np.array_equal(io._read_image('image.bz2', im.shape), im)
@@ -0,0 +1,23 @@
+from particles import ParticlePool
+
+
+def test_emit_nothing():
+    pool = ParticlePool(10, seed=0)
+    slots = pool.emit(0, 1.0, (0, 0, 0), (1, 1, 1, 1))
+    assert len(slots) == 0
+    assert pool.live == 0 and pool.bursts == 0
+    assert pool.take_changed() == []
+    pool.update(100.0)
+    assert pool.free == 10
+
+
+def test_bursts_are_released_when_dead():
+    pool = ParticlePool(10, seed=0)
+    first = pool.emit(4, 0.0, (0, 0, 0), (1, 1, 1, 1), lifetime=(1.0, 0.0))
+    second = pool.emit(6, 5.0, (0, 0, 0), (1, 1, 1, 1), lifetime=(1.0, 0.0))
+    assert list(first) == [0, 1, 2, 3] and list(second) == [4, 5, 6, 7, 8, 9]
+    assert pool.take_changed() == [(0, 4), (4, 10)]
+    pool.update(2.0)
+    assert pool.free == 4 and pool.bursts == 1
+    # Released slots are handed out again, lowest first
+    assert list(pool.allocate(2)) == [0, 1]
@@ -0,0 +1,92 @@
+import os
+
+from programs import ProgramCache
+from fakegl import FakeGL
+
+VERT = 'void main() { gl_Position = vec4(0.0); }'
+FRAG = 'void main() { gl_FragColor = vec4(1.0); }'
+
+
+def binaries(cache_dir):
+    return [f for f in os.listdir(cache_dir) if f.endswith('.bin')]
+
+
+def test_key_depends_on_both_sources():
+    assert ProgramCache.key(VERT, FRAG) == ProgramCache.key(VERT, FRAG)
+    assert ProgramCache.key(VERT, FRAG) != ProgramCache.key(FRAG, VERT)
+    assert ProgramCache.key('ab', 'c') != ProgramCache.key('a', 'bc')
+
+
+def test_memory_cache_returns_same_handle():
+    gl = FakeGL()
+    cache = ProgramCache(gl)
+    handle = cache.get(VERT, FRAG)
+    assert cache.get(VERT, FRAG) == handle
+    assert cache.stats == {'source': 1, 'memory': 1}
+    assert gl.count('glLinkProgram') == 1
+
+
+def test_binary_is_stored_and_loaded(tmpdir):
+    cache_dir = str(tmpdir.join('programs'))
+    ProgramCache(FakeGL(), cache_dir).get(VERT, FRAG)
+    assert len(binaries(cache_dir)) == 1
+
+    gl = FakeGL()
+    cache = ProgramCache(gl, cache_dir)
+    cache.get(VERT, FRAG)
+    assert cache.stats == {'binary': 1}
+    assert gl.count('glLinkProgram') == 0
+
+
+def test_no_binaries_without_driver_support(tmpdir):
+    cache = ProgramCache(FakeGL(binary_formats=0), str(tmpdir))
+    cache.get(VERT, FRAG)
+    assert cache.stats == {'source': 1}
+    assert binaries(str(tmpdir)) == []
+
+
+def _stored_binary(cache_dir):
+    ProgramCache(FakeGL(), cache_dir).get(VERT, FRAG)
+    return os.path.join(cache_dir, binaries(cache_dir)[0])
+
+
+def test_truncated_binary_falls_back_to_source(tmpdir):
+    for content in (b'', b'\x07\x00'):
+        filename = _stored_binary(str(tmpdir))
+        with open(filename, 'wb') as f:
+            f.write(content)
+        cache = ProgramCache(FakeGL(), str(tmpdir))
+        cache.get(VERT, FRAG)
+        assert cache.stats == {'source': 1}
+        # And the broken file was replaced by a good one
+        assert os.path.getsize(filename) > 4
+
+
+def test_rejected_binary_falls_back_to_source(tmpdir):
+    _stored_binary(str(tmpdir))
+    gl = FakeGL()
+    gl.reject_binary = True
+    cache = ProgramCache(gl, str(tmpdir))
+    cache.get(VERT, FRAG)
+    assert cache.stats == {'source': 1}
+    assert gl.count('glDeleteProgram') == 1
+
+
+def test_binary_error_falls_back_to_source(tmpdir):
+    _stored_binary(str(tmpdir))
+    gl = FakeGL()
+    gl.fail_binary = True
+    cache = ProgramCache(gl, str(tmpdir))
+    cache.get(VERT, FRAG)
+    assert cache.stats == {'source': 1}
+    assert gl.count('glDeleteProgram') == 1
+
+
+def test_unwritable_cache_dir_is_skipped(tmpdir):
+    # A file where the directory should be, so it cannot be created
+    cache_dir = tmpdir.join('not_a_dir')
+    cache_dir.write('')
+    cache = ProgramCache(FakeGL(), str(cache_dir))
+    handle = cache.get(VERT, FRAG)
+    assert handle is not None
+    assert cache.stats == {'source': 1}
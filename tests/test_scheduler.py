@@ -0,0 +1,79 @@
+from pytest import approx
+
+from scheduler import FrameScheduler
+
+
+class FakeClock(object):
+    """ A clock that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make(**kwargs):
+    clock = FakeClock()
+    return clock, FrameScheduler(fps=4, clock=clock, **kwargs)
+
+
+def test_steps_and_alpha():
+    clock, s = make()  # Frames and steps of 0.25 s
+    clock.now += 0.25
+    assert s.advance() == (1, 0.0)
+    clock.now += 0.125
+    steps, alpha = s.advance()
+    assert steps == 0 and alpha == approx(0.5)
+    clock.now += 0.5
+    steps, alpha = s.advance()
+    assert steps == 2 and alpha == approx(0.5)
+    assert s.steps == 3 and s.time == approx(0.75)
+    assert s.frames == 3
+
+
+def test_smaller_step_than_frame():
+    clock, s = make(step=0.0625)
+    clock.now += 0.25
+    assert s.advance() == (4, 0.0)
+
+
+def test_max_steps_drops_time():
+    clock, s = make(max_steps=2)
+    clock.now += 1.0
+    steps, alpha = s.advance()
+    assert steps == 2 and alpha == approx(0.0)
+    assert s.dropped_time == approx(0.5)
+    assert s.time == approx(0.5)
+
+
+def test_late_frames_are_skipped():
+    clock, s = make()
+    assert s.delay() == approx(0.25)
+    # At 0.6 s the deadlines at 0.25 and 0.5 have passed: this frame is
+    # the one of 0.5, the one of 0.25 is skipped, the next is at 0.75
+    clock.now += 0.6
+    s.advance()
+    assert s.skipped_frames == 1
+    assert s.delay() == approx(0.15)
+    assert s.delay_ms() in (149, 150)
+
+
+def test_no_drift_for_slightly_late_frames():
+    clock, s = make()
+    for i in range(8):
+        clock.now += s.delay() + 0.01  # Each callback is a bit late
+        s.advance()
+    assert s.skipped_frames == 0
+    # Still on the original schedule
+    assert s.delay() == approx(0.24)
+    assert s.pacing()['max_lateness_ms'] == approx(10)
+
+
+def test_fps():
+    clock, s = make()
+    assert s.fps == 0.0
+    for i in range(5):
+        clock.now += 0.25
+        s.advance()
+    assert s.fps == approx(4.0)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from softrender import SoftwareRenderer
+from transforms import ortho, perspective
+
+EYE = np.eye(4, dtype=np.float32)
+
+
+def solid(color):
+    return np.array([[color]], np.uint8)
+
+
+def test_textured_fullscreen_quad():
+    # With one texel per pixel, each pixel samples its texel exactly
+    texture = np.arange(4 * 4 * 3, dtype=np.uint8).reshape(4, 4, 3) * 5
+    positions = np.array([[-1,-1,0], [1,-1,0], [1,1,0], [-1,1,0]], np.float32)
+    texcoords = np.array([[0,0], [1,0], [1,1], [0,1]], np.float32)
+    faces = np.array([[0,1,2], [0,2,3]])
+    r = SoftwareRenderer(4, 4, clear_color=(0, 0, 0, 0))
+    r.draw_triangles(positions, faces, texcoords, texture, EYE, EYE,
+                     ortho(-1, 1, -1, 1, -1, 1))
+    # Row 0 of the color buffer is the bottom, where t=0: the first row
+    # of the texture
+    assert np.allclose(r.color[..., :3] * 255, texture, atol=1e-3)
+    assert np.allclose(r.color[..., 3], 1)
+    assert np.array_equal(r.image()[..., :3], texture[::-1])
+    assert np.allclose(r.depth, 0.5)
+    assert r.triangles == 2
+
+
+def test_depth_test_keeps_the_nearest():
+    far = np.array([[-1,-1,-0.5], [1,-1,-0.5], [0,1,-0.5]], np.float32)
+    near = far * [0.5, 0.5, -1]  # Smaller, and in front
+    texcoords = np.zeros((3, 2), np.float32)
+    projection = ortho(-1, 1, -1, 1, -1, 1)
+    for order in ((far, near), (near, far)):
+        r = SoftwareRenderer(20, 20)
+        for positions in order:
+            color = (0, 255, 0) if positions is near else (255, 0, 0)
+            r.draw_triangles(positions, None, texcoords, solid(color), EYE,
+                             EYE, projection)
+        # The center is covered by both, the bottom corners only by far
+        assert tuple(r.color[10, 10, :3]) == (0, 1, 0)
+        assert np.isclose(r.depth[10, 10], 0.25)
+        assert tuple(r.color[1, 1, :3]) == (1, 0, 0)
+        assert np.isclose(r.depth[1, 1], 0.75)
+
+
+def test_triangle_crossing_the_near_plane_is_clipped():
+    # A floor triangle at y=-1 that reaches behind the camera
+    positions = np.array([[-1,-1,-5], [1,-1,-5], [0,-1,1]], np.float32)
+    texcoords = np.zeros((3, 2), np.float32)
+    r = SoftwareRenderer(100, 100, clear_color=(0, 0, 0, 0))
+    r.draw_triangles(positions, None, texcoords, solid((255, 255, 255)),
+                     EYE, EYE, perspective(90.0, 1.0, 0.5, 10.0))
+    covered = r.color[..., 0] > 0
+    # The far edge is at y = -1/5 on screen, and the floor runs off the
+    # bottom; nothing is drawn above the horizon
+    assert np.array_equal(np.nonzero(covered.any(1))[0], np.arange(40))
+    assert ((r.depth[covered] >= 0) & (r.depth[covered] <= 1)).all()
+    # At the bottom row (y = -0.99, z = -1/0.99) the floor is
+    # 2 * (1 - z) / 6 wide, seen at 1/-z: about 33 pixels
+    assert abs(covered[0].sum() - 33) <= 1
+    assert covered[0, 50] and not covered[0, 10]
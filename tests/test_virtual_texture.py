@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from transforms import ortho, perspective, translate
+from virtual_texture import (ArrayPyramid, VirtualTexture, needed_tiles,
+                             level_shape)
+
+PLANE = (np.array([[-1,-1,0], [1,-1,0], [1,1,0], [-1,1,0]], np.float32),
+         np.array([[0,0], [1,0], [1,1], [0,1]], np.float32),
+         np.array([[0,1,2], [0,2,3]], np.uint32))
+
+
+def plane_tiles(view, projection, shape=(8192, 8192), tile_size=256):
+    positions, texcoords, faces = PLANE
+    num_levels = int(np.log2(max(shape))) + 1
+    return needed_tiles(positions, texcoords, faces, np.eye(4), view,
+                        projection, (0, 0, 1024, 1024), shape, tile_size,
+                        num_levels)
+
+
+def test_level_matches_screen_size():
+    # 8192 texels over 1024 pixels is 8 texels per pixel, level 3, at
+    # which the 32 level 0 tiles per side are covered by 4 tiles
+    keys = plane_tiles(np.eye(4), ortho(-1, 1, -1, 1, -10, 10))
+    assert keys == set((3, r, c) for r in range(4) for c in range(4))
+    # Twice as far, half the size on screen: one level coarser
+    keys = plane_tiles(np.eye(4), ortho(-2, 2, -2, 2, -10, 10))
+    assert set(k[0] for k in keys) == {4}
+
+
+def test_invisible_tiles_are_culled():
+    view = np.eye(4)
+    translate(view, 5, 0, 0)  # Beside the view
+    assert plane_tiles(view, ortho(-1, 1, -1, 1, -10, 10)) == set()
+    view = np.eye(4)
+    translate(view, 0, 0, 2)  # Behind the camera
+    assert plane_tiles(view, perspective(45.0, 1.0, 0.1, 10.0)) == set()
+
+
+def make_texture(shape=(64, 64), **kwargs):
+    im = np.random.randint(0, 255, shape + (3,)).astype(np.uint8)
+    return VirtualTexture(ArrayPyramid(im, tile_size=16), **kwargs)
+
+
+def test_capacity_must_fit_the_levels():
+    with pytest.raises(ValueError):
+        make_texture(capacity=6)  # 64x64 has 7 levels
+    make_texture(capacity=7)
+
+
+def test_parents_are_loaded_coarse_first():
+    vt = make_texture(capacity=64, max_uploads=2)
+    uploads = vt.request({(0, 0, 0)})
+    assert [key for slot, key, tile in uploads] == [(6, 0, 0), (5, 0, 0)]
+    # Until the rest is loaded, the coarsest resident level is used
+    assert (vt.page_table[..., 1] == 5).all()
+    for i in range(3):
+        vt.request({(0, 0, 0)})
+    assert vt.resident == set((level, 0, 0) for level in range(7))
+    assert vt.uploads == 7
+    assert tuple(vt.page_table[0, 0]) == (vt._tiles[(0, 0, 0)], 0)
+    assert tuple(vt.page_table[0, 1]) == (vt._tiles[(1, 0, 0)], 1)
+
+
+def test_least_recently_used_tiles_are_evicted():
+    vt = make_texture(capacity=7)
+    vt.request({(0, 0, 0)})
+    assert vt.evictions == 0
+    vt.request({(0, 3, 3)})
+    # The tiles that are not wanted anymore made room
+    assert vt.evictions == 2
+    assert vt.resident == set([(0, 3, 3), (1, 1, 1)] +
+                              [(level, 0, 0) for level in range(2, 7)])
+    # Resident tiles are hits
+    vt.request({(0, 3, 3)})
+    assert vt.hits == 5 + 7
+    assert vt.uploads == 9
+
+
+def test_full_atlas_falls_back_to_coarser_tiles():
+    vt = make_texture(capacity=8)
+    vt.request({(0, 0, 0), (0, 3, 3)})
+    # One of the finest tiles did not fit
+    assert len(vt.resident) == 8
+    assert vt.evictions == 0
+    texels, levels = vt.lookup(np.array([0.01, 0.99]), np.array([0.01, 0.99]))
+    assert sorted(levels) == [0, 1]
+
+
+@pytest.mark.parametrize('shape', [(64, 64), (100, 70), (37, 129)])
+def test_lookup_matches_mip_levels(shape):
+    # Less room than the tiles need, so that several levels are used
+    vt = make_texture(shape, capacity=20)
+    source = vt.source
+    keys = set()
+    rows, cols = vt.page_table.shape[:2]
+    for r in range(rows):
+        for c in range(cols):
+            keys.add((0, r, c))
+    for i in range(10):
+        vt.request(keys)
+    assert len(vt.resident) == 20
+
+    u, v = np.random.uniform(0, 1, (2, 10000))
+    texels, levels = vt.lookup(u, v)
+    assert (levels >= 0).all()
+    x = (u * shape[1]).astype(int)
+    y = (v * shape[0]).astype(int)
+    for level in np.unique(levels):
+        sel = levels == level
+        assert source._levels[level].shape[:2] == level_shape(shape, level)
+        expected = source._levels[level][y[sel] >> level, x[sel] >> level]
+        assert np.array_equal(texels[sel], expected)
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+import vispy_io as io
+
+DATADIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def test_relative_indices_use_the_vertices_read_so_far():
+    vertices, faces, normals, texcoords = io.read_mesh(
+        os.path.join(DATADIR, 'relative_indices.obj'))
+    assert vertices[faces[0]].tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+    assert vertices[faces[1]].tolist() == [[5, 5, 5], [6, 5, 5], [5, 6, 5]]
+
+
+def test_same_relative_indices_in_other_faces(tmpdir):
+    fname = tmpdir.join('repeated.obj')
+    fname.write('v 0 0 0\nv 1 0 0\nv 0 1 0\nf -3 -2 -1\n'
+                'v 5 5 5\nv 6 5 5\nv 5 6 5\nf -3 -2 -1\n')
+    vertices, faces, normals, texcoords = io.read_mesh(str(fname))
+    assert len(vertices) == 6
+    assert vertices[faces[1]].tolist() == [[5, 5, 5], [6, 5, 5], [5, 6, 5]]
+
+
+def test_phases_are_reported_in_order():
+    names = []
+    io.read_mesh('cube.obj', phase=lambda name: _Record(names, name))
+    assert names == ['open', 'parse', 'unify', 'arrays', 'normals']
+
+
+def test_read_mesh_memory_reports_array_bytes():
+    mesh, report = io.read_mesh_memory('triceratops.obj')
+    assert report['array_bytes'] == sum(a.nbytes for a in mesh
+                                        if a is not None)
+    assert report['peak'] >= max(p['peak'] for p in report['phases'])
+    assert np.isfinite(mesh[0]).all()
+
+
+class _Record(object):
+    def __init__(self, names, name):
+        self._names, self._name = names, name
+
+    def __enter__(self):
+        self._names.append(self._name)
+
+    def __exit__(self, *args):
+        pass
@@ -146,3 +146,130 @@ def perspective(fovy, aspect, znear, zfar):
     h = np.tan(fovy / 360.0 * np.pi) * znear
     w = h * aspect
     return frustum( -w, w, -h, h, znear, zfar )
+
+
+def _viewport_matrix(viewport):
+    """ Matrix that maps normalized device coordinates to window
+    coordinates for the given viewport (x, y, width, height), like
+    glViewport and glDepthRange(0, 1) do.
+    """
+    x, y, w, h = viewport
+    V = np.eye(4, dtype=np.float64)
+    V[0,0], V[1,1], V[2,2] = 0.5*w, 0.5*h, 0.5
+    V[3,:3] = x + 0.5*w, y + 0.5*h, 0.5
+    return V
+
+
+def run_chunked(func, n, chunk_size, threads):
+    """ Call func(start, stop) for consecutive chunks covering range(n),
+    using a thread pool if threads > 1.
+    """
+    bounds = [(i, min(i+chunk_size, n)) for i in range(0, n, chunk_size)]
+    if threads and threads > 1 and len(bounds) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            # Consume the iterator so exceptions in workers propagate
+            list(pool.map(lambda b: func(*b), bounds))
+    else:
+        for i0, i1 in bounds:
+            func(i0, i1)
+
+
+def transform_points(points, M, out=None, chunk_size=65536, threads=1):
+    """
+    transform_points applies the transformation M to an array of 3D points,
+    including the division by w for projective transformations.
+
+    The matrices in this module are laid out the way the shaders expect
+    them, so a point p is transformed as [x, y, z, 1] @ M. The homogeneous
+    coordinate is never stored; points are processed in chunks.
+
+    Parameters
+    ----------
+    points
+        Array of shape (N, 3) (or (3,)). Not copied if already float32.
+
+    M
+        The 4x4 transformation.
+
+    out
+        Optional C-contiguous float32 array of shape (N, 3) to write to.
+        May be points itself.
+
+    chunk_size
+        Number of points processed per chunk.
+
+    threads
+        Number of threads to distribute the chunks over. NumPy releases
+        the GIL in the matrix products, so this scales for large N.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    shape = points.shape
+    points = points.reshape(-1, 3)
+    M = np.asarray(M, dtype=np.float32)
+    R = np.ascontiguousarray(M[:3,:3])
+    t = M[3,:3].copy()
+    wcol = M[:3,3].copy()
+    w0 = M[3,3]
+    affine = not wcol.any() and w0 == 1.0
+    
+    if out is None:
+        out = np.empty(points.shape, dtype=np.float32)
+    out = out.reshape(-1, 3)
+    if out.dtype != np.float32 or not out.flags.c_contiguous:
+        raise ValueError('transform_points needs a C-contiguous float32 out.')
+    if out.shape != points.shape:
+        raise ValueError('transform_points out has shape %r, need %r.' % 
+                         (out.shape, points.shape))
+    
+    def work(i0, i1):
+        p, o = points[i0:i1], out[i0:i1]
+        if not affine:
+            # Compute w first, as p and o may be the same memory
+            w = np.dot(p, wcol)
+            w += w0
+        np.dot(p, R, out=o)
+        o += t
+        if not affine:
+            o /= w[:, np.newaxis]
+    
+    run_chunked(work, points.shape[0], chunk_size, threads)
+    return out.reshape(shape)
+
+
+def project(points, model, view, projection, viewport, out=None,
+            chunk_size=65536, threads=1):
+    """
+    project maps object coordinates to window coordinates, like gluProject
+    but for an array of points.
+    
+    Parameters
+    ----------
+    points
+        Array of shape (N, 3) with object coordinates.
+
+    model, view, projection
+        The 4x4 matrices as they would be passed to the shader.
+
+    viewport
+        The (x, y, width, height) as passed to glViewport.
+    
+    Returns an (N, 3) float32 array with window x and y in pixels (origin
+    at the bottom left) and depth in [0, 1]. See transform_points for the
+    other arguments.
+    """
+    M = np.dot(np.dot(np.dot(model, view), projection), 
+               _viewport_matrix(viewport))
+    return transform_points(points, M, out, chunk_size, threads)
+
+
+def unproject(points, model, view, projection, viewport, out=None,
+              chunk_size=65536, threads=1):
+    """
+    unproject maps window coordinates (x, y, depth) back to object
+    coordinates; the inverse of project.
+    """
+    M = np.dot(np.dot(np.dot(model, view), projection), 
+               _viewport_matrix(viewport))
+    M = np.linalg.inv(M.astype(np.float64))
+    return transform_points(points, M, out, chunk_size, threads)
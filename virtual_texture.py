@@ -0,0 +1,478 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Virtual texture streaming, for images that are too large for the GPU.
+
+The demos upload a texture as a whole with glTexImage2D. A virtual
+texture instead keeps a fixed number of tiles (of the mip levels of the
+image) in an atlas, and a page table that maps each tile of the full
+resolution image to the finest resident tile that covers it. Each frame:
+
+  * needed_tiles() computes from the mesh, its texture coordinates and
+    the model/view/projection matrices which tiles, at which mip level,
+    are visible. Triangles are subdivided until they are small on screen,
+    so that a plane seen at an angle gets fine tiles nearby and coarse
+    tiles far away.
+  * VirtualTexture.request() loads the tiles that are missing (at most
+    max_uploads per frame, coarse levels first) into free or least
+    recently used slots of the atlas, and updates the page table.
+    Requested tiles that do not fit or have not been loaded yet fall back
+    to a coarser tile, and the parents of all requested tiles are
+    requested as well, so there always is one.
+
+All of this is done with NumPy. The returned uploads tell the GL code
+which atlas regions to update with glTexSubImage2D; the atlas and page
+table are then sampled in the fragment shader. lookup() does that
+sampling on the CPU, as a reference.
+
+Tiles come from a source with the mip levels of the image: an
+ArrayPyramid made from an array, or a TiledPyramid of tiled image files
+(see vispy_io.tiled and write_pyramid), which reads only the tiles that
+are needed. Texture coordinate v=0 is the first row of the image, as
+uploaded by glTexImage2D. Texture coordinates are mapped to texels of
+level 0, and from there to level L by dividing by 2**L (not by scaling
+with the size of level L), so that the tiles of all levels nest also for
+sizes that are not a power of two. Tiles have no border, so filtering
+across tile edges is not seamless.
+"""
+
+import math
+import collections
+
+import numpy as np
+
+import vispy_io as io
+
+
+def downsample(im, band=256):
+    """ Halve an image (H, W) or (H, W, C) by averaging blocks of 2x2
+    pixels. Images of odd size are extended by repeating the last row or
+    column. Done in bands of rows, to limit the temporary memory.
+    """
+    h, w = im.shape[:2]
+    out = np.empty((-(-h // 2), -(-w // 2)) + im.shape[2:], im.dtype)
+    for y in range(0, out.shape[0], band):
+        a = im[2*y:2*(y+band)]
+        pad = [(0, len(a) % 2), (0, w % 2)] + [(0, 0)] * (im.ndim - 2)
+        a = np.pad(a, pad, 'edge').astype(np.float32)
+        a = a.reshape((a.shape[0] // 2, 2, a.shape[1] // 2, 2) + a.shape[2:])
+        a = a.mean((1, 3))
+        if np.issubdtype(im.dtype, np.integer):
+            a = np.round(a)
+        out[y:y+band] = a
+    return out
+
+
+def mip_levels(im):
+    """ Get the mip levels of an image, down to 1x1 (see downsample).
+    Level 0 is the image itself.
+    """
+    levels = [im]
+    while max(levels[-1].shape[:2]) > 1:
+        levels.append(downsample(levels[-1]))
+    return levels
+
+
+def level_shape(shape, level):
+    """ Get the (height, width) of a mip level of an image of the given
+    shape.
+    """
+    f = 2 ** level
+    return -(-shape[0] // f), -(-shape[1] // f)
+
+
+class ArrayPyramid(object):
+    """ ArrayPyramid(im, tile_size=128)
+
+    Tile source for a VirtualTexture, with the mip levels of an image
+    that is in memory.
+    """
+
+    def __init__(self, im, tile_size=128):
+        self._levels = mip_levels(np.asarray(im))
+        self.tile_size = tile_size
+        self.shape = self._levels[0].shape
+        self.dtype = self._levels[0].dtype
+        self.num_levels = len(self._levels)
+
+
+    def tile(self, level, row, col):
+        ts = self.tile_size
+        return self._levels[level][row*ts:(row+1)*ts, col*ts:(col+1)*ts]
+
+
+def write_pyramid(prefix, im, tile_size=128):
+    """ Write the mip levels of an image as tiled image files named
+    prefix.L<level>.tiled, for a TiledPyramid. Returns the file names.
+    """
+    fnames = []
+    for level, a in enumerate(mip_levels(np.asarray(im))):
+        fnames.append('%s.L%i%s' % (prefix, level, io.TILED_EXT))
+        io.write_tiled(fnames[-1], a, tile_size)
+    return fnames
+
+
+class TiledPyramid(object):
+    """ TiledPyramid(fnames)
+
+    Tile source for a VirtualTexture, with the mip levels in tiled image
+    files (as written by write_pyramid), from which only the requested
+    tiles are read. Call close() when done.
+    """
+
+    def __init__(self, fnames):
+        self._images = [io.TiledImage(fname) for fname in fnames]
+        self.tile_size = self._images[0].tile_size
+        self.shape = self._images[0].shape
+        self.dtype = self._images[0].dtype
+        self.num_levels = len(self._images)
+        for level, image in enumerate(self._images):
+            if (image.tile_size != self.tile_size or
+                    image.shape[:2] != level_shape(self.shape, level)):
+                self.close()
+                raise ValueError('%s is not mip level %i of %s.' %
+                                 (image.fname, level, fnames[0]))
+
+
+    def tile(self, level, row, col):
+        image = self._images[level]
+        return image.read_tile(row * image.grid[1] + col)
+
+
+    def close(self):
+        for image in self._images:
+            image.close()
+
+
+def _subdivide(P, T):
+    """ Split each triangle (and its texture coordinates) in four.
+    """
+    result = []
+    for a in (P, T):
+        m01 = 0.5 * (a[:,0] + a[:,1])
+        m12 = 0.5 * (a[:,1] + a[:,2])
+        m20 = 0.5 * (a[:,2] + a[:,0])
+        result.append(np.concatenate([
+            np.stack([a[:,0], m01, m20], 1),
+            np.stack([m01, a[:,1], m12], 1),
+            np.stack([m20, m12, a[:,2]], 1),
+            np.stack([m01, m12, m20], 1)]))
+    return result
+
+
+def _area(a):
+    """ The areas of 2D triangles (N, 3, 2).
+    """
+    d1, d2 = a[:,1] - a[:,0], a[:,2] - a[:,0]
+    return 0.5 * np.abs(d1[:,0] * d2[:,1] - d1[:,1] * d2[:,0])
+
+
+def needed_tiles(positions, texcoords, faces, model, view, projection,
+                 viewport, shape, tile_size, num_levels, split_pixels=64.0,
+                 max_depth=8, bias=0.0):
+    """
+    needed_tiles computes which tiles of a virtual texture are visible.
+
+    Parameters
+    ----------
+    positions, texcoords, faces
+        The mesh: (N, 3) positions, (N, 2) texture coordinates and (F, 3)
+        triangles, as from read_mesh.
+
+    model, view, projection
+        The 4x4 matrices as they would be passed to the shader.
+
+    viewport
+        The (x, y, width, height) as passed to glViewport.
+
+    shape, tile_size, num_levels
+        The shape of the full resolution image, the tile size and the
+        number of mip levels.
+
+    split_pixels
+        Triangles are split until their edges are at most this many pixels
+        on screen, so that the mip level is about constant per triangle.
+
+    max_depth
+        The maximum number of times a triangle is split.
+
+    bias
+        Added to the mip level, like GL_TEXTURE_LOD_BIAS.
+
+    Returns a set of (level, row, col) tuples. The mip level of a triangle
+    is chosen so that one texel is about one pixel, from the ratio of its
+    area in texels and in pixels. Triangles outside the view are culled.
+    Pieces of triangles that still cross the camera plane at max_depth get
+    the finest level.
+    """
+    M = np.dot(np.dot(np.asarray(model, np.float64), view), projection)
+    half = np.array(viewport[2:4], np.float64) * 0.5
+    faces = np.asarray(faces).reshape(-1, 3)
+    P = np.asarray(positions, np.float64)[faces]
+    T = np.clip(np.asarray(texcoords, np.float64)[faces], 0.0, 1.0)
+    height, width = shape[:2]
+
+    boxes = []
+    for depth in range(max_depth + 1):
+        clip = np.dot(P, M[:3]) + M[3]
+        w = clip[...,3]
+        # Cull triangles that are outside one of the clip planes
+        out = np.zeros(len(P), bool)
+        for axis in range(3):
+            out |= (clip[...,axis] < -w).all(1)
+            out |= (clip[...,axis] > w).all(1)
+        P, T, clip, w = P[~out], T[~out], clip[~out], w[~out]
+        front = (w > 1e-6).all(1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            win = clip[...,:2] / w[...,None] * half
+        edges = np.stack([win[:,1] - win[:,0], win[:,2] - win[:,1],
+                          win[:,0] - win[:,2]], 1)
+        longest = np.sqrt((edges ** 2).sum(-1)).max(1)
+        split = ~front | (longest > split_pixels)
+        if depth == max_depth:
+            split[:] = False
+
+        # The level of the triangles that are done
+        done = ~split
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = _area(T[done]) * (width * height) / _area(win[done])
+            level = 0.5 * np.log2(ratio) + bias
+        level[~front[done]] = 0
+        level = np.clip(np.nan_to_num(level, nan=num_levels - 1),
+                        0, num_levels - 1).astype(np.int64)
+        Td = T[done]
+        boxes.append(np.column_stack([level, Td[...,0].min(1),
+                                      Td[...,0].max(1), Td[...,1].min(1),
+                                      Td[...,1].max(1)]))
+        if not split.any():
+            break
+        P, T = _subdivide(P[split], T[split])
+
+    # The tiles that the texture coordinate boxes overlap, per level, via
+    # the texels of level 0
+    boxes = np.concatenate(boxes)
+    x = np.minimum(boxes[:,1:3] * width, width - 1).astype(np.int64)
+    y = np.minimum(boxes[:,3:5] * height, height - 1).astype(np.int64)
+    keys = set()
+    for level in np.unique(boxes[:,0]).astype(int):
+        sel = boxes[:,0] == level
+        size = tile_size << level
+        c0, c1 = (x[sel] // size).T
+        r0, r1 = (y[sel] // size).T
+        for r0_, r1_, c0_, c1_ in np.unique(np.column_stack([r0, r1, c0,
+                                                             c1]), axis=0):
+            for r in range(r0_, r1_ + 1):
+                for c in range(c0_, c1_ + 1):
+                    keys.add((int(level), r, c))
+    return keys
+
+
+class VirtualTexture(object):
+    """ VirtualTexture(source, capacity=256, max_uploads=16)
+
+    Parameters
+    ----------
+    source : ArrayPyramid or TiledPyramid
+        Gives the tiles of the mip levels of the image.
+    capacity : int
+        The number of tiles in the atlas. Must be at least the number of
+        mip levels, so that the coarsest tiles always fit.
+    max_uploads : int
+        The maximum number of tiles loaded per request (frame); the rest
+        are loaded in the next frames.
+
+    The atlas is an array with the tiles in a grid of slots. The page
+    table has an entry per tile of level 0, with the slot and level of
+    the finest resident tile that covers it (-1 if none). The attributes
+    hits, misses, evictions and uploads count what request() did.
+    """
+
+    def __init__(self, source, capacity=256, max_uploads=16):
+        if capacity < source.num_levels:
+            raise ValueError('The capacity must be at least the number of '
+                             'mip levels (%i).' % source.num_levels)
+        self.source = source
+        self.capacity = capacity
+        self.max_uploads = max_uploads
+        ts = source.tile_size
+        self.slot_columns = int(math.ceil(math.sqrt(capacity)))
+        slot_rows = -(-capacity // self.slot_columns)
+        self.atlas = np.zeros((slot_rows * ts, self.slot_columns * ts) +
+                              source.shape[2:], source.dtype)
+        h, w = level_shape(source.shape, 0)
+        self.page_table = np.full((-(-h // ts), -(-w // ts), 2), -1, np.int32)
+        self._tiles = collections.OrderedDict()  # key -> slot, LRU first
+        self._free = list(range(capacity - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uploads = 0
+
+
+    @property
+    def resident(self):
+        """ The keys (level, row, col) of the tiles in the atlas.
+        """
+        return set(self._tiles)
+
+
+    def slot_origin(self, slot):
+        """ The (y, x) of the top left texel of a slot in the atlas.
+        """
+        row, col = divmod(slot, self.slot_columns)
+        return row * self.source.tile_size, col * self.source.tile_size
+
+
+    def request(self, keys):
+        """ Make the tiles with the given keys (level, row, col) resident,
+        as far as the capacity and max_uploads allow, and update the page
+        table. Returns a list of uploads (slot, key, tile) that were
+        copied into the atlas, for the GL texture to be updated with.
+        """
+        # Add the parents, so each tile has a fallback
+        wanted = set()
+        top = self.source.num_levels - 1
+        for level, row, col in keys:
+            while (level, row, col) not in wanted:
+                wanted.add((level, row, col))
+                if level == top:
+                    break
+                level, row, col = level + 1, row // 2, col // 2
+
+        # Mark the resident tiles as used, coarse tiles first, so that
+        # they are the last to be evicted
+        order = sorted(wanted, key=lambda k: (-k[0], k[1], k[2]))
+        missing = []
+        for key in order:
+            if key in self._tiles:
+                self.hits += 1
+                self._tiles.move_to_end(key)
+            else:
+                missing.append(key)
+        self.misses += len(missing)
+
+        # Load missing tiles, evicting tiles that are not wanted
+        uploads = []
+        for key in missing[:self.max_uploads]:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                old, slot = next(iter(self._tiles.items()))
+                if old in wanted:
+                    break  # The atlas is full with wanted tiles
+                del self._tiles[old]
+                self.evictions += 1
+            tile = self.source.tile(*key)
+            y, x = self.slot_origin(slot)
+            self.atlas[y:y+tile.shape[0], x:x+tile.shape[1]] = tile
+            self._tiles[key] = slot
+            uploads.append((slot, key, tile))
+        self.uploads += len(uploads)
+        if uploads or missing:
+            self._update_page_table()
+        return uploads
+
+
+    def update(self, positions, texcoords, faces, model, view, projection,
+               viewport, **kwargs):
+        """ Request the tiles that are visible for the given mesh and
+        matrices (see needed_tiles for the arguments). Returns the
+        uploads, see request().
+        """
+        source = self.source
+        keys = needed_tiles(positions, texcoords, faces, model, view,
+                            projection, viewport, source.shape,
+                            source.tile_size, source.num_levels, **kwargs)
+        return self.request(keys)
+
+
+    def _update_page_table(self):
+        """ Fill the page table from coarse to fine, so that each entry
+        gets the finest resident tile.
+        """
+        table = self.page_table
+        table[:] = -1
+        for (level, row, col), slot in sorted(self._tiles.items(),
+                                              key=lambda i: -i[0][0]):
+            f = 2 ** level
+            table[row*f:(row+1)*f, col*f:(col+1)*f] = slot, level
+
+
+    def lookup(self, u, v):
+        """ Sample the virtual texture at texture coordinates u and v
+        (arrays) through the page table and atlas, like the fragment
+        shader would (nearest texel, at the level of the resident tile).
+        Returns the texels and their levels; the texels of entries
+        without a tile are 0, with level -1.
+        """
+        ts = self.source.tile_size
+        height, width = self.source.shape[:2]
+        u = np.clip(np.asarray(u, np.float64), 0.0, 1.0)
+        v = np.clip(np.asarray(v, np.float64), 0.0, 1.0)
+        y0 = np.minimum((v * height).astype(int), height - 1)
+        x0 = np.minimum((u * width).astype(int), width - 1)
+        slot, level = np.moveaxis(self.page_table[y0 // ts, x0 // ts], -1, 0)
+        valid = level >= 0
+        level = np.where(valid, level, 0)
+        y, x = y0 >> level, x0 >> level
+        sy = (slot // self.slot_columns) * ts + y % ts
+        sx = (slot % self.slot_columns) * ts + x % ts
+        texels = self.atlas[np.where(valid, sy, 0), np.where(valid, sx, 0)]
+        texels[~valid] = 0
+        return texels, np.where(valid, level, -1)
+
+
+if __name__ == '__main__':
+    import time
+    from transforms import perspective, translate, xrotate
+
+    # An 8k x 8k texture (lena, repeated) on a plane seen at an angle
+    im = np.tile(io.lena(), (16, 16, 1))
+    source = ArrayPyramid(im, tile_size=256)
+    vt = VirtualTexture(source, capacity=256, max_uploads=32)
+    positions = np.array([[-1,-1,0], [1,-1,0], [1,1,0], [-1,1,0]], np.float32)
+    texcoords = np.array([[0,0], [1,0], [1,1], [0,1]], np.float32)
+    faces = np.array([[0,1,2], [0,2,3]], np.uint32)
+    model = np.eye(4, dtype=np.float32)
+    xrotate(model, -70)
+    projection = perspective(45.0, 1.0, 0.01, 10.0)
+    viewport = (0, 0, 1024, 1024)
+    print('%ix%i texture, %i levels, %i tiles of %i pixels at level 0, '
+          'atlas %ix%i' % (im.shape[1], im.shape[0], source.num_levels,
+                           vt.page_table.shape[0] * vt.page_table.shape[1],
+                           source.tile_size, vt.atlas.shape[1],
+                           vt.atlas.shape[0]))
+
+    # Fly towards the plane
+    t0 = time.perf_counter()
+    for i, distance in enumerate(np.linspace(3.0, 0.2, 30)):
+        view = np.eye(4, dtype=np.float32)
+        translate(view, 0, 0, -distance)
+        keys = needed_tiles(positions, texcoords, faces, model, view,
+                            projection, viewport, source.shape,
+                            source.tile_size, source.num_levels)
+        uploads = vt.request(keys)
+        if i % 5 == 0:
+            levels = collections.Counter(k[0] for k in keys)
+            print('distance %.2f: %i tiles needed (per level %s), '
+                  '%i uploaded' % (distance, len(keys),
+                                   dict(sorted(levels.items())),
+                                   len(uploads)))
+    dt = time.perf_counter() - t0
+    print('%.1f ms per frame; hits %i, misses %i, uploads %i, '
+          'evictions %i' % (1000 * dt / 30, vt.hits, vt.misses, vt.uploads,
+                            vt.evictions))
+
+    # The streamed texture against the mip levels themselves
+    u, v = np.random.uniform(0, 1, (2, 100000))
+    texels, levels = vt.lookup(u, v)
+    expected = np.empty_like(texels)
+    y = (v * im.shape[0]).astype(int)
+    x = (u * im.shape[1]).astype(int)
+    for level in np.unique(levels[levels >= 0]):
+        sel = levels == level
+        expected[sel] = source._levels[level][y[sel] >> level,
+                                              x[sel] >> level]
+    assert np.array_equal(texels[levels >= 0], expected[levels >= 0])
+    print('lookup matches the mip levels at %i of %i samples' %
+          ((levels >= 0).sum(), len(u)))
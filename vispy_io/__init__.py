@@ -9,6 +9,10 @@ import os
 import bz2
 import numpy as np
 
+from .hooks import phases, add_hook, remove_hook, Event  # noqa
+from .tiled import (TiledImage, read_tiled, write_tiled,  # noqa
+                    convert_blob, EXT as TILED_EXT)
+
 THISDIR = os.path.dirname(os.path.abspath(__file__))
 RESOURCE_DIR = os.path.join(os.path.dirname(THISDIR), 'resources')
 
@@ -17,36 +21,69 @@ RESOURCE_DIR = os.path.join(os.path.dirname(THISDIR), 'resources')
 def lena():
     """ Return the lena image (512x512 RGB).
     """
-    with open(os.path.join(RESOURCE_DIR, 'lena.bz2'), 'rb') as f:
-        bb = f.read()
-    a = np.frombuffer(bz2.decompress(bb), np.uint8)
-    a.shape = 512, 512, 3
-    return a
+    return _read_image('lena.bz2', (512, 512, 3))
 
 
 def cat():
     """ Return an image of a cat (256x256 RGB).
     """
-    with open(os.path.join(RESOURCE_DIR, 'cat.bz2'), 'rb') as f:
-        bb = f.read()
-    a = np.frombuffer(bz2.decompress(bb), np.uint8)
-    a.shape = 256, 256, 3
+    return _read_image('cat.bz2', (256, 256, 3))
+
+
+def _read_image(name, shape):
+    """ Read a bz2 compressed uint8 image from the resources, or its
+    tiled version if it was converted, e.g. with
+    convert_blob(os.path.join(RESOURCE_DIR, 'lena.bz2'), (512, 512, 3)),
+    which decompresses in parallel. The phases are reported to the hooks
+    (see vispy_io.hooks).
+    """
+    fname = os.path.join(RESOURCE_DIR, name)
+    image = _open_tiled(os.path.splitext(fname)[0] + TILED_EXT, fname, shape)
+    if image is not None:
+        with image:
+            return image.read()
+    phase = phases('image', fname)
+    with phase('read'):
+        with open(fname, 'rb') as f:
+            bb = f.read()
+    with phase('decompress'):
+        raw = bz2.decompress(bb)
+    with phase('arrays'):
+        a = np.frombuffer(raw, np.uint8)
+        a.shape = shape
     return a
 
 
-# def _write_image_blob(im, fname):
-#     bb = bz2.compress(im.tostring())
-#     with open(os.path.join(RESOURCE_DIR, fname), 'wb') as f:
-#         f.write(bb) 
-    
+def _open_tiled(tiled, fname, shape):
+    """ Open the tiled version of the image blob fname, if there is one
+    that can be used instead of it: of the given shape and dtype uint8,
+    and not older than the blob (else it is stale). Returns a TiledImage
+    or None.
+    """
+    try:
+        if (os.path.isfile(fname) and
+                os.path.getmtime(tiled) < os.path.getmtime(fname)):
+            return None
+        image = TiledImage(tiled)
+    except (OSError, ValueError):
+        return None
+    if image.shape != tuple(shape) or image.dtype != np.uint8:
+        image.close()
+        return None
+    return image
 
 
-def read_mesh(fname, format=None):
+def read_mesh(fname, format=None, phase=None):
     """ Read mesh data from file.
     returns (vertices, faces, normals, texcoords)
     texcoords and faces may be None.
     
     Mesh files that ship with vispy always work: 'triceratops.obj'.
+    
+    phase is an optional function that gets the name of each phase of
+    reading and returns a context manager around it; see
+    read_mesh_memory() for measuring the memory used. To time the phases
+    of all reads, register a hook with add_hook().
     """
     # Check file
     if not os.path.isfile(fname):
@@ -64,9 +101,11 @@ def read_mesh(fname, format=None):
     
     if format == 'OBJ':
         from .wavefront import WavefrontReader
-        return WavefrontReader.read(fname)
+        return WavefrontReader.read(fname, phase=phase)
     elif not format:
         raise ValueError('read_mesh needs could not determine format.')
     else:
         raise ValueError('read_mesh does not understand format %s.' % format)
-        
+
+
+from .memory import MemoryTracker, read_mesh_memory  # noqa
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+""" Hooks to time the phases of reading meshes and images.
+
+Functions registered with add_hook() are called with an Event for each
+phase of each read that finished; a phase that raised is not reported.
+The phases of read_mesh are 'open', 'parse', 'unify', 'arrays' and
+'normals'; those of the images (lena, cat) are 'read', 'decompress' and
+'arrays'. This tells which phase dominates for a given asset, e.g. by
+forwarding the events to a metrics sink or to an instrument.Profiler::
+
+    profiler = Profiler()
+    add_hook(lambda e: profiler.add(e.reader + '/' + e.phase, e.duration))
+
+An exception in a hook is turned into a warning, so that a broken hook
+does not break reading. Without hooks the readers do not time anything.
+"""
+
+import time
+import warnings
+import functools
+import contextlib
+import collections
+
+
+Event = collections.namedtuple('Event', ['reader', 'phase', 'asset',
+                                         'duration'])
+Event.__doc__ = """ Event(reader, phase, asset, duration)
+
+The reader ('read_mesh' or 'image') and phase that finished, the file
+name of the asset, and the duration in seconds.
+"""
+
+# A tuple, replaced on change, so that emitting needs no lock
+_hooks = ()
+
+
+def add_hook(func):
+    """ Register func to be called with an Event for each phase of
+    reading. Returns func, so this can be used as a decorator.
+    """
+    global _hooks
+    _hooks = _hooks + (func,)
+    return func
+
+
+def remove_hook(func):
+    """ Unregister a function registered with add_hook().
+    """
+    global _hooks
+    hooks = list(_hooks)
+    hooks.remove(func)
+    _hooks = tuple(hooks)
+
+
+def emit(event):
+    """ Call the registered hooks with the given Event. Exceptions in
+    the hooks are issued as warnings.
+    """
+    for func in _hooks:
+        try:
+            func(event)
+        except Exception as err:
+            warnings.warn('Hook %r failed for %s: %s' % (func, event, err),
+                          RuntimeWarning, stacklevel=2)
+
+
+@contextlib.contextmanager
+def null_phase(name):
+    yield
+
+
+@contextlib.contextmanager
+def _timed_phase(reader, asset, inner, name):
+    t0 = time.perf_counter()
+    with inner(name):
+        yield
+    # Not reached when the phase raised, which is then not reported
+    emit(Event(reader, name, asset, time.perf_counter() - t0))
+
+
+def phases(reader, asset, inner=None):
+    """ Get the phase function for one read: it gets the name of a phase
+    and returns a context manager around it, which emits an Event when
+    hooks are registered. The context managers of the optional inner
+    phase function (e.g. MemoryTracker.phase) are entered as well.
+    """
+    inner = inner or null_phase
+    if not _hooks:
+        return inner
+    return functools.partial(_timed_phase, reader, asset, inner)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+""" Memory accounting for reading meshes.
+
+The MemoryTracker measures, with tracemalloc, the memory that is
+allocated during each phase of reading a mesh: the peak, and what is
+still allocated at the end of the phase. Both are relative to the memory
+in use when the tracker was created. read_mesh_memory() reads a mesh
+with a tracker and reports the phases, the overall peak and the size of
+the resulting arrays, e.g. to size the memory limit of workers.
+"""
+
+import os
+import time
+import contextlib
+import tracemalloc
+
+
+class MemoryTracker(object):
+    """ MemoryTracker()
+
+    Use phase(name) as a context manager around each phase. Starts
+    tracemalloc if it is not tracing yet; call stop() when done.
+    """
+
+    def __init__(self):
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        self._base = tracemalloc.get_traced_memory()[0]
+        self.phases = []
+        self.peak = 0
+
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            entry = {'name': name,
+                     'peak': max(peak - self._base, 0),
+                     'retained': max(current - self._base, 0),
+                     'time': time.perf_counter() - t0}
+            self.phases.append(entry)
+            self.peak = max(self.peak, entry['peak'])
+
+
+    def stop(self):
+        """ Stop tracemalloc, if this tracker started it.
+        """
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+
+def read_mesh_memory(fname, format=None):
+    """ Read a mesh like read_mesh, while accounting the memory used.
+    Returns (mesh, report), with report a dict with:
+
+      * phases: list of dicts with name, peak and retained bytes and
+        time in seconds, for the phases open, parse, unify, arrays and
+        normals
+      * peak: the peak number of bytes allocated while reading
+      * array_bytes: the size of the resulting arrays
+      * file_bytes: the size of the file
+
+    Tracing the allocations makes reading a few times slower.
+    """
+    from . import read_mesh
+    tracker = MemoryTracker()
+    try:
+        mesh = read_mesh(fname, format, phase=tracker.phase)
+    finally:
+        tracker.stop()
+    report = {'phases': tracker.phases,
+              'peak': tracker.peak,
+              'array_bytes': sum(a.nbytes for a in mesh if a is not None),
+              'file_bytes': os.path.getsize(mesh_filename(fname))}
+    return mesh, report
+
+
+def mesh_filename(fname):
+    """ The file that read_mesh reads for the given name.
+    """
+    from . import RESOURCE_DIR
+    if not os.path.isfile(fname):
+        return os.path.join(RESOURCE_DIR, fname)
+    return fname
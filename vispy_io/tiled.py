@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+""" Tiled images, with each tile compressed as a separate bz2 stream.
+
+The image resources (like lena.bz2) are a single bz2 stream, which must
+be decompressed as a whole, on one core. In a tiled image file the image
+is split in tiles of (at most) tile_size x tile_size pixels, which are
+compressed independently, so they can be decompressed in parallel (bz2
+releases the GIL), and a region can be read without decompressing the
+rest of the image.
+
+The file format (little endian) is:
+
+  * header: the magic b'VTILED01', the dtype string (8 bytes, padded with
+    spaces), and as uint32 the height, width, channels and tile size
+  * index: uint64 offsets of the tiles (row-major) and of the end, relative
+    to the end of the index
+  * the bz2 streams of the tiles, each tile in C order
+
+Tiles at the right and bottom edge are cropped, not padded. Images
+without channels are stored with 0 channels.
+"""
+
+import os
+import bz2
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .hooks import phases
+
+MAGIC = b'VTILED01'
+HEADER = struct.Struct('<8s8sIIII')
+EXT = '.tiled'
+
+
+def _tile_grid(height, width, tile_size):
+    """ Get the bounds (y0, y1, x0, x1) of the tiles, row-major.
+    """
+    return [(y, min(y + tile_size, height), x, min(x + tile_size, width))
+            for y in range(0, height, tile_size)
+            for x in range(0, width, tile_size)]
+
+
+def _map(func, items, threads):
+    """ Map func over items, in the given number of threads (default the
+    number of CPUs).
+    """
+    threads = threads or os.cpu_count() or 1
+    if threads == 1 or len(items) < 2:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(func, items))
+
+
+def write_tiled(fname, im, tile_size=128, compresslevel=9, threads=None):
+    """ Write an image (H, W) or (H, W, C) as a tiled image file. The tiles
+    are compressed in the given number of threads (default the number of
+    CPUs).
+    """
+    im = np.asarray(im)
+    if im.ndim not in (2, 3):
+        raise ValueError('write_tiled needs a 2D or 3D image, not %iD.' %
+                         im.ndim)
+    height, width = im.shape[:2]
+    channels = im.shape[2] if im.ndim == 3 else 0
+    dtype = im.dtype.str.encode('ascii')
+    bounds = _tile_grid(height, width, tile_size)
+
+    def compress(b):
+        tile = np.ascontiguousarray(im[b[0]:b[1], b[2]:b[3]])
+        return bz2.compress(tile.tobytes(), compresslevel)
+
+    streams = _map(compress, bounds, threads)
+    offsets = np.zeros(len(streams) + 1, '<u8')
+    offsets[1:] = np.cumsum([len(s) for s in streams])
+    with open(fname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, dtype.ljust(8), height, width, channels,
+                            tile_size))
+        f.write(offsets.tobytes())
+        for stream in streams:
+            f.write(stream)
+
+
+def convert_blob(blob, shape, fname=None, tile_size=128, dtype=np.uint8):
+    """ Convert an image blob (a single bz2 stream, like the resources
+    lena.bz2 and cat.bz2) of the given shape to a tiled image file. By
+    default the tiled file is written next to the blob, with extension
+    '.tiled'. Returns the file name.
+    """
+    if fname is None:
+        fname = os.path.splitext(blob)[0] + EXT
+    with open(blob, 'rb') as f:
+        im = np.frombuffer(bz2.decompress(f.read()), dtype)
+    write_tiled(fname, im.reshape(shape), tile_size)
+    return fname
+
+
+class TiledImage(object):
+    """ TiledImage(fname)
+
+    A tiled image file, opened for reading. The header and index are read
+    on opening; the tiles when reading (a region of) the image. Use as a
+    context manager, or call close().
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self._file = open(fname, 'rb')
+        self._lock = threading.Lock()
+        try:
+            header = self._file.read(HEADER.size)
+            if len(header) < HEADER.size or header[:8] != MAGIC:
+                raise ValueError('Not a tiled image file: %s' % fname)
+            magic, dtype, height, width, channels, tile_size = \
+                HEADER.unpack(header)
+            self.dtype = np.dtype(dtype.decode('ascii').strip())
+            self.shape = (height, width) + ((channels,) if channels else ())
+            self.tile_size = tile_size
+            self._bounds = _tile_grid(height, width, tile_size)
+            n = len(self._bounds) + 1
+            self._offsets = np.frombuffer(self._file.read(8 * n), '<u8')
+            if len(self._offsets) != n:
+                raise ValueError('Truncated tiled image file: %s' % fname)
+            self._start = HEADER.size + 8 * n
+        except Exception:
+            self._file.close()
+            raise
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        self._file.close()
+
+
+    @property
+    def grid(self):
+        """ The number of tile rows and columns.
+        """
+        ts = self.tile_size
+        return -(-self.shape[0] // ts), -(-self.shape[1] // ts)
+
+
+    def tiles(self, region=None):
+        """ Get the indices of the tiles that overlap the region (y0, y1,
+        x0, x1), or of all tiles.
+        """
+        if region is None:
+            return list(range(len(self._bounds)))
+        y0, y1, x0, x1 = region
+        ts = self.tile_size
+        rows, cols = self.grid
+        return [r * cols + c
+                for r in range(max(y0, 0) // ts, min(-(-y1 // ts), rows))
+                for c in range(max(x0, 0) // ts, min(-(-x1 // ts), cols))]
+
+
+    def _read_stream(self, i):
+        with self._lock:
+            self._file.seek(self._start + int(self._offsets[i]))
+            return self._file.read(int(self._offsets[i+1] - self._offsets[i]))
+
+
+    def read_tile(self, i):
+        """ Get tile i (row-major) as an array.
+        """
+        y0, y1, x0, x1 = self._bounds[i]
+        a = np.frombuffer(bz2.decompress(self._read_stream(i)), self.dtype)
+        return a.reshape((y1 - y0, x1 - x0) + self.shape[2:])
+
+
+    def read(self, region=None, threads=None):
+        """ Read the image, or the region (y0, y1, x0, x1) of it, by
+        decompressing the tiles that overlap it in the given number of
+        threads (default the number of CPUs).
+        """
+        height, width = self.shape[:2]
+        if region is None:
+            region = 0, height, 0, width
+        y0, y1, x0, x1 = region
+        if not (0 <= y0 <= y1 <= height and 0 <= x0 <= x1 <= width):
+            raise ValueError('Region %r is outside the image of shape %r.' %
+                             (tuple(region), self.shape))
+        indices = self.tiles(region)
+        phase = phases('image', self.fname)
+
+        with phase('read'):
+            if len(indices) == len(self._bounds):
+                # All tiles, in one read
+                with self._lock:
+                    self._file.seek(self._start)
+                    data = self._file.read(int(self._offsets[-1]))
+                streams = [data[self._offsets[i]:self._offsets[i+1]]
+                           for i in indices]
+            else:
+                streams = [self._read_stream(i) for i in indices]
+
+        out = np.empty((y1 - y0, x1 - x0) + self.shape[2:], self.dtype)
+
+        def decompress(item):
+            i, stream = item
+            ty0, ty1, tx0, tx1 = self._bounds[i]
+            tile = np.frombuffer(bz2.decompress(stream), self.dtype)
+            tile = tile.reshape((ty1 - ty0, tx1 - tx0) + self.shape[2:])
+            # The part of the tile in the region
+            a0, a1 = max(ty0, y0), min(ty1, y1)
+            b0, b1 = max(tx0, x0), min(tx1, x1)
+            out[a0-y0:a1-y0, b0-x0:b1-x0] = tile[a0-ty0:a1-ty0, b0-tx0:b1-tx0]
+
+        with phase('decompress'):
+            _map(decompress, list(zip(indices, streams)), threads)
+        return out
+
+
+def read_tiled(fname, region=None, threads=None):
+    """ Read a tiled image file, or the region (y0, y1, x0, x1) of it.
+    See TiledImage.read.
+    """
+    with TiledImage(fname) as image:
+        return image.read(region, threads)
@@ -18,9 +18,11 @@ The classes are written with compatibility of Python3 in mind.
 
 """
 
-import time
+from array import array
+
 import numpy as np
 
+from .hooks import phases
 
 
 class WavefrontReader(object):
@@ -43,14 +45,20 @@ class WavefrontReader(object):
         # The faces, indices to vertex/normal/texcords arrays.
         self._faces = []
         
+        # The faces as read: the number of index sets per face, and the
+        # absolute v/vt/vn indices of each set (-1 if not given), as
+        # compact arrays. They are converted by unify().
+        self._faceSizes = array('i')
+        self._faceIndices = array('i')
+        
         # Dictionary to keep track of processed face data, so we can 
         # convert the original v/vn/vn to the final vertices/normals/texcords.
         self._facemap = {}
     
     
     @classmethod
-    def read(cls, fname, check='ignored'):
-        """ read(fname)
+    def read(cls, fname, check='ignored', phase=None):
+        """ read(fname, phase=None)
         
         This classmethod is the entry point for reading OBJ files.
         
@@ -58,25 +66,37 @@ class WavefrontReader(object):
         ----------
         fname : string
             The name of the file to read.
+        phase : callable
+            Optional function that is called with the name of each phase
+            of reading ('open', 'parse', 'unify', 'arrays' and 'normals')
+            and returns a context manager around it, e.g. to measure it.
+            Hooks registered in vispy_io.hooks are called as well.
         
         """
         
-        t0 = time.time()
+        phase = phases('read_mesh', fname, phase)
         
         # Open file
-        f = open(fname, 'rb')
+        with phase('open'):
+            f = open(fname, 'rb')
         try:
             reader = WavefrontReader(f)
-            while True:
-                reader.readLine()
-        except EOFError:
-            pass
+            with phase('parse'):
+                try:
+                    while True:
+                        reader.readLine()
+                except EOFError:
+                    pass
         finally:
             f.close()
         
         # Done
-        mesh = reader.finish()
-        #print('reading mesh took ' + str(time.time()-t0) + ' seconds')
+        with phase('unify'):
+            reader.unify()
+        with phase('arrays'):
+            reader.finishArrays()
+        with phase('normals'):
+            mesh = reader.finish()
         return mesh
     
     
@@ -98,7 +118,11 @@ class WavefrontReader(object):
         elif line.startswith('vn '):
             self._vn.append( self.readTuple(line) )
         elif line.startswith('f '):
-            self._faces.append( self.readFace(line) )
+            # Relative indices refer to what was read so far
+            indexSets = self.readIndexSets(line)
+            self._faceSizes.append(len(indexSets))
+            for indexSet in indexSets:
+                self._faceIndices.extend(indexSet)
         elif line.startswith('#'):
             pass # Comment
         elif line.startswith('mtllib '):
@@ -119,22 +143,67 @@ class WavefrontReader(object):
         """ Reads a tuple of numbers. e.g. vertices, normals or teture coords.
         """
         numbers = [num for num in line.split(' ') if num]
-        return [float(num) for num in numbers[1:n+1]]
+        # A tuple takes less memory than a list
+        return tuple([float(num) for num in numbers[1:n+1]])
     
     
-    def readFace(self, line):
+    def unify(self):
+        """ Convert the faces that were read (see readIndexSets) to faces
+        with indices into the final vertices/normals/texcords.
+        """
+        sizes, indices = self._faceSizes, self._faceIndices
+        self._faceSizes, self._faceIndices = array('i'), array('i')
+        pos = 0
+        for n in sizes:
+            indexSets = [tuple(indices[i:i+3])
+                         for i in range(pos, pos + 3*n, 3)]
+            self._faces.append( self.unifyFace(indexSets) )
+            pos += 3*n
+        # The original data and the map are not needed anymore
+        if self._faces:
+            self._v, self._vn, self._vt = [], [], []
+        self._facemap = {}
+    
+    
+    def readIndexSets(self, line):
         """ Each face consists of three or more sets of indices. Each set
-        consists of 1, 2 or 3 indices to vertices/normals/texcords.
+        consists of 1, 2 or 3 indices to vertices/texcords/normals.
+        Returns the sets as (v, vt, vn) tuples of absolute indices, with
+        -1 for indices that are not given. Relative (negative) indices
+        are relative to the vertices/texcords/normals read so far.
         """
-        
-        # Get parts (skip first)
-        indexSets = [num for num in line.split(' ') if num][1:]
+        nv, nvt, nvn = len(self._v), len(self._vt), len(self._vn)
+        result = []
+        for indexSet in [num for num in line.split(' ') if num][1:]:
+            v, vt, vn = (indexSet.split('/') + ['', ''])[:3]
+            result.append( (self._absint(v, nv),
+                            self._absint(vt, nvt) if vt else -1,
+                            self._absint(vn, nvn) if vn else -1) )
+        return result
+    
+    
+    def readFace(self, line):
+        """ Convert a face line, with indices to the vertices/texcords/
+        normals read so far, to a face with indices into the final
+        vertices/normals/texcords.
+        """
+        return self.unifyFace(self.readIndexSets(line))
+    
+    
+    def unifyFace(self, indexSets):
+        """ Convert a face, given as (v, vt, vn) index sets (see
+        readIndexSets), to indices into the final vertices/normals/texcords.
+        """
+        # The map is keyed by a single int, which takes less memory
+        nvt, nvn = len(self._vt) + 1, len(self._vn) + 1
         
         final_face = []
-        for indexSet in indexSets:
+        for vertex_index, texcord_index, normal_index in indexSets:
+            key = ((vertex_index * nvt + texcord_index + 1) * nvn +
+                   normal_index + 1)
             
             # Did we see this exact index earlier? If so, it's easy
-            final_index = self._facemap.get(indexSet)
+            final_index = self._facemap.get(key)
             if final_index is not None:
                 final_face.append(final_index)
                 continue
@@ -144,28 +213,22 @@ class WavefrontReader(object):
             # Get and store final index
             final_index = len(self._vertices)
             final_face.append(final_index)
-            self._facemap[indexSet] = final_index
-            
-            # What indices were given?
-            indices = [i for i in indexSet.split('/')]
+            self._facemap[key] = final_index
             
             # Store new set of vertex/normal/texcords.
             # If there is a single face that does not specify the texcord
             # index, the texcords are ignored. Likewise for the normals.
             if True:
-                vertex_index = self._absint(indices[0], len(self._v))
                 self._vertices.append( self._v[vertex_index] )
             if self._texcords is not None:
-                if len(indices) > 1 and indices[1]:
-                    texcord_index = self._absint(indices[1], len(self._vt))
+                if texcord_index >= 0:
                     self._texcords.append( self._vt[texcord_index] )
                 else:
                     if self._texcords:
                         print('Warning reading OBJ: ignoring texture coordinates because it is not specified for all faces.')
                     self._texcords = None
             if self._normals is not None:
-                if len(indices) > 2 and indices[2]:
-                    normal_index = self._absint(indices[2], len(self._vn))
+                if normal_index >= 0:
                     self._normals.append( self._vn[normal_index] )
                 else:
                     if self._normals:
@@ -206,26 +269,37 @@ class WavefrontReader(object):
         return normals
     
 
-    def finish(self):
-        """ Converts gathere lists to numpy arrays and creates 
-        BaseMesh instance.
+    def finishArrays(self):
+        """ Converts the gathered lists to numpy arrays. Each list is
+        released as soon as it is converted, to limit the peak memory.
         """
-        if True:
-            self._vertices = np.array(self._vertices, 'float32')
+        if self._faceSizes:
+            self.unify()
+        if isinstance(self._vertices, np.ndarray):
+            return  # Already done
         if self._faces:
+            self._vertices = np.array(self._vertices, 'float32')
             self._faces = np.array(self._faces, 'uint32')
         else:
             # Use vertices only
             self._vertices = np.array(self._v, 'float32')
+            self._v = []
             self._faces = None
         if self._normals:
             self._normals = np.array(self._normals, 'float32')
-        else:
-            self._normals = self._calculate_normals()
         if self._texcords:
             self._texcords = np.array(self._texcords, 'float32')
         else:
             self._texcords = None
+    
+    
+    def finish(self):
+        """ Converts gathere lists to numpy arrays and creates 
+        BaseMesh instance.
+        """
+        self.finishArrays()
+        if not isinstance(self._normals, np.ndarray):
+            self._normals = self._calculate_normals()
         
         return self._vertices, self._faces, self._normals, self._texcords
     
@@ -319,7 +393,7 @@ class WavefrontWriter(object):
             faces = np.arange(len(vertices))
         
         # Reshape faces
-        Nfaces = faces.size / 3
+        Nfaces = faces.size // 3
         faces = faces.reshape((Nfaces, 3))
         
         # Number of vertices
@@ -356,7 +430,7 @@ class WavefrontWriter(object):
                 self.writeTuple(vertices[i], 'v')
         if self._hasNormals:
             for i in range(N):
-                self.writeTuple(_normals[i], 'vn')   
+                self.writeTuple(normals[i], 'vn')   
         if self._hasValues:
             for i in range(N):
                 self.writeTuple(values[i], 'vt')